@@ -1,7 +1,11 @@
 import ctypes
 from ctypes.wintypes import *
+from threading import Event, Thread
 
-__all__ = ["GetFgWindow", "GetWindowText", "GetProcessInfo", "GetWindowHandle", "SendClose", "ForceClose"]
+from proctree import ProcessTable
+
+__all__ = ["GetFgWindow", "GetWindowText", "GetProcessInfo", "GetProcessTime", "GetWindowHandle", "GetWindowInfo",
+           "SendClose", "ForceClose", "WinEventHook"]
 
 User32 = ctypes.windll.user32
 Kernel32 = ctypes.windll.kernel32
@@ -71,7 +75,7 @@ class PROCESSENTRY32(ctypes.Structure):
 class GetProcessInfo:
     def __init__(self):
         """
-        获取 “进程ID（pid）： 进程名称（exe）” 字典
+        获取 “进程ID（pid）： 进程名称（exe）” 字典，或包含父进程与线程数的进程快照表
         """
         # 创建快照
         self.CreateSnapshot = Kernel32.CreateToolhelp32Snapshot
@@ -97,36 +101,87 @@ class GetProcessInfo:
         :param sort: 是否按pid排序
         :return: pid: name字典 | {}
         """
+        return self.snapshot().names(sort)
+
+    def snapshot(self) -> ProcessTable:
+        """
+        创建一次进程快照，在同一次遍历中记录父进程、线程数并建立父子索引
+        :return: 进程快照表，创建快照失败时为空表
+        """
+        table = ProcessTable()
         # 创建快照
         h_snapshot = self.CreateSnapshot(0x00000002, 0)
         if h_snapshot == -1:  # 创建快照失败
-            return {}
+            return table
         session = PROCESSENTRY32()
         session.dwSize = ctypes.sizeof(PROCESSENTRY32)
 
         if not self.Process32First(h_snapshot, ctypes.byref(session)):  # 枚举第一个进程失败
             self.CloseHandle(h_snapshot)
-            return {}
+            return table
 
-        process_dict = {}
         while True:
-            process_dict[session.th32ProcessID] = session.szExeFile.decode("mbcs")  # 进程ID:进程名称
+            table.add(session.th32ProcessID, session.th32ParentProcessID, session.szExeFile.decode("mbcs"),
+                      session.cntThreads)
             if not self.Process32Next(h_snapshot, ctypes.byref(session)):  # 枚举下一个进程失败
                 break
 
         self.CloseHandle(h_snapshot)  # 关闭快照
-        if sort:  # 按pid排序
-            return dict(sorted(process_dict.items(), key=lambda x: x[0]))  # 根据pid排序
-        return process_dict
+        return table
+
+
+# 获取进程创建时间
+class GetProcessTime:
+    def __init__(self):
+        """
+        获取进程的创建时间，与pid一起唯一确定一个进程，用于识别被复用的pid
+        """
+        # 打开进程
+        self.OpenProcess = Kernel32.OpenProcess
+        self.OpenProcess.argtypes = [DWORD, BOOL, DWORD]
+        self.OpenProcess.restype = HANDLE
+        # 获取进程时间
+        self.GetProcessTimes = Kernel32.GetProcessTimes
+        self.GetProcessTimes.argtypes = [HANDLE] + [ctypes.POINTER(FILETIME)] * 4
+        self.GetProcessTimes.restype = BOOL
+        # 关闭句柄
+        self.CloseHandle = Kernel32.CloseHandle
+        self.CloseHandle.argtypes = [HANDLE]
+        self.CloseHandle.restype = BOOL
+        # 创建时间、退出时间、内核时间、用户时间
+        self.times = [FILETIME() for _ in range(4)]
+
+    def __call__(self, pid: int) -> float | None:
+        """
+        :param pid: 进程ID
+        :return:    创建时间(Unix时间) | None，None表示进程不存在或无权访问
+        """
+        handle = self.OpenProcess(0x1000, False, pid)  # 0x1000: PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle: return None
+        result = self.GetProcessTimes(handle, *(ctypes.byref(value) for value in self.times))
+        self.CloseHandle(handle)
+        if not result: return None
+        created = self.times[0]
+        return ((created.dwHighDateTime << 32) | created.dwLowDateTime) / 1e7 - 11644473600  # FILETIME为1601年起的100纳秒数
 
 
 # 获取所有顶层窗口句柄及相关信息
 class GetWindowHandle:
-    def __init__(self):
+    def __init__(self, visible: bool = False):
         """
         获取 ”窗口句柄：(pid, 窗口标题)“ 字典
+        每次枚举为一代，本代未枚举到的窗口会被移除，并记录与上一代相比新增、关闭、标题变化的窗口
+        :param visible: 是否只枚举可见窗口（最小化的窗口仍可见），隐藏的辅助窗口、托盘与输入法窗口不枚举；
+                        窗口隐藏后视为关闭，重新显示后视为新增
         """
-        self.ProcessData: dict[int, tuple[int, str]] = {}  # {hwnd: (pid, title), ...}
+        self.visible = visible
+        self.ProcessData: dict[int, tuple[int, str]] = {}  # {hwnd: (pid, title), ...}，仅包含最近一次枚举到的窗口
+        self.Generation: dict[int, int] = {}  # {hwnd: 最近一次被枚举到的代数, ...}
+        self.generation = 0  # 当前代数
+        # 本次枚举与上一代的差异
+        self.opened: dict[int, tuple[int, str]] = {}
+        self.closed: dict[int, tuple[int, str]] = {}
+        self.retitled: dict[int, tuple[int, str]] = {}
         # 定义回调函数
         self.EnumWindows = User32.EnumWindows
         self.EnumWindows.argtypes = [HWND, LPARAM]
@@ -143,6 +198,20 @@ class GetWindowHandle:
         self.GetWindowTextW = User32.GetWindowTextW
         self.GetWindowTextW.argtypes = [HWND, ctypes.c_wchar_p, ctypes.c_int]
         self.GetWindowTextW.restype = ctypes.c_int
+        # 定义按Z序遍历窗口的函数，用于流式枚举
+        self.GetWindow = User32.GetWindow
+        self.GetWindow.argtypes = [HWND, UINT]
+        self.GetWindow.restype = HWND
+        self.GetDesktopWindow = User32.GetDesktopWindow
+        self.GetDesktopWindow.restype = HWND
+        # 定义判断窗口是否可见的函数
+        self.IsWindowVisible = User32.IsWindowVisible
+        self.IsWindowVisible.argtypes = [HWND]
+        self.IsWindowVisible.restype = BOOL
+        # 回调函数与缓冲区在多次枚举间复用
+        self.func = ctypes.WINFUNCTYPE(BOOL, HWND, LPARAM)(self._callback)
+        self.pid = DWORD()
+        self.buffer = ctypes.create_unicode_buffer(256)
 
     def __call__(self, sort: bool = False) -> dict:
         """
@@ -150,33 +219,159 @@ class GetWindowHandle:
         :param sort: 是否按窗口句柄排序
         :return:  hwnd: (pid, title)字典
         """
-        func = ctypes.WINFUNCTYPE(BOOL, HWND, LPARAM)(self._callback)
-        self.EnumWindows(func, 0)
+        self._enumerate()
         if sort:  # 按窗口句柄排序
             return dict(sorted(self.ProcessData.items(), key=lambda x: x[0]))   # 根据hwnd排序
         return self.ProcessData
 
+    def diff(self) -> tuple[dict, dict, dict]:
+        """
+        枚举所有顶层窗口，并返回与上一次枚举相比的差异
+        :return: (新增窗口, 关闭窗口, 标题变化窗口)，均为hwnd: (pid, title)字典
+        """
+        self._enumerate()
+        return self.opened, self.closed, self.retitled
+
+    def stream(self):
+        """
+        按Z序逐个产生顶层窗口，不构建字典，也不更新窗口索引
+        :return: 生成器，产生(hwnd, pid, title)
+        """
+        hwnd = self.GetWindow(self.GetDesktopWindow(), 5)  # 5: GW_CHILD
+        while hwnd:
+            title = "" if self.visible and not self.IsWindowVisible(hwnd) else self._read(hwnd)
+            if title:  # 窗口标题不为空
+                yield hwnd, self.pid.value, title
+            hwnd = self.GetWindow(hwnd, 2)  # 2: GW_HWNDNEXT
+
+    def _enumerate(self):
+        self.generation += 1
+        self.opened, self.closed, self.retitled = {}, {}, {}
+        self.EnumWindows(self.func, 0)
+        # 移除本代未枚举到的窗口
+        stale = [hwnd for hwnd, generation in self.Generation.items() if generation != self.generation]
+        for hwnd in stale:
+            del self.Generation[hwnd]
+            self.closed[hwnd] = self.ProcessData.pop(hwnd)
+
+    # 读取窗口pid与标题，pid保存在self.pid中
+    def _read(self, hwnd) -> str:
+        self.GetProcessId(hwnd, ctypes.byref(self.pid))
+        length = self.GetLengthW(hwnd)
+        if length <= 0: return ""
+        if length + 1 > len(self.buffer):  # 标题过长时扩大缓冲区
+            self.buffer = ctypes.create_unicode_buffer(length + 1)
+        self.GetWindowTextW(hwnd, self.buffer, len(self.buffer))
+        return self.buffer.value
+
     def _callback(self, hwnd, lParam):
         _ = lParam
-        PID = DWORD()
-        self.GetProcessId(hwnd, ctypes.byref(PID))
-        length = self.GetLengthW(hwnd)
-        BUFF = ctypes.create_unicode_buffer(length + 1)
-        self.GetWindowTextW(hwnd, BUFF, length + 1)
-        if BUFF.value:  # 窗口标题不为空
-            self.ProcessData[hwnd] = (PID.value, BUFF.value)  # 添加到字典中
+        if self.visible and not self.IsWindowVisible(hwnd): return True  # 隐藏窗口，不读取标题
+        title = self._read(hwnd)
+        if title:  # 窗口标题不为空
+            data = (self.pid.value, title)
+            old = self.ProcessData.get(hwnd)
+            if old is None or old[0] != data[0]:  # 新窗口，或hwnd已被其他进程复用
+                if old is not None: self.closed[hwnd] = old
+                self.opened[hwnd] = data
+            elif old[1] != title:  # 标题变化
+                self.retitled[hwnd] = data
+            self.ProcessData[hwnd] = data  # 添加到字典中
+            self.Generation[hwnd] = self.generation
         return True
 
 
+# 获取单个窗口的信息
+class GetWindowInfo:
+    def __init__(self, cache_size: int = 256):
+        """
+        获取指定窗口的 “(pid, 窗口标题, 进程名称)”，无需枚举所有窗口
+        :param cache_size: 缓存的窗口数量，缓存 “hwnd: (pid, 进程名称)”，窗口销毁或hwnd被复用时失效
+        """
+        self.cache: dict[int, tuple[int, str]] = {}  # {hwnd: (pid, exe), ...}，按插入顺序淘汰
+        self.cache_size = cache_size
+        # 判断窗口是否存在
+        self.IsWindow = User32.IsWindow
+        self.IsWindow.argtypes = [HWND]
+        self.IsWindow.restype = BOOL
+        # 获取窗口所属进程ID
+        self.GetProcessId = User32.GetWindowThreadProcessId
+        self.GetProcessId.argtypes = [HWND, ctypes.POINTER(DWORD)]
+        self.GetProcessId.restype = DWORD
+        # 获取窗口标题
+        self.GetWindowTextW = User32.GetWindowTextW
+        self.GetWindowTextW.argtypes = [HWND, ctypes.c_wchar_p, ctypes.c_int]
+        self.GetWindowTextW.restype = ctypes.c_int
+        # 打开进程
+        self.OpenProcess = Kernel32.OpenProcess
+        self.OpenProcess.argtypes = [DWORD, BOOL, DWORD]
+        self.OpenProcess.restype = HANDLE
+        # 获取进程映像路径
+        self.QueryImageName = Kernel32.QueryFullProcessImageNameW
+        self.QueryImageName.argtypes = [HANDLE, DWORD, ctypes.c_wchar_p, ctypes.POINTER(DWORD)]
+        self.QueryImageName.restype = BOOL
+        # 关闭句柄
+        self.CloseHandle = Kernel32.CloseHandle
+        self.CloseHandle.argtypes = [HANDLE]
+        self.CloseHandle.restype = BOOL
+        # 缓冲区
+        self.pid = DWORD()
+        self.title_buffer = ctypes.create_unicode_buffer(256)
+        self.path_buffer = ctypes.create_unicode_buffer(1024)
+
+    def __call__(self, hwnd: int) -> tuple[int, str, str] | None:
+        """
+        获取窗口信息
+        :param hwnd: 窗口句柄
+        :return:     (pid, 窗口标题, 进程名称) | None，None表示窗口不存在
+        """
+        if not hwnd or not self.IsWindow(hwnd):  # 窗口已销毁
+            self.cache.pop(hwnd, None)
+            return None
+        self.GetProcessId(hwnd, ctypes.byref(self.pid))
+        pid = self.pid.value
+        cached = self.cache.get(hwnd)
+        if cached is None or cached[0] != pid:  # 未缓存或hwnd已被其他进程复用
+            cached = (pid, self._exe(pid))
+            self.cache.pop(hwnd, None)
+            self.cache[hwnd] = cached
+            if len(self.cache) > self.cache_size:  # 淘汰最早缓存的窗口
+                del self.cache[next(iter(self.cache))]
+        self.GetWindowTextW(hwnd, self.title_buffer, 256)
+        return pid, self.title_buffer.value, cached[1]
+
+    # 获取进程名称
+    def _exe(self, pid: int) -> str:
+        hProcess = self.OpenProcess(0x1000, False, pid)  # 0x1000: PROCESS_QUERY_LIMITED_INFORMATION
+        if not hProcess: return ""
+        size = DWORD(len(self.path_buffer))
+        result = self.QueryImageName(hProcess, 0, self.path_buffer, ctypes.byref(size))
+        self.CloseHandle(hProcess)
+        if not result: return ""
+        return self.path_buffer.value.rsplit("\\", 1)[-1]
+
+
 # 关闭窗口
 class SendClose:
-    def __init__(self):
-        self.SendMessage = User32.SendMessageW
-        self.SendMessage.argtypes = (ctypes.c_void_p, ctypes.c_uint, ctypes.c_uint, ctypes.c_void_p)
-        self.SendMessage.restype = ctypes.c_long
+    def __init__(self, timeout: float = 1.0):
+        """
+        发送WM_CLOSE并等待目标程序处理，最多等待timeout秒；目标程序无响应时立即返回，不会阻塞调用线程
+        :param timeout: 超时时间，单位为秒
+        """
+        self.timeout = max(round(timeout * 1000), 1)
+        self.result = ctypes.c_size_t()
+        self.SendMessageTimeout = User32.SendMessageTimeoutW
+        self.SendMessageTimeout.argtypes = (HWND, ctypes.c_uint, ctypes.c_size_t, ctypes.c_ssize_t, ctypes.c_uint,
+                                            ctypes.c_uint, ctypes.POINTER(ctypes.c_size_t))
+        self.SendMessageTimeout.restype = ctypes.c_ssize_t
 
-    def __call__(self, hwnd: int) -> int:
-        return self.SendMessage(hwnd, 0x10, 0, 0)
+    def __call__(self, hwnd: int) -> bool:
+        """
+        :param hwnd: 窗口句柄
+        :return:     目标程序是否在超时前处理了关闭指令
+        """
+        # 0x10: WM_CLOSE, 0x0002: SMTO_ABORTIFHUNG
+        return bool(self.SendMessageTimeout(hwnd, 0x10, 0, 0, 0x0002, self.timeout, ctypes.byref(self.result)))
 
 
 # 强制关闭应用
@@ -198,3 +393,70 @@ class ForceClose:
         Kernel32.CloseHandle(hProcess)  # 关闭进程句柄
         if result: return True
         return False
+
+
+# 监听前台窗口切换与窗口标题变化
+class WinEventHook:
+    FOREGROUND = 0x0003  # EVENT_SYSTEM_FOREGROUND
+    NAMECHANGE = 0x800C  # EVENT_OBJECT_NAMECHANGE
+
+    def __init__(self, callback):
+        """
+        使用SetWinEventHook监听前台窗口切换与窗口标题变化，钩子与消息循环运行在独立线程中
+        :param callback: 回调函数，参数为(事件类型, hwnd)，在钩子线程中调用
+        """
+        self.callback = callback
+        self.thread_id = 0  # 钩子线程ID
+        self.hooked = False  # 钩子是否安装成功
+        self.ready = Event()  # 钩子安装完成信号
+        # 定义回调函数类型，必须保留引用，否则会被回收
+        self.WinEventProc = ctypes.WINFUNCTYPE(None, HANDLE, DWORD, HWND, LONG, LONG, DWORD, DWORD)
+        self.proc = self.WinEventProc(self._callback)
+        # 安装钩子
+        self.SetWinEventHook = User32.SetWinEventHook
+        self.SetWinEventHook.argtypes = [DWORD, DWORD, HMODULE, self.WinEventProc, DWORD, DWORD, DWORD]
+        self.SetWinEventHook.restype = HANDLE
+        # 卸载钩子
+        self.UnhookWinEvent = User32.UnhookWinEvent
+        self.UnhookWinEvent.argtypes = [HANDLE]
+        self.UnhookWinEvent.restype = BOOL
+        # 消息循环
+        self.GetMessageW = User32.GetMessageW
+        self.GetMessageW.argtypes = [ctypes.POINTER(MSG), HWND, UINT, UINT]
+        self.GetMessageW.restype = ctypes.c_int
+        # 向钩子线程发送退出消息
+        self.PostThreadMessageW = User32.PostThreadMessageW
+        self.PostThreadMessageW.argtypes = [DWORD, UINT, WPARAM, LPARAM]
+        self.PostThreadMessageW.restype = BOOL
+
+    def start(self) -> bool:
+        """
+        启动钩子线程
+        :return: 钩子是否安装成功
+        """
+        Thread(target=self._run, daemon=True).start()
+        self.ready.wait()
+        return self.hooked
+
+    def stop(self):
+        if self.thread_id:
+            self.PostThreadMessageW(self.thread_id, 0x0012, 0, 0)  # 0x0012: WM_QUIT
+
+    def _run(self):
+        self.thread_id = Kernel32.GetCurrentThreadId()
+        hooks = [self.SetWinEventHook(event, event, None, self.proc, 0, 0, 0)  # 0: WINEVENT_OUTOFCONTEXT
+                 for event in (self.FOREGROUND, self.NAMECHANGE)]
+        self.hooked = all(hooks)
+        self.ready.set()
+        if self.hooked:
+            msg = MSG()
+            while self.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:  # 收到WM_QUIT或出错时退出
+                pass
+        for hook in hooks:
+            if hook: self.UnhookWinEvent(hook)
+
+    def _callback(self, hWinEventHook, event, hwnd, idObject, idChild, dwEventThread, dwmsEventTime):
+        _ = hWinEventHook, dwEventThread, dwmsEventTime
+        if event == self.NAMECHANGE and (idObject or idChild):  # 仅关心窗口本身的标题变化
+            return
+        self.callback(event, hwnd)
@@ -0,0 +1,26 @@
+import os
+
+__all__ = ["BACKENDS", "load_backend"]
+
+# 可用的平台后端
+BACKENDS = ("win32", "sim")
+
+
+# 加载平台后端
+def load_backend(name: str = "win32", desktop=None):
+    """
+    平台后端提供以下与api.py同名同接口的类：
+    GetFgWindow、GetWindowText、GetProcessInfo、GetProcessTime、GetWindowHandle、GetWindowInfo、SendClose、ForceClose、WinEventHook
+    :param name:    win32为api.py中的Windows实现，sim为simulate.py中的模拟桌面
+    :param desktop: sim后端使用的simulate.Desktop，默认为空桌面
+    :return:        平台后端，其name属性为后端名称
+    """
+    if name == "win32":
+        if os.name != "nt":
+            raise OSError("win32后端仅支持Windows系统")
+        import api
+        return api
+    if name == "sim":
+        from simulate import SimulatedApi
+        return SimulatedApi(desktop)
+    raise ValueError(f"未知的平台后端[{name}]，可选: {', '.join(BACKENDS)}")
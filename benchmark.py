@@ -0,0 +1,1297 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import sys
+import statistics
+import string
+import subprocess
+import tempfile
+import time
+from threading import Event, Thread, get_ident
+
+from collector import SESSIONS, Collector, EventStore
+from decision import VerdictCache
+from escalation import Escalator
+from eventlog import EventWriter, query
+from events import AdaptiveSchedule, FakeSource, HookSource, PollingSource
+from matcher import PatternSet, RuleMatcher
+from metrics import InstrumentedApi, Metrics
+from netsink import NetworkSink
+from proctree import ExeCache, kill_tree
+from profiler import SamplingProfiler
+from recorder import LogRotation, RecordWriter, TimeCache
+from rules import load_rule, parse_item
+from simulate import Churn, Desktop, SimulatedApi
+from tracing import TraceWriter, read_trace, replay
+from usage import UsageAggregator
+
+__all__ = ["bench_matcher", "bench_events", "bench_record", "bench_startup", "bench_api", "bench_listen",
+           "bench_replay", "bench_escalation", "bench_sweep", "bench_tree",
+           "bench_exe", "bench_pattern", "bench_verdict",
+           "bench_eventlog", "bench_rotation", "bench_usage", "bench_metrics", "bench_profile", "bench_schedule",
+           "bench_collector", "BENCHMARKS", "run", "compare"]
+
+
+# 生成随机标题
+def random_title(rand: random.Random, length: int = 24) -> str:
+    return "".join(rand.choice(string.ascii_letters + " -_") for _ in range(length))
+
+
+# 生成规则信息
+def make_rule(count: int, seed: int = 0) -> dict:
+    """
+    生成指定数量的规则信息，五类规则平均分配
+    :param count: 规则总数
+    :param seed:  随机种子
+    :return:      规则信息
+    """
+    rand = random.Random(seed)
+    titles = [random_title(rand, rand.randint(6, 16)) for _ in range(count)]
+    step = max(count // 5, 1)
+    return {
+        "Protect": {0: [], 1: titles[0:step]},
+        "Ordinary": titles[step:step * 2],
+        "Force": titles[step * 2:step * 3],
+        "Include": titles[step * 3:step * 4],
+        "ExInclude": titles[step * 4:],
+        "Process": {"Ordinary": [], "Force": [], "Include": [], "ExInclude": []},
+        "Pattern": {"Ordinary": [], "Force": [], "Include": [], "ExInclude": []},
+    }
+
+
+# 原listen_text中的逐条匹配
+def legacy_match(rule: dict, title: str) -> tuple[str, str] | None:
+    if title in rule["Protect"][1]: return "Protect", title
+    if title in rule["Ordinary"]: return "Ordinary", title
+    if title in rule["Force"]: return "Force", title
+    for include in rule["Include"]:
+        if include in title: return "Include", include
+    for exinclude in rule["ExInclude"]:
+        if exinclude in title: return "ExInclude", exinclude
+    return None
+
+
+# 计时
+def per_call(func, titles: list[str], budget: float = 1.0) -> float:
+    """
+    :return: 单次调用耗时，单位为微秒
+    """
+    calls, start = 0, time.perf_counter()
+    while True:
+        for title in titles:
+            func(title)
+        calls += len(titles)
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget: return elapsed / calls * 1e6
+
+
+# 计算分位数
+def percentiles(samples: list[float], scale: float = 1e6) -> dict:
+    """
+    :param samples: 样本，单位为秒
+    :param scale:   结果的缩放倍数，默认换算为微秒
+    :return:        {"p50": 中位数, "p90": 90分位, "p99": 99分位, "max": 最大值}
+    """
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(int(len(ordered) * q), len(ordered) - 1)] * scale
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": ordered[-1] * scale}
+
+
+# 规则匹配基准测试
+def bench_matcher(counts: tuple[int, ...] = (10, 1000, 100000)) -> list[dict]:
+    """
+    比较逐条匹配与编译匹配器的单标题判定耗时
+    :param counts: 规则数量
+    :return:       [{"rules": 规则数量, "legacy_us": 逐条匹配耗时, "compiled_us": 编译匹配器耗时,
+                      "compiled_p50_us"/"compiled_p99_us": 编译匹配器单次判定耗时分位数, "build_ms": 编译耗时}, ...]
+    """
+    rand = random.Random(1)
+    titles = [random_title(rand, rand.randint(10, 60)) for _ in range(200)]
+    results = []
+    for count in counts:
+        rule = make_rule(count)
+        titles[0] = rule["Ordinary"][0] if rule["Ordinary"] else titles[0]  # 保证存在命中
+        start = time.perf_counter()
+        matcher = RuleMatcher(rule)
+        build_ms = (time.perf_counter() - start) * 1e3
+        for title in titles:  # 校验结果一致
+            assert legacy_match(rule, title) == matcher(title), title
+        sample = titles if count <= 1000 else titles[:20]  # 逐条匹配在大规则量下过慢，减少样本
+        decisions = []  # 单次判定耗时
+        for _ in range(20):
+            for title in titles:
+                begin = time.perf_counter()
+                matcher(title)
+                decisions.append(time.perf_counter() - begin)
+        spread = percentiles(decisions)
+        results.append({
+            "rules": count,
+            "legacy_us": per_call(lambda t: legacy_match(rule, t), sample),
+            "compiled_us": per_call(matcher, titles),
+            "compiled_p50_us": spread["p50"],
+            "compiled_p99_us": spread["p99"],
+            "build_ms": build_ms,
+        })
+    return results
+
+
+# 生成前台窗口切换脚本
+def make_script(count: int, spacing: float, flash_every: int = 5) -> list[tuple[float, int, str]]:
+    """
+    :param count:       窗口数量
+    :param spacing:     相邻窗口切换间隔，单位为秒
+    :param flash_every: 每隔多少个窗口插入一个仅存在5毫秒的窗口
+    :return:            [(时刻, hwnd, 标题), ...]
+    """
+    script, at = [], 0.05
+    for index in range(count):
+        script.append((at, index + 1, f"window-{index}"))
+        if flash_every and index % flash_every == 0:  # 短暂出现的窗口
+            script.append((at + 0.005, 100000 + index, f"flash-{index}"))
+        at += spacing
+    return script
+
+
+# 运行事件源直到脚本结束
+def drain(source, script: list[tuple[float, int, str]], start: float, idle: float) -> tuple[list[float], int, float]:
+    """
+    :return: (检测延迟列表, 遗漏窗口数, 脚本结束后空闲期间的CPU时间)
+    """
+    at_of = {title: at for at, _, title in script}
+    delays, seen = [], set()
+    end = script[-1][0] + 0.05
+    while time.monotonic() - start < end:
+        event = source.get(0.5)
+        if event is None or not event[1]: continue  # 超时或无前台窗口
+        seen.add(event[1])
+        delays.append(time.monotonic() - start - at_of[event[1]])
+    cpu = time.process_time()
+    while time.monotonic() - start < end + idle:  # 前台窗口不再变化
+        source.get(0.5)
+    return delays, len(at_of) - len(seen), time.process_time() - cpu
+
+
+# 事件源基准测试
+def bench_events(count: int = 20, spacing: float = 0.25, idle: float = 2.0, interval: float = 0.1) -> list[dict]:
+    """
+    比较轮询与事件驱动的检测延迟、遗漏窗口数与空闲CPU占用
+    :return: [{"source": 事件源, "mean_ms": 平均延迟, "max_ms": 最大延迟, "missed": 遗漏窗口数, "idle_cpu_ms": 空闲CPU时间}, ...]
+    """
+    script = make_script(count, spacing)
+    results = []
+    for name in ("poll", "event"):
+        fake = FakeSource(script)
+        source = PollingSource(interval, fake.foreground, fake.window_text) if name == "poll" else fake
+        delays, missed, cpu = drain(source, script, fake.start, idle)
+        results.append({
+            "source": name if name == "event" else f"poll({interval}s)",
+            "mean_ms": sum(delays) / len(delays) * 1e3,
+            "max_ms": max(delays) * 1e3,
+            "missed": missed,
+            "idle_cpu_ms": cpu * 1e3,
+        })
+    desktop = Desktop()  # 判定阶段停滞时钩子事件队列不超过容量，保留最新的前台窗口
+    hwnds = [desktop.open_window(desktop.spawn(f"app{index}.exe"), f"flood-{index}", focus=False) for index in range(100)]
+    hook = HookSource(SimulatedApi(desktop), capacity=16)
+    for hwnd in hwnds: desktop.focus(hwnd)
+    assert hook.queue.qsize() == 16 and hook.dropped == 101 - 16, (hook.queue.qsize(), hook.dropped)
+    assert [hook.get(0)[1] for _ in range(16)][-1] == "flood-99"
+    hook.close()
+    return results
+
+
+# 原listen_text中的日志写入方式：每行打开一次文件并重新格式化时间
+class LegacyRecord:
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, line: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"\t[{time.strftime('%H:%M:%S', time.localtime(time.time()))}]: {line}")
+
+    def close(self):
+        pass
+
+
+# 带缓存时间戳的后台日志写入
+class BufferedRecord(RecordWriter):
+    get_time = TimeCache("%H:%M:%S")
+
+    def __init__(self, path: str):
+        super().__init__(path, capacity=100000)  # 吞吐量测试中不丢弃日志
+
+    def write(self, line: str):
+        super().write(f"\t[{self.get_time()}]: {line}")
+
+
+# 日志写入基准测试
+def bench_record(lines: int = 50000, ticks: int = 2000, period: float = 0.001,
+                 sizes: tuple[int, ...] = (32, 256)) -> list[dict]:
+    """
+    比较逐行打开文件与后台批量写入的吞吐量，以及模拟检测循环（每次循环写一行）的周期抖动
+    :param lines:  吞吐量测试的行数
+    :param ticks:  模拟检测循环的循环次数
+    :param period: 模拟检测循环的周期，单位为秒
+    :param sizes:  每行日志的字符数
+    :return:       [{"writer": 写入方式, "line_chars": 每行字符数, "lines_per_s": 吞吐量, "tick_p50_us": 单次写入中位耗时,
+                     "tick_p99_us": 单次写入99分位耗时, "jitter_us": 周期标准差}, ...]
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for size, (name, cls) in ((size, writer) for size in sizes
+                                  for writer in (("legacy", LegacyRecord), ("buffered", BufferedRecord))):
+            path = os.path.join(folder, f"{name}-{size}.log")
+            text = "x" * size
+            record = cls(path)
+            start = time.perf_counter()
+            for index in range(lines):
+                record.write(f"{text}{index};\n")
+            record.close()  # 包含写入线程排空队列的时间
+            throughput = lines / (time.perf_counter() - start)
+            # 模拟检测循环
+            record = cls(path)
+            costs, periods, last = [], [], time.perf_counter()
+            for index in range(ticks):
+                begin = time.perf_counter()
+                record.write(f"{text}{index};\n")
+                costs.append(time.perf_counter() - begin)
+                time.sleep(period)
+                now = time.perf_counter()
+                periods.append(now - last)
+                last = now
+            record.close()
+            spread = percentiles(costs)
+            results.append({
+                "writer": name,
+                "line_chars": size,
+                "lines_per_s": throughput,
+                "tick_p50_us": spread["p50"],
+                "tick_p99_us": spread["p99"],
+                "jitter_us": statistics.pstdev(periods) * 1e6,
+            })
+    return results
+
+
+# 生成item文件内容
+def make_item(rule: dict) -> str:
+    lines = [":enable(true)", ":level(2)", ";;", "[Protect]{"]
+    lines += [f"(1){title}" for title in rule["Protect"][1]] + ["}"]
+    for category in ("Ordinary", "Force", "Include", "ExInclude"):
+        lines += [f"[{category}]{{"] + rule[category] + ["}"]
+    return "\n".join(lines + [";;;;", ""])
+
+
+# 启动时读取规则的基准测试
+def bench_startup(counts: tuple[int, ...] = (1000, 10000, 50000), repeat: int = 3) -> list[dict]:
+    """
+    比较解析并编译item文件与直接加载缓存的耗时
+    :return: [{"rules": 规则数量, "parse_only_ms": 仅解析耗时, "parse_ms": 解析并编译耗时, "cached_ms": 加载缓存耗时,
+               "cache_kb": 缓存文件大小}, ...]
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        path, cache_path = os.path.join(folder, "item"), os.path.join(folder, "item.cache")
+        for count in counts:
+            text = make_item(make_rule(count))
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            parse_only, parse, cached = [], [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                parse_item(text)
+                parse_only.append(time.perf_counter() - start)
+                if os.path.exists(cache_path): os.remove(cache_path)
+                start = time.perf_counter()
+                load_rule(path, cache_path)  # 缓存不存在，解析、编译并写入缓存
+                parse.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                load_rule(path, cache_path)  # 命中缓存
+                cached.append(time.perf_counter() - start)
+            results.append({
+                "rules": count,
+                "parse_only_ms": min(parse_only) * 1e3,
+                "parse_ms": min(parse) * 1e3,
+                "cached_ms": min(cached) * 1e3,
+                "cache_kb": os.path.getsize(cache_path) / 1024,
+            })
+    return results
+
+
+# 窗口与进程枚举基准测试
+def bench_api(counts: tuple[int, ...] = (100, 1000, 10000), repeat: int = 20) -> list[dict]:
+    """
+    在模拟桌面上测量GetProcessInfo与GetWindowHandle的调用耗时随进程数、窗口数的变化
+    :param counts: 进程数，每个进程一个窗口
+    :param repeat: 每项的调用次数
+    :return: [{"count": 进程数, "process_info_us": GetProcessInfo耗时, "window_handle_us": GetWindowHandle耗时,
+               "window_diff_us": 无变化时diff耗时, "window_stream_us": stream遍历耗时}, ...]
+    """
+    results = []
+    for count in counts:
+        desktop = Desktop()
+        desktop.populate(count)
+        api = SimulatedApi(desktop)
+        get_process_info, get_window_handle = api.GetProcessInfo(), api.GetWindowHandle()
+        timing = {}
+        for name, func in (("process_info_us", get_process_info), ("window_handle_us", get_window_handle),
+                           ("window_diff_us", get_window_handle.diff),
+                           ("window_stream_us", lambda: sum(1 for _ in get_window_handle.stream()))):
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - start)
+            timing[name] = percentiles(samples)["p50"]
+        results.append({"count": count, **timing})
+    return results
+
+
+# 只计数的日志
+class CountingRecord:
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, line: str):
+        _ = line
+        self.lines += 1
+
+
+# 在子进程中导入main并在模拟桌面上运行到第一次关闭窗口，输出 “导入耗时ms 首次关闭耗时ms”，均从导入main前开始计时
+LAUNCH_SCRIPT = """
+import os, sys, time
+start = time.perf_counter()
+repo, folder = sys.argv[1], sys.argv[2]
+sys.path.insert(0, repo)
+sys.argv = [os.path.join(folder, "main.py")]  # check_file在该目录下读取item
+import main
+imported = time.perf_counter()
+from threading import Thread
+from simulate import Desktop, SimulatedApi
+desktop = Desktop()
+desktop.open_window(desktop.spawn("game.exe"), "LaunchTarget")
+main.API = SimulatedApi(desktop)
+main.check_file()
+Thread(target=main.main, args=main.get_config(), daemon=True).start()
+while not desktop.closed and time.perf_counter() - start < 30: time.sleep(0.0005)
+closed = time.perf_counter()
+main.UiExit = True
+print((imported - start) * 1e3, (closed - start) * 1e3)
+"""
+
+
+# 有界面与无界面模式的启动耗时
+def bench_launch(modes: tuple[str, ...] = ("headless", "ui"), repeat: int = 5) -> list[dict]:
+    """
+    每次在新的Python进程中从导入main开始，到模拟桌面上前台的Ordinary目标被关闭为止；
+    有界面模式在另一线程中导入PyQt6并创建窗口，与检测线程同时运行，未安装PyQt6时跳过
+    :param modes:  headless为无界面模式，ui为有界面模式
+    :param repeat: 每种模式的运行次数，取最小值
+    :return: [{"mode": 模式, "import_ms": 导入main的耗时, "first_close_ms": 导入main到第一次关闭窗口的耗时,
+               "process_ms": 包括解释器启动在内的进程总耗时}, ...]
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for mode in modes:
+        env = dict(os.environ, WINSTART_BACKEND="sim", QT_QPA_PLATFORM="offscreen")
+        if mode == "ui" and subprocess.run([sys.executable, "-c", "import PyQt6.QtWidgets"], env=env,
+                                           capture_output=True).returncode:
+            print("[launch] 未安装PyQt6，跳过有界面模式", file=sys.stderr)
+            continue
+        imports, closes, totals = [], [], []
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as folder:
+                with open(os.path.join(folder, "item"), "w", encoding="utf-8") as f:
+                    f.write(f":ui({'true' if mode == 'ui' else 'false'})\n:reload(0)\n:log_daily(false)\n;;\n"
+                            "[Ordinary]{\nLaunchTarget\n}\n;;;;\n")
+                start = time.perf_counter()
+                output = subprocess.run([sys.executable, "-c", LAUNCH_SCRIPT, repo, folder], env=env, cwd=folder,
+                                        capture_output=True, text=True, check=True).stdout
+                totals.append((time.perf_counter() - start) * 1e3)
+            imported, closed = map(float, output.split())
+            imports.append(imported)
+            closes.append(closed)
+        results.append({"mode": mode, "import_ms": min(imports), "first_close_ms": min(closes),
+                        "process_ms": min(totals)})
+    return results
+
+
+# 在模拟桌面上运行listen_text
+def bench_listen(rates: tuple[int, ...] = (1000, 5000, 20000), duration: float = 2.0, rules: int = 1000,
+                 windows: int = 200, hang_ratio: float = 0.05) -> list[dict]:
+    """
+    用Churn按指定速率改变模拟桌面，listen_text通过事件源处理所有前台窗口变化
+    :param rates:      每秒桌面操作次数
+    :param duration:   每个速率的运行秒数
+    :param rules:      规则数量
+    :param windows:    模拟桌面上的目标窗口数量
+    :param hang_ratio: 新建窗口无响应的比例，无响应的窗口处理WM_CLOSE前阻塞2秒
+    :return: [{"rate": 操作速率, "events": 前台事件数, "events_per_s": 处理速率, "drain_ms": 操作停止后处理完积压事件的耗时,
+               "closed": 关闭的窗口数, "killed": 结束的进程数, "sample_p99_ms": 采样到判定的延迟,
+               "decide_p99_ms": 判定耗时, "close_max_ms": 最长的关闭指令耗时}, ...]
+    """
+    os.environ.setdefault("WINSTART_BACKEND", "sim")  # main在非Windows系统上需使用模拟后端才能导入
+    import main
+    rule = make_rule(rules)
+    rand = random.Random(2)
+    # 约十分之一的标题命中规则
+    titles = [random_title(rand, 20) for _ in range(900)] + rule["Ordinary"][:50] + rule["Force"][:50]
+    config = parse_item("")[0]
+    config.update({"reload": "0", "listen": "hook", "level": "1", "record_all": "true"})
+    results = []
+    for rate in rates:
+        desktop = Desktop()
+        desktop.populate(windows // 2)
+        main.API = SimulatedApi(desktop)
+        main.UiExit = False
+        sources = []
+        sampler = main.Sampler
+        main.Sampler = lambda *args, **kwargs: sources.append(sampler(*args, **kwargs)) or sources[-1]  # 记录采样阶段以观察积压
+        record = CountingRecord()
+        listen = Thread(target=main.listen_text, kwargs={"config": config, "rule": rule, "matcher": RuleMatcher(rule),
+                                                         "record": record})
+        listen.start()
+        while not sources: time.sleep(0.001)
+        churn = Churn(desktop, rate, titles, windows, stubborn_ratio=0.1, hang_ratio=hang_ratio)
+        start = time.perf_counter()
+        churn.start(duration)
+        churn.thread.join()
+        stopped = time.perf_counter()
+        while not (sources[0].source.queue.empty() and sources[0].queue.empty()): time.sleep(0.001)  # 等待积压事件处理完
+        drained = time.perf_counter()
+        main.UiExit = True
+        listen.join()
+        main.Sampler = sampler
+        stages = {name: timer.summary() for name, timer in main.Stages.items()}
+        results.append({
+            "rate": rate,
+            "events": desktop.events,
+            "events_per_s": desktop.events / (drained - start),
+            "drain_ms": (drained - stopped) * 1e3,
+            "closed": desktop.closed,
+            "killed": desktop.killed,
+            "sample_p99_ms": stages["sample"]["p99_ms"],
+            "decide_p99_ms": stages["decide"]["p99_ms"],
+            "close_max_ms": stages["close"]["max_ms"],
+        })
+    return results
+
+
+# 轨迹记录与回放
+def bench_replay(samples: tuple[int, ...] = (86400, 864000), rules: int = 1000, windows: int = 500) -> list[dict]:
+    """
+    生成前台窗口轨迹（864000次采样相当于按0.1秒间隔采样一天），测量写入、读取与回放的耗时
+    :param samples: 采样数量
+    :param rules:   规则数量
+    :param windows: 轨迹中不同窗口的数量
+    :return: [{"samples": 采样数量, "bytes_per_sample": 平均每次采样的字节数, "write_ms": 写入耗时,
+               "read_ms": 读取耗时, "replay_ms": 读取并回放的耗时, "decisions": 非Pass的判定数}, ...]
+    """
+    rule = make_rule(rules)
+    matcher = RuleMatcher(rule)
+    rand = random.Random(3)
+    # 约十分之一的窗口命中规则
+    titles = [random_title(rand, 30) for _ in range(windows)] + rule["Ordinary"][:windows // 20] + rule["Force"][:windows // 20]
+    pool = [(0x10000 + i * 4, 1000 + i % 97, f"app{i % 97}.exe", title) for i, title in enumerate(titles)]
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for count in samples:
+            path = os.path.join(folder, f"trace{count}.bin")
+            stamp = time.time()
+            trace = TraceWriter(path)
+            start = time.perf_counter()
+            for _ in range(count):
+                stamp += 0.1
+                trace.write(*rand.choice(pool), timestamp=stamp)
+            trace.close()
+            written = time.perf_counter()
+            read = sum(1 for _ in read_trace(path))
+            loaded = time.perf_counter()
+            decisions = sum(1 for sample in replay(read_trace(path), matcher) if sample[5] != "Pass")
+            replayed = time.perf_counter()
+            assert read == count
+            results.append({
+                "samples": count,
+                "bytes_per_sample": os.path.getsize(path) / count,
+                "write_ms": (written - start) * 1e3,
+                "read_ms": (loaded - written) * 1e3,
+                "replay_ms": (replayed - loaded) * 1e3,
+                "decisions": decisions,
+            })
+    return results
+
+
+# 强制关闭升级调度
+def bench_escalation(counts: tuple[int, ...] = (100, 1000, 10000), ticks: int = 20000) -> list[dict]:
+    """
+    count个目标的到期时间均匀分布在1秒内，检测循环在这1秒内执行ticks次，测量每次循环的调度开销，并与逐个扫描所有目标对比
+    :param counts: 同时等待的目标数量
+    :param ticks:  检测循环次数
+    :return: [{"targets": 目标数量, "schedule_us": 平均每次加入的耗时, "tick_us": 平均每次循环的耗时,
+               "scan_tick_us": 逐个扫描时平均每次循环的耗时}, ...]
+    """
+    results = []
+    for count in counts:
+        escalator = Escalator(1.0)
+        start = time.perf_counter()
+        for i in range(count):
+            escalator.schedule(i + 1, i, f"title{i}", "Force", now=i / count)
+        scheduled = time.perf_counter()
+        due = 0
+        for tick in range(ticks):
+            now = 1.0 + tick / ticks
+            escalator.timeout(0.5, now)
+            due += len(escalator.due(now))
+        ticked = time.perf_counter()
+        # 对比：每次循环扫描所有目标
+        targets = [(1.0 + i / count, i + 1, i, f"title{i}", "Force") for i in range(count)]
+        scan_due = 0
+        scan_start = time.perf_counter()
+        for tick in range(ticks):
+            now = 1.0 + tick / ticks
+            min((target[0] for target in targets), default=now + 0.5)
+            expired = [target for target in targets if target[0] <= now]
+            if expired:
+                targets = [target for target in targets if target[0] > now]
+                scan_due += len(expired)
+        scan_end = time.perf_counter()
+        assert due == scan_due
+        results.append({
+            "targets": count,
+            "schedule_us": (scheduled - start) / count * 1e6,
+            "tick_us": (ticked - scheduled) / ticks * 1e6,
+            "scan_tick_us": (scan_end - scan_start) / ticks * 1e6,
+        })
+    return results
+
+
+# 后台扫描
+def bench_sweep(counts: tuple[int, ...] = (100, 1000, 10000), changes: int = 10, sweeps: int = 50,
+                rules: int = 1000) -> list[dict]:
+    """
+    模拟桌面上有count个窗口，两次扫描之间新建或修改标题changes个窗口，对比只判定变化的窗口与每次判定所有窗口
+    :param counts:  窗口数量
+    :param changes: 两次扫描之间变化的窗口数量
+    :param sweeps:  扫描次数
+    :param rules:   规则数量
+    :return: [{"windows": 窗口数量, "enumerate_ms": 平均每次枚举与比较的耗时, "evaluated": 平均每次判定的窗口数,
+               "match_ms": 平均每次只判定变化窗口的耗时, "full_match_ms": 平均每次判定所有窗口的耗时}, ...]
+    """
+    rule = make_rule(rules)
+    matcher = RuleMatcher(rule)
+    rand = random.Random(4)
+    titles = [random_title(rand, 30) for _ in range(1000)] + rule["Ordinary"][:50]
+    results = []
+    for count in counts:
+        desktop = Desktop()
+        for _ in range(count):
+            desktop.open_window(desktop.spawn("app.exe"), rand.choice(titles), focus=False)
+        get_window_handle = SimulatedApi(desktop).GetWindowHandle()
+        get_window_handle.diff()  # 首次枚举
+        enumerate_time = match_time = full_time = 0.0
+        evaluated = 0
+        for _ in range(sweeps):
+            for _ in range(changes):
+                if rand.random() < 0.5: desktop.open_window(desktop.spawn("app.exe"), rand.choice(titles), focus=False)
+                else: desktop.retitle(rand.choice(list(desktop.windows)), rand.choice(titles))
+            start = time.perf_counter()
+            opened, _, retitled = get_window_handle.diff()
+            enumerated = time.perf_counter()
+            for windows in (opened, retitled):
+                for _, title in windows.values(): matcher(title)
+            matched = time.perf_counter()
+            for _, title in get_window_handle.ProcessData.values(): matcher(title)
+            full = time.perf_counter()
+            enumerate_time += enumerated - start
+            match_time += matched - enumerated
+            full_time += full - matched
+            evaluated += len(opened) + len(retitled)
+        results.append({
+            "windows": count,
+            "enumerate_ms": enumerate_time / sweeps * 1e3,
+            "evaluated": evaluated / sweeps,
+            "match_ms": match_time / sweeps * 1e3,
+            "full_match_ms": full_time / sweeps * 1e3,
+        })
+    return results
+
+
+# 结束进程树
+def bench_tree(counts: tuple[int, ...] = (100, 1000, 5000), subtree: int = 64, repeat: int = 5) -> list[dict]:
+    """
+    模拟桌面上有count个进程，其中一个启动器有subtree个后代进程（每个进程最多3个子进程），
+    对比按同一个快照结束整个进程树与每结束一个进程都重新创建快照查找其子进程；
+    另有一个父进程pid与启动器相同但创建更早的进程（启动器复用了已退出进程的pid），不应被结束
+    :param counts:  进程总数
+    :param subtree: 启动器的后代进程数量
+    :param repeat:  重复次数
+    :return: [{"processes": 进程总数, "snapshot_ms": 创建一次快照的耗时, "tree_kill_ms": 单个快照结束进程树的耗时,
+               "per_pid_kill_ms": 逐个进程重新快照的耗时}, ...]
+    """
+    results = []
+    for count in counts:
+        timing = {"snapshot_ms": [], "tree_kill_ms": [], "per_pid_kill_ms": []}
+        for _ in range(repeat):
+            for name in ("tree_kill_ms", "per_pid_kill_ms"):
+                desktop = Desktop()
+                for index in range(count - subtree - 1):
+                    desktop.spawn(f"app{index}.exe")
+                pids = [desktop.spawn("launcher.exe")]
+                for index in range(subtree):
+                    pids.append(desktop.spawn(f"child{index}.exe", ppid=pids[index // 3]))
+                orphan = desktop.spawn("service.exe", ppid=pids[0])
+                desktop.processes[orphan].created = desktop.processes[pids[0]].created - 60  # 原父进程的子进程
+                api = SimulatedApi(desktop)
+                get_process_info, froce_close = api.GetProcessInfo(), api.ForceClose()
+                get_process_time = api.GetProcessTime()
+                start = time.perf_counter()
+                if name == "tree_kill_ms":
+                    table = get_process_info.snapshot()
+                    timing["snapshot_ms"].append(time.perf_counter() - start)
+                    kill_tree(froce_close, table, pids[0], get_process_time=get_process_time)
+                else:  # 每次重新快照，结束第一个找到的叶子进程
+                    while pids[0] in desktop.processes:
+                        table = get_process_info.snapshot()
+                        froce_close(table.subtree(pids[0], get_process_time)[0])
+                timing[name].append(time.perf_counter() - start)
+                assert not any(pid in desktop.processes for pid in pids)
+                assert orphan in desktop.processes
+        results.append({"processes": count, **{name: statistics.median(values) * 1e3 for name, values in timing.items()}})
+    return results
+
+
+# 进程名称缓存
+def bench_exe(counts: tuple[int, ...] = (100, 1000, 5000), lookups: int = 2000, churn: float = 0.01) -> list[dict]:
+    """
+    模拟桌面上有count个进程，按pid获取进程名称，对比ExeCache与每次创建进程快照；
+    每次查询前以churn的概率新建一个进程并查询它，模拟新打开的程序
+    :param counts:  进程数量
+    :param lookups: 查询次数
+    :param churn:   新建进程的概率
+    :return: [{"processes": 进程数量, "cached_us": ExeCache平均每次查询的耗时, "snapshot_us": 每次快照的平均耗时,
+               "misses": ExeCache创建快照的次数}, ...]
+    """
+    results = []
+    for count in counts:
+        rand = random.Random(5)
+        desktop = Desktop()
+        pids = [desktop.spawn(f"app{index}.exe") for index in range(count)]
+        api = SimulatedApi(desktop)
+        get_process_info = api.GetProcessInfo()
+        cache = ExeCache(get_process_info, api.GetProcessTime())
+        queries = [None if rand.random() < churn else rand.choice(pids) for _ in range(lookups)]  # None表示新建进程
+        start = time.perf_counter()
+        for pid in queries:
+            cache(desktop.spawn("new.exe") if pid is None else pid)
+        cached = time.perf_counter()
+        queries = [pid for pid in queries if pid is not None]
+        for pid in queries[:max(lookups // 20, 1)]:
+            _ = get_process_info.snapshot().rows[pid]
+        snapshot = time.perf_counter()
+        results.append({
+            "processes": count,
+            "cached_us": (cached - start) / lookups * 1e6,
+            "snapshot_us": (snapshot - cached) / max(lookups // 20, 1) * 1e6,
+            "misses": cache.misses,
+        })
+    return results
+
+
+# 会导致灾难性回溯的规则，应被PatternSet忽略，注释为未被忽略时的匹配耗时
+RISKY_PATTERNS = [
+    r"(re)^(\w+\s?)+$",  # 嵌套的无上限重复
+    r"(re)(.*a){12}x",  # 计数重复内的无上限重复，60个字符超过2分钟
+    r"(re)(.*a){8}x",  # 40个字符8秒
+    r"(re)^(a|aa)+$",  # 重复内可能匹配相同内容的分支，33个字符0.35秒，指数增长
+    r"(re)(a|a)*b",
+    r"(re)a.*a.*a.*a.*b",  # 顺序连接的无上限重复，256个字符10秒
+    r"(re)\w+\w+\w+!",  # 256个字符0.7秒
+]
+
+# 线性或接近线性耗时的规则，重复之间有必须匹配且不相交的字符或不自重叠的字面量，不应被忽略
+SAFE_PATTERNS = [
+    r"(re)\d+-\d+-\d+",
+    r"(re)\w+\s\w+\s\w+",
+    r"(re)[a-z]+ [a-z]+ [a-z]+",
+    r"(re).*foo.*bar.*",  # 256个字符约2ms
+]
+
+
+# 正则与通配符规则
+def bench_pattern(counts: tuple[int, ...] = (10, 100, 1000), titles: int = 200) -> list[dict]:
+    """
+    同一类型中有count条规则时的单标题判定耗时，对比原Include的逐条子串匹配、逐条正则匹配与合并后的PatternSet；
+    规则一半为通配符，一半为正则表达式，另加入RISKY_PATTERNS中会导致灾难性回溯的规则，应全部被忽略；
+    SAFE_PATTERNS中的规则应全部被接受
+    :param counts: 规则数量
+    :param titles: 标题数量，约5%的标题命中规则
+    :return: [{"rules": 规则数量, "substring_us": 逐条子串匹配耗时, "regex_loop_us": 逐条正则匹配耗时,
+               "combined_us": PatternSet耗时, "build_ms": 编译耗时, "rejected": 被忽略的规则数}, ...]
+    """
+    rand = random.Random(7)
+    word = lambda: "".join(rand.choice(string.ascii_letters) for _ in range(rand.randint(4, 8)))
+    accepted = PatternSet(SAFE_PATTERNS)
+    assert not accepted.rejected, accepted.rejected
+    results = []
+    for count in counts:
+        words = [(word(), word()) for _ in range(count)]
+        substrings = [f"{a} - {b}" for a, b in words]
+        lines = [f"(glob)*{a} - {b}*" if index % 2 else f"(re){re.escape(a)}\\s*-\\s*{re.escape(b)}"
+                 for index, (a, b) in enumerate(words)]
+        lines += RISKY_PATTERNS  # 灾难性回溯
+        sample = [random_title(rand, rand.randint(10, 60)) for _ in range(titles)]
+        for index in range(0, titles, 20):  # 命中的标题
+            sample[index] += " " + rand.choice(substrings)
+        start = time.perf_counter()
+        patterns = PatternSet(lines)
+        build_ms = (time.perf_counter() - start) * 1e3
+        compiled = patterns.compiled
+
+        def substring(title: str):  # 原listen_text中Include的逐条匹配
+            for include in substrings:
+                if include in title: return include
+            return None
+
+        def regex_loop(title: str):
+            for line, pattern in zip(patterns.lines, compiled):
+                if pattern.search(title): return line
+            return None
+
+        rejected = {line for line, _ in patterns.rejected}
+        assert rejected == set(RISKY_PATTERNS), set(RISKY_PATTERNS) - rejected
+        for title in sample:  # 校验结果一致
+            assert (substring(title) is None) == (patterns(title) is None) == (regex_loop(title) is None), title
+        results.append({
+            "rules": count,
+            "substring_us": per_call(substring, sample),
+            "regex_loop_us": per_call(regex_loop, sample),
+            "combined_us": per_call(patterns, sample),
+            "build_ms": build_ms,
+            "rejected": len(patterns.rejected),
+        })
+    return results
+
+
+# 判定结果缓存
+def bench_verdict(capacities: tuple[int, ...] = (0, 256, 4096), rules: int = 10000, patterns: int = 200,
+                  windows: int = 30, unique: float = 0.2, samples: int = 50000) -> list[dict]:
+    """
+    前台窗口在windows个窗口间来回切换，并以unique的概率出现从未见过的标题（如浏览器标签页），
+    对比不同缓存容量下的单次匹配耗时与缓存占用
+    :param capacities: 缓存容量，0表示不缓存
+    :param rules:      普通规则数量
+    :param patterns:   正则与通配符规则数量
+    :param windows:    常用窗口数量
+    :param unique:     新标题的比例
+    :param samples:    采样次数
+    :return: [{"capacity": 缓存容量, "match_us": 平均每次匹配的耗时, "hit_rate": 命中率, "entries": 结束时缓存的结果数}, ...]
+    """
+    rand = random.Random(9)
+    rule = make_rule(rules)
+    rule["Pattern"]["Include"] = [f"(re){random_title(rand, 8)}\\s+\\d+" for _ in range(patterns // 2)]
+    rule["Pattern"]["ExInclude"] = [f"(glob)*{random_title(rand, 8)}*" for _ in range(patterns - patterns // 2)]
+    matcher = RuleMatcher(rule)
+    common = [random_title(rand, rand.randint(10, 60)) for _ in range(windows)]
+    titles = [f"{random_title(rand, 30)} - Chrome" if rand.random() < unique else rand.choice(common)
+              for _ in range(samples)]
+    results = []
+    for capacity in capacities:
+        verdicts = VerdictCache(matcher, capacity)
+        start = time.perf_counter()
+        for title in titles:
+            verdicts(title)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "capacity": capacity,
+            "match_us": elapsed / samples * 1e6,
+            "hit_rate": verdicts.hits / samples,
+            "entries": len(verdicts),
+        })
+    return results
+
+
+# 结构化事件日志
+def bench_eventlog(counts: tuple[int, ...] = (100000, 1000000), days: int = 60) -> list[dict]:
+    """
+    生成days天内均匀分布的事件，对比按索引查询与逐行扫描整个文件：最近一天的全部事件、
+    最近30天某个标题的Kill事件（“上个月结束了几次微信”）
+    :param counts: 事件数量
+    :param days:   事件覆盖的天数
+    :return: [{"events": 事件数量, "write_per_s": 写入速率, "bytes_per_event": 平均每条事件的字节数,
+               "day_index_ms"/"day_scan_ms": 查询最近一天, "kill_index_ms"/"kill_scan_ms": 查询最近30天某标题的Kill事件}, ...]
+    """
+    rand = random.Random(11)
+    categories = ["Pass"] * 12 + ["Ordinary", "Force", "Include", "ExInclude", "Kill", "Protect"]
+    titles = [random_title(rand, rand.randint(10, 40)) for _ in range(500)] + ["微信"]
+    results = []
+    for count in counts:
+        now = time.time()
+        begin = now - days * 86400
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "events.jsonl")
+            writer = EventWriter(path, capacity=count + 1)
+            start = time.perf_counter()
+            for index in range(count):
+                category = rand.choice(categories)
+                title = "微信" if category == "Kill" and index % 50 == 0 else rand.choice(titles)
+                writer.write(category, title, title if category != "Pass" else "", rand.randint(4, 60000),
+                             "success" if category == "Kill" else "", begin + index * days * 86400 / count)
+            writer.close()
+            written = time.perf_counter() - start
+            size = os.path.getsize(path)
+
+            def scan(start_time: float, categories_=None, title: str = "") -> int:  # 不使用索引，逐行解析
+                total = 0
+                with open(path, "rb") as f:
+                    for line in f:
+                        event = json.loads(line)
+                        if event["t"] < start_time: continue
+                        if categories_ and event["cat"] not in categories_: continue
+                        if title and title not in event["title"]: continue
+                        total += 1
+                return total
+
+            timings = {}
+            for name, args in (("day", (now - 86400,)), ("kill", (now - 30 * 86400, {"Kill"}, "微信"))):
+                start = time.perf_counter()
+                indexed = sum(1 for _ in query(path, args[0], None, *args[1:]))
+                timings[f"{name}_index_ms"] = (time.perf_counter() - start) * 1e3
+                start = time.perf_counter()
+                assert scan(*args) == indexed
+                timings[f"{name}_scan_ms"] = (time.perf_counter() - start) * 1e3
+        results.append({"events": count, "write_per_s": count / written, "bytes_per_event": size / count, **timings})
+    return results
+
+
+# 日志轮转与压缩
+def bench_rotation(lines: int = 200000, max_kb: tuple[int, ...] = (0, 1024, 256), rate: int = 20000) -> list[dict]:
+    """
+    以固定速率写入日志，对比不轮转与按大小频繁轮转时调用方单次写入的耗时；压缩在独立线程中进行，不应影响写入耗时
+    :param lines:  写入行数
+    :param max_kb: 日志大小上限，单位为KB，0表示不轮转
+    :param rate:   每秒写入行数
+    :return: [{"max_kb": 大小上限, "write_p99_us"/"write_max_us": 单次写入耗时, "segments": 轮转次数,
+               "ratio": 压缩后大小与原大小之比, "dropped": 丢弃的行数}, ...]
+    """
+    rand = random.Random(13)
+    titles = [random_title(rand, rand.randint(10, 40)) for _ in range(300)]
+    results = []
+    for limit in max_kb:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "record.log")
+            rotation = LogRotation(path, limit * 1024, daily=False, header=lambda: "header\n") if limit else None
+            record = RecordWriter(path, rotation=rotation)
+            costs, start, raw = [], time.perf_counter(), 0
+            for index in range(lines):
+                line = f"\t[12:00:00]: [Ordinary]访客尝试打开[{rand.choice(titles)}]>>>已发送关闭窗口指令;\n"
+                raw += len(line.encode("utf-8"))
+                begin = time.perf_counter()
+                record.write(line)
+                costs.append(time.perf_counter() - begin)
+                delay = start + (index + 1) / rate - time.perf_counter()
+                if delay > 0.001: time.sleep(delay)
+            dropped = record.dropped
+            record.close()
+            stored = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+            spread = percentiles(costs)
+            results.append({
+                "max_kb": limit,
+                "write_p99_us": spread["p99"],
+                "write_max_us": spread["max"],
+                "segments": rotation.compressed if rotation else 0,
+                "ratio": stored / raw,
+                "dropped": dropped,
+            })
+    return results
+
+
+# 窗口使用时长统计
+def bench_usage(switches: tuple[int, ...] = (10000, 100000, 1000000), unique: float = 0.05, max_keys: int = 1024,
+                interval: float = 300.0) -> list[dict]:
+    """
+    模拟一天内的前台窗口切换，约unique比例为从未出现过的浏览器标签页，
+    对比record_all(true)逐条记录与按interval秒追加快照的写入量与最终占用的磁盘空间
+    :param switches: 前台窗口切换次数，均匀分布在一天内
+    :param unique:   新标题的比例
+    :param max_keys: 最多统计的窗口数量
+    :param interval: 快照间隔，单位为秒
+    :return: [{"switches": 切换次数, "focus_us": 平均每次切换的统计耗时, "keys": 结束时统计的窗口数量,
+               "raw_kb": 逐条记录的写入量与磁盘占用, "written_kb": 一天内所有快照的写入量, "disk_kb": 快照文件的大小}, ...]
+    """
+    rand = random.Random(17)
+    common = [(f"app{index % 12}.exe", random_title(rand, rand.randint(8, 30))) for index in range(60)]
+    results = []
+    for count in switches:
+        with tempfile.TemporaryDirectory() as folder:
+            usage = UsageAggregator(os.path.join(folder, "usage"), interval, max_keys)
+            day = time.mktime(time.strptime(usage.day, "%Y%m%d"))
+            step = 86400 / count
+            windows = [("chrome.exe", f"{random_title(rand, 30)} - Chrome") if rand.random() < unique
+                       else rand.choice(common) for _ in range(count)]
+            raw = sum(len(f"\t[00:00:00]: {title};\n".encode("utf-8")) for _, title in windows)
+            next_snapshot = interval
+            elapsed = 0.0
+            for index, (exe, title) in enumerate(windows):
+                now = day + index * step
+                start = time.perf_counter()
+                usage.focus(exe, title, now)
+                elapsed += time.perf_counter() - start
+                if index * step >= next_snapshot:  # 按模拟时间保存快照，不等待真实的间隔
+                    next_snapshot += interval
+                    usage._submit(now, block=True)
+            usage._submit(day + 86399, block=True)
+            usage.queue.put(None)
+            usage.thread.join()
+            results.append({
+                "switches": count,
+                "focus_us": elapsed / count * 1e6,
+                "keys": len(usage),
+                "raw_kb": raw / 1024,
+                "written_kb": usage.written / 1024,
+                "disk_kb": os.path.getsize(usage.path(usage.day)) / 1024,
+            })
+    return results
+
+
+# 指标计数与耗时记录
+def bench_metrics(count: int = 200000, windows: int = 100) -> list[dict]:
+    """
+    对比平台接口直接调用与经InstrumentedApi调用的耗时，以及计数、记录耗时与输出全部指标的耗时
+    :param count:   每项操作的次数
+    :param windows: 模拟桌面上的窗口数量
+    :return: [{"op": 操作, "plain_us": 不记录指标时平均每次的耗时, "metered_us": 记录指标时平均每次的耗时,
+               "overhead_us": 两者之差}, ...]，render一行为输出一次全部指标的耗时
+    """
+    desktop = Desktop()
+    hwnds = [desktop.open_window(desktop.spawn(f"app{index}.exe"), f"window {index}") for index in range(windows)]
+    metrics = Metrics()
+    plain, metered = SimulatedApi(desktop), InstrumentedApi(SimulatedApi(desktop), metrics)
+    targets = [hwnds[index % windows] for index in range(count)]
+    results = []
+
+    def timed(func, args) -> float:
+        start = time.perf_counter()
+        for arg in args: func(arg)
+        return (time.perf_counter() - start) / len(args) * 1e6
+
+    for name in ("GetWindowInfo", "GetWindowText"):
+        before = timed(getattr(plain, name)(), targets)
+        after = timed(getattr(metered, name)(), targets)
+        results.append({"op": name, "plain_us": before, "metered_us": after, "overhead_us": after - before})
+    counter = metrics.counter("bench_total", "基准测试")
+    histogram = metrics.histogram("bench_seconds", "基准测试")
+    values = [random.random() * 0.01 for _ in range(count)]
+    empty = timed(lambda _: None, values)  # 循环与函数调用本身的耗时
+    inc = timed(lambda _: counter.inc(), values)
+    observe = timed(histogram.observe, values)
+    results.append({"op": "counter", "plain_us": empty, "metered_us": inc, "overhead_us": inc - empty})
+    results.append({"op": "histogram", "plain_us": empty, "metered_us": observe, "overhead_us": observe - empty})
+    metrics.counter_func("bench_hits_total", "基准测试", lambda: 1234567)  # 超过百万的累计值保留全部精度
+    metrics.gauge("bench_ratio", "基准测试", lambda: 0.1)
+    text = metrics.render()
+    assert "# TYPE winstart_bench_hits_total counter\nwinstart_bench_hits_total 1234567\n" in text, text
+    assert "winstart_bench_ratio 0.1\n" in text, text
+    start = time.perf_counter()
+    for _ in range(10): metrics.render()
+    render = (time.perf_counter() - start) / 10 * 1e6
+    results.append({"op": "render", "plain_us": 0.0, "metered_us": render, "overhead_us": render})
+    return results
+
+
+# 采样性能分析
+def bench_profile(intervals: tuple[float, ...] = (0.001, 0.005, 0.02), duration: float = 2.0, rules: int = 1000,
+                  batch: int = 2000, idle: float = 0.002) -> list[dict]:
+    """
+    被分析线程循环执行 “匹配batch个标题，再等待idle秒”，对比分析前后每轮的耗时，
+    以及采样中处于匹配阶段的比例与实际比例，采样比例越接近实际比例，热点越准确
+    :param intervals: 采样间隔，单位为秒
+    :param duration:  每个采样间隔的分析时长
+    :param rules:     规则数量
+    :param batch:     每轮匹配的标题数量
+    :param idle:      每轮等待的秒数，模拟等待前台窗口变化
+    :return: [{"interval_ms": 采样间隔, "off_us": 未分析时每轮的耗时, "on_us": 分析时每轮的耗时, "samples": 采样次数,
+               "busy_pct": 实际处于匹配阶段的比例, "sampled_pct": 采样中处于匹配阶段的比例}, ...]
+    """
+    rand = random.Random(9)
+    matcher = RuleMatcher(make_rule(rules))
+    titles = [random_title(rand, 30) for _ in range(batch)]
+
+    def work():  # 一轮匹配
+        for title in titles: matcher(title)
+
+    results = []
+    for interval in intervals:
+        rounds: list[tuple[float, float]] = []  # [(匹配耗时, 总耗时), ...]
+        stopped = Event()
+        started = Event()
+        ident = []
+
+        def worker():
+            ident.append(get_ident())
+            started.set()
+            while not stopped.is_set():
+                begin = time.perf_counter()
+                work()
+                middle = time.perf_counter()
+                time.sleep(idle)
+                rounds.append((middle - begin, time.perf_counter() - begin))
+
+        thread = Thread(target=worker)
+        thread.start()
+        started.wait()
+        time.sleep(duration / 2)
+        off = len(rounds)
+        with tempfile.TemporaryDirectory() as folder:
+            profiler = SamplingProfiler(ident[0], os.path.join(folder, "profile.collapsed"), duration / 2, interval)
+            profiler.start()
+            profiler.thread.join()
+        stopped.set()
+        thread.join()
+        on = rounds[off:]
+        hot = sum(count for stack, count in profiler.stacks.items() if "matcher.py:" in stack)
+        results.append({
+            "interval_ms": interval * 1e3,
+            "off_us": statistics.mean(total for _, total in rounds[:off]) * 1e6,
+            "on_us": statistics.mean(total for _, total in on) * 1e6,
+            "samples": profiler.samples,
+            "busy_pct": sum(busy for busy, _ in on) / sum(total for _, total in on) * 100,
+            "sampled_pct": hot / max(profiler.samples, 1) * 100,
+        })
+    return results
+
+
+# 自适应轮询
+def bench_schedule(bursts: int = 3, switches: int = 10, spacing: float = 0.1, pause: float = 2.0, idle: float = 2.0,
+                   fixed: tuple[float, ...] = (0.01, 0.1),
+                   adaptive: tuple[tuple[float, float], ...] = ((0.01, 0.1), (0.01, 0.5))) -> list[dict]:
+    """
+    前台窗口成组快速切换，组之间长时间不变，对比固定间隔轮询与自适应轮询的轮询次数与检测延迟
+    :param bursts:   切换组数
+    :param switches: 每组切换次数
+    :param spacing:  组内相邻切换的间隔，单位为秒
+    :param pause:    组之间前台窗口不变的秒数
+    :param idle:     脚本结束后继续运行的秒数，用于测量空闲开销
+    :param fixed:    固定轮询间隔
+    :param adaptive: 自适应轮询的(最小间隔, 最大间隔)，组之间切换快于最大间隔的窗口可能被遗漏
+    :return: [{"source": 轮询方式, "polls_per_s": 平均每秒轮询次数, "mean_ms": 平均延迟, "max_ms": 最大延迟,
+               "missed": 遗漏窗口数, "idle_cpu_ms": 空闲CPU时间}, ...]
+    """
+    script = []
+    for burst in range(bursts):
+        offset = burst * (switches * spacing + pause)
+        script += [(at + offset, hwnd + burst * switches, f"{title}-{burst}")
+                   for at, hwnd, title in make_script(switches, spacing, flash_every=0)]
+    results = []
+    for interval in (*fixed, *adaptive):
+        fake = FakeSource(script)
+        polls = [0]
+
+        def foreground():  # 统计轮询次数
+            polls[0] += 1
+            return fake.foreground()
+
+        schedule = AdaptiveSchedule(*interval) if isinstance(interval, tuple) else None
+        source = PollingSource(0 if schedule else interval, foreground, fake.window_text, schedule)
+        delays, missed, cpu = drain(source, script, fake.start, idle)
+        results.append({
+            "source": f"adaptive({interval[0]}~{interval[1]}s)" if schedule else f"poll({interval}s)",
+            "polls_per_s": polls[0] / (time.monotonic() - fake.start),
+            "mean_ms": sum(delays) / len(delays) * 1e3,
+            "max_ms": max(delays) * 1e3,
+            "missed": missed,
+            "idle_cpu_ms": cpu * 1e3,
+        })
+    return results
+
+
+# 事件收集
+def bench_collector(agents: tuple[int, ...] = (10, 100, 200), events: int = 2000, outage: int = 200) -> list[dict]:
+    """
+    在本机启动收集端与多个NetworkSink模拟的代理，测量收集端的写入吞吐量；
+    之后停止收集端，各代理继续产生事件并写入暂存文件，重启收集端后测量补发耗时，并核对收集端的事件数
+    :param agents:  代理数量
+    :param events:  每个代理在收集端正常时产生的事件数
+    :param outage:  每个代理在收集端停止期间产生的事件数
+    :return: [{"agents": 代理数量, "events": 总事件数, "ingest_ms": 全部确认的耗时, "events_per_s": 每秒写入事件数,
+               "batches": 批次数, "spooled": 停止期间暂存的事件数, "drain_ms": 重启后补发完的耗时,
+               "stored": 收集端事件文件中的事件数, "query_ms": 按代理查询的耗时}, ...]
+    """
+    results = []
+    loop = asyncio.new_event_loop()
+    thread = Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def call(coro):  # 在收集端的事件循环中执行
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def wait(condition, limit: float = 60.0) -> float:
+        start = time.perf_counter()
+        while not condition() and time.perf_counter() - start < limit: time.sleep(0.005)
+        return (time.perf_counter() - start) * 1e3
+
+    for count in agents:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "fleet.jsonl")
+            collector = Collector(EventStore(path), "127.0.0.1", 0)
+            call(collector.start())
+            port = collector.port
+            sinks = [NetworkSink(("127.0.0.1", port), f"PC-{index:03}", os.path.join(folder, f"{index}.spool"),
+                                 flush_interval=0.05, retry=(0.05, 0.2)) for index in range(count)]
+            start = time.perf_counter()
+            for index in range(events):
+                for sink in sinks: sink.write("Close", f"window {index}", "rule", index, "close_sent")
+            wait(lambda: sum(sink.sent for sink in sinks) >= count * events)
+            ingest = (time.perf_counter() - start) * 1e3
+            batches = collector.store.batches
+            call(collector.close())
+            for index in range(outage):
+                for sink in sinks: sink.write("Kill", f"offline {index}", "", index, "success")
+            wait(lambda: sum(sink.spooled for sink in sinks) >= count * outage, 10.0)
+            spooled = sum(sink.spooled for sink in sinks)
+            collector = Collector(EventStore(path), "127.0.0.1", port)
+            call(collector.start())
+            drain = wait(lambda: sum(sink.sent for sink in sinks) >= count * (events + outage))
+            for sink in sinks: sink.close()
+            call(collector.close())
+            stored = sum(1 for _ in query(path))
+            start = time.perf_counter()
+            sum(1 for _ in query(path, agent="PC-000"))
+            results.append({
+                "agents": count,
+                "events": count * events,
+                "ingest_ms": ingest,
+                "events_per_s": count * events / ingest * 1e3,
+                "batches": batches,
+                "spooled": spooled,
+                "drain_ms": drain,
+                "stored": stored,
+                "query_ms": (time.perf_counter() - start) * 1e3,
+            })
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    with tempfile.TemporaryDirectory() as folder:  # 代理多次重启后只保留最近的会话，重启收集端后仍能识别重发
+        path = os.path.join(folder, "fleet.jsonl")
+        store = EventStore(path)
+        for session in range(SESSIONS * 4):
+            for seq in (1, 2): store.append("PC-000", session, seq, 0.0, 0.0, 1, b'{"t":0}\n')
+            store.flush()
+        store.close()
+        store = EventStore(path)
+        assert list(store.seen["PC-000"]) == [str(session) for session in range(SESSIONS * 3, SESSIONS * 4)]
+        assert not store.append("PC-000", SESSIONS * 4 - 1, 2, 0.0, 0.0, 1, b'{"t":0}\n')
+        store.close()
+        with open(f"{path}.agents", "r", encoding="utf-8") as f: assert len(f.readlines()) == 1
+    return results
+
+
+# 基准测试列表，{名称: (函数, 快速模式参数)}
+BENCHMARKS = {
+    "matcher": (bench_matcher, {"counts": (10, 1000, 10000)}),
+    "events": (bench_events, {"count": 8}),
+    "record": (bench_record, {"lines": 10000, "ticks": 500}),
+    "startup": (bench_startup, {"counts": (1000, 10000), "repeat": 1}),
+    "api": (bench_api, {"counts": (100, 1000), "repeat": 5}),
+    "listen": (bench_listen, {"rates": (1000, 5000), "duration": 1.0}),
+    "replay": (bench_replay, {"samples": (10000, 86400)}),
+    "escalation": (bench_escalation, {"counts": (100, 1000), "ticks": 5000}),
+    "sweep": (bench_sweep, {"counts": (100, 1000), "sweeps": 10}),
+    "tree": (bench_tree, {"counts": (100, 1000), "repeat": 2}),
+    "exe": (bench_exe, {"counts": (100, 1000), "lookups": 500}),
+    "pattern": (bench_pattern, {"counts": (10, 100)}),
+    "verdict": (bench_verdict, {"capacities": (0, 256), "samples": 10000}),
+    "eventlog": (bench_eventlog, {"counts": (100000,)}),
+    "rotation": (bench_rotation, {"lines": 40000}),
+    "usage": (bench_usage, {"switches": (10000, 100000)}),
+    "metrics": (bench_metrics, {"count": 20000}),
+    "profile": (bench_profile, {"intervals": (0.005,), "duration": 1.0}),
+    "schedule": (bench_schedule, {"bursts": 2, "pause": 1.0, "idle": 1.0}),
+    "collector": (bench_collector, {"agents": (10, 50), "events": 500, "outage": 50}),
+    "launch": (bench_launch, {"repeat": 2}),
+}
+
+
+# 运行基准测试
+def run(names: list[str] | None = None, quick: bool = False) -> dict:
+    """
+    :param names: 基准测试名称，None表示全部
+    :param quick: 是否使用较小的参数
+    :return:      {"meta": 运行环境, "results": {名称: [结果, ...]}}
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        func, quick_kwargs = BENCHMARKS[name]
+        start = time.perf_counter()
+        results[name] = func(**quick_kwargs) if quick else func()
+        print(f"[{name}] {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+# 对比两次结果
+def compare(old: dict, new: dict, threshold: float = 0.1) -> list[str]:
+    """
+    按行顺序对比同名基准测试的数值，单位为us/ms的指标越小越好，单位为/s的指标越大越好
+    :param old:       旧结果
+    :param new:       新结果
+    :param threshold: 变差超过该比例时视为退化
+    :return:          退化说明列表
+    """
+    regressions = []
+    for name, rows in new["results"].items():
+        for old_row, new_row in zip(old["results"].get(name, []), rows):
+            for key, value in new_row.items():
+                before = old_row.get(key)
+                if not isinstance(value, float) or not isinstance(before, float) or before <= 0: continue
+                if key.endswith(("_us", "_ms")): change = value / before - 1  # 耗时增加
+                elif key.endswith("_per_s"): change = before / value - 1 if value > 0 else float("inf")  # 吞吐量下降
+                else: continue
+                if change > threshold:
+                    label = ", ".join(f"{k}={v}" for k, v in new_row.items() if not isinstance(v, float))
+                    regressions.append(f"[{name}] {label}: {key} {before:.2f} -> {value:.2f} (+{change:.0%})")
+    return regressions
+
+
+# 打印结果表格
+def print_table(name: str, rows: list[dict]):
+    if not rows: return
+    keys = list(rows[0])
+    widths = [max(len(key), 10) for key in keys]
+    print(f"[{name}]")
+    print(" ".join(f"{key:>{width}}" for key, width in zip(keys, widths)))
+    for row in rows:
+        cells = (f"{row[key]:.2f}" if isinstance(row[key], float) else str(row[key]) for key in keys)
+        print(" ".join(f"{cell:>{width}}" for cell, width in zip(cells, widths)))
+    print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="WinStart基准测试")
+    parser.add_argument("names", nargs="*", help=f"要运行的基准测试，默认全部，可选: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="使用较小的参数快速运行")
+    parser.add_argument("--json", metavar="PATH", help="将结果写入JSON文件")
+    parser.add_argument("--compare", metavar="PATH", help="与之前的JSON结果对比，存在退化时返回码为1")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown: parser.error(f"未知的基准测试: {', '.join(unknown)}")
+    report = run(args.names or None, args.quick)
+    for bench_name, bench_rows in report["results"].items():
+        print_table(bench_name, bench_rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            found = compare(json.load(file), report)
+        print("\n".join(found) if found else "未发现退化")
+        sys.exit(1 if found else 0)
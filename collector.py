@@ -0,0 +1,265 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+from eventlog import INDEX, recover_index
+from netsink import ACK, FRAME, VERSION
+
+__all__ = ["EventStore", "Collector", "serve"]
+
+SESSIONS = 8  # 每个代理保留的最近会话数，更早会话的重发批次无法识别
+COMPACT = 1000  # 批次序号文件追加多少行后重写一次
+
+
+# 收集端的事件存储
+class EventStore:
+    def __init__(self, path: str):
+        """
+        与EventWriter的事件文件格式相同，每行增加 "agent" 字段，可直接用eventlog.query与eventlog.py查询；
+        每收到一批事件追加一块及其索引，块的时间范围与类型位掩码取自批次头，写入时不解析JSON
+        已写入的(代理, 会话, 最大批次序号)保存在 事件文件路径 + ".agents"，重启后仍能识别重发的批次；
+        每个代理只保留最近SESSIONS个会话，每次刷新只追加变化的会话一行，追加COMPACT行或启动时重写
+        :param path: 事件文件路径
+        """
+        self.path = path
+        self.data = open(path, "ab+")
+        self.index = open(f"{path}.idx", "ab+")
+        self.offset = recover_index(self.data, self.index)
+        self.seen: dict[str, dict[str, int]] = {}  # {代理: {会话: 已写入的最大批次序号}, ...}，按最近写入排序
+        self.dirty: dict[str, dict[str, int]] = {}  # 未写入批次序号文件的会话
+        try:
+            with open(f"{path}.agents", "r", encoding="utf-8") as f:
+                for line in f:  # 每行为 {代理: {会话: 批次序号}}，按写入顺序覆盖
+                    try: update = json.loads(line)
+                    except ValueError: continue  # 异常退出时未写完的行
+                    for agent, sessions in update.items():
+                        for key, seq in sessions.items(): self._remember(agent, key, seq)
+        except OSError: pass
+        self.journal = None  # 批次序号文件
+        self.lines = 0  # 批次序号文件重写后追加的行数
+        self._compact()
+        self.changed = False  # 是否有未刷新的内容
+        self.events = 0  # 本次运行写入的事件数
+        self.batches = 0  # 本次运行写入的批次数
+        self.duplicates = 0  # 重发而跳过的批次数
+
+    def append(self, agent: str, session: int, seq: int, first: float, last: float, mask: int,
+               payload: bytes) -> bool:
+        """
+        追加一批事件，写入缓冲区，调用flush后才写入文件
+        :param agent:   代理名称
+        :param session: 会话编号
+        :param seq:     批次序号
+        :param first:   批内最早时间
+        :param last:    批内最晚时间
+        :param mask:    批内事件类型的位掩码
+        :param payload: JSON行
+        :return:        是否写入，重发的批次返回False
+        """
+        key = str(session)
+        if seq <= self.seen.get(agent, {}).get(key, 0):
+            self.duplicates += 1
+            return False
+        prefix = b'{"agent":' + json.dumps(agent, ensure_ascii=False).encode("utf-8") + b","
+        lines = [prefix + line[1:] + b"\n" for line in payload.splitlines() if line.startswith(b"{")]
+        block = b"".join(lines)
+        self.data.write(block)
+        self.index.write(INDEX.pack(first, last, self.offset, len(block), mask))
+        self.offset += len(block)
+        self._remember(agent, key, seq)
+        self.dirty.setdefault(agent, {})[key] = seq
+        self.changed = True
+        self.events += len(lines)
+        self.batches += 1
+        return True
+
+    def flush(self):
+        """
+        写入事件、索引与变化的批次序号，先写入事件与索引，异常退出时最多重复写入一批
+        """
+        if not self.changed: return
+        self.data.flush()
+        self.index.flush()
+        dirty, self.dirty = self.dirty, {}
+        if self.lines >= COMPACT: self._compact()
+        elif self.journal:
+            try:
+                self.journal.write(json.dumps(dirty, ensure_ascii=False) + "\n")
+                self.journal.flush()
+                self.lines += 1
+            except OSError: pass
+        self.changed = False
+
+    def close(self):
+        self.flush()
+        self.data.close()
+        self.index.close()
+        if self.journal: self.journal.close()
+
+    # 记录会话的批次序号，超过SESSIONS个时移除最久未写入的会话
+    def _remember(self, agent: str, key: str, seq: int):
+        sessions = self.seen.setdefault(agent, {})
+        sessions.pop(key, None)
+        sessions[key] = seq
+        if len(sessions) > SESSIONS: del sessions[next(iter(sessions))]
+
+    # 用当前的批次序号重写批次序号文件，之后以追加方式打开
+    def _compact(self):
+        if self.journal: self.journal.close()
+        temp = f"{self.path}.agents.{os.getpid()}.tmp"
+        try:
+            with open(temp, "w", encoding="utf-8") as f:
+                f.write(json.dumps(self.seen, ensure_ascii=False) + "\n")
+            os.replace(temp, f"{self.path}.agents")
+            self.lines = 0
+        except OSError: pass
+        try: self.journal = open(f"{self.path}.agents", "a", encoding="utf-8")
+        except OSError: self.journal = None
+
+
+# 事件收集服务
+class Collector:
+    def __init__(self, store: EventStore, host: str = "0.0.0.0", port: int = 9400, token: str = "",
+                 commit_interval: float = 0.02, max_frame: int = 16 << 20):
+        """
+        用asyncio同时接收多个代理的连接，各连接的批次依次写入同一个EventStore；
+        每commit_interval秒刷新一次存储后再统一回复这段时间内收到的批次的确认，多个代理共用一次写入
+        :param store:           事件存储
+        :param host:            监听地址
+        :param port:            端口，0表示由系统分配
+        :param token:           口令，空字符串表示不验证
+        :param commit_interval: 刷新存储与回复确认的间隔，单位为秒
+        :param max_frame:       单批内容的最大字节数，超过时断开连接
+        """
+        self.store = store
+        self.host = host
+        self.port = port
+        self.token = token
+        self.commit_interval = commit_interval
+        self.max_frame = max_frame
+        self.server: asyncio.Server | None = None
+        self.acks: list[tuple[asyncio.StreamWriter, bytes]] = []  # 等待刷新后回复的确认
+        self.commit: asyncio.TimerHandle | None = None
+        self.agents: dict[str, int] = {}  # {代理: 当前连接数, ...}
+        self.writers: set[asyncio.StreamWriter] = set()  # 当前连接
+        self.connections = 0  # 累计连接数
+        self.rejected = 0  # 拒绝的连接数
+        self.failures = 0  # 写入存储失败的次数
+        self.started = time.monotonic()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # 实际监听的端口
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            for writer in list(self.writers): writer.close()  # 未确认的批次由代理重连后重发
+            await self.server.wait_closed()
+        if self.commit: self.commit.cancel()
+        self._commit()
+        self.store.close()
+
+    # 刷新存储后回复确认
+    def _commit(self):
+        self.commit = None
+        acks, self.acks = self.acks, []
+        try: self.store.flush()
+        except OSError as error:  # 磁盘已满等，不确认，断开连接后由代理重发
+            self._fail("刷新存储", error)
+            for writer, _ in acks: writer.close()
+            return
+        for writer, ack in acks:
+            if not writer.is_closing(): writer.write(ack)
+
+    # 记录写入存储失败
+    def _fail(self, action: str, error: OSError, agent: str = ""):
+        self.failures += 1
+        print(f"{action}失败{f'({agent})' if agent else ''}: {error}", file=sys.stderr)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        agent = ""
+        self.writers.add(writer)
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), 10))
+            if not isinstance(hello, dict): raise ValueError("握手格式错误")
+            agent = str(hello.get("agent", ""))
+            error = ("代理名称为空" if not agent else "口令错误" if self.token and hello.get("token") != self.token
+                     else "协议版本不一致" if hello.get("version") != VERSION else "")
+            if error:
+                self.rejected += 1
+                writer.write(json.dumps({"ok": False, "error": error}, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+                return
+            writer.write(b'{"ok": true}\n')
+            self.connections += 1
+            self.agents[agent] = self.agents.get(agent, 0) + 1
+            loop = asyncio.get_running_loop()
+            while True:
+                header = await reader.readexactly(FRAME.size)
+                length, session, seq, first, last, mask = FRAME.unpack(header)
+                if length > self.max_frame: break
+                payload = await reader.readexactly(length)
+                try: self.store.append(agent, session, seq, first, last, mask, payload)  # 重发的批次同样确认
+                except OSError as error:  # 磁盘已满等，断开连接，未确认的批次由代理重连后重发
+                    self._fail("写入事件", error, agent)
+                    break
+                self.acks.append((writer, ACK.pack(session, seq)))
+                if self.commit is None: self.commit = loop.call_later(self.commit_interval, self._commit)
+                if writer.transport.get_write_buffer_size() > 1 << 16: await writer.drain()  # 代理不读取确认
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass  # 连接断开或握手格式错误
+        finally:
+            self.writers.discard(writer)
+            if agent in self.agents:
+                self.agents[agent] -= 1
+                if not self.agents[agent]: del self.agents[agent]
+            writer.close()
+
+    def summary(self) -> str:
+        """
+        :return: 单行文本，如 “在线代理3个，累计连接5次，拒绝0次；写入1200条(80条/秒)，300批，重发2批，写入失败0次”
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (f"在线代理{len(self.agents)}个，累计连接{self.connections}次，拒绝{self.rejected}次；"
+                f"写入{self.store.events}条({self.store.events / elapsed:.0f}条/秒)，{self.store.batches}批，"
+                f"重发{self.store.duplicates}批，写入失败{self.failures}次")
+
+
+# 运行收集服务直到被中断
+async def serve(path: str, host: str = "0.0.0.0", port: int = 9400, token: str = "", report: float = 60.0):
+    """
+    :param path:   事件文件路径
+    :param host:   监听地址
+    :param port:   端口
+    :param token:  口令，空字符串表示不验证
+    :param report: 每隔多少秒输出一次统计，0表示不输出
+    """
+    collector = Collector(EventStore(path), host, port, token)
+    await collector.start()
+    print(f"收集服务已启动: {host}:{collector.port} -> {path}", file=sys.stderr)
+    try:
+        while True:
+            await asyncio.sleep(report or 3600)
+            if report: print(collector.summary(), file=sys.stderr)
+    finally:
+        await collector.close()
+        print(collector.summary(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    # 用法: python collector.py 事件文件 [--host 地址] [--port 端口] [--token 口令] [--report 秒]
+    # 例:   python collector.py fleet.jsonl --port 9400，查询: python eventlog.py fleet.jsonl --agent PC-01 --count
+    import argparse
+
+    parser = argparse.ArgumentParser(description="接收多台电脑上WinStart发送的事件")
+    parser.add_argument("path", help="事件文件路径，如fleet.jsonl")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=9400, help="端口")
+    parser.add_argument("--token", default="", help="口令，与各代理item中的collector_token一致")
+    parser.add_argument("--report", type=float, default=60.0, help="每隔多少秒输出一次统计，0表示不输出")
+    args = parser.parse_args()
+    try: asyncio.run(serve(args.path, args.host, args.port, args.token, args.report))
+    except KeyboardInterrupt: pass
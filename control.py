@@ -0,0 +1,63 @@
+import socket
+import sys
+from threading import Thread
+
+__all__ = ["ControlServer", "send_command"]
+
+
+# 本地控制通道
+class ControlServer:
+    def __init__(self, port: int, handlers: dict):
+        """
+        在127.0.0.1上监听控制命令，每个连接发送一行 “命令 参数”，返回一行结果；
+        每个连接在独立线程中处理，不发送内容的连接或较慢的命令（如密码错误后的延迟）不影响其他连接
+        :param port:     端口，0表示由系统分配
+        :param handlers: {命令: 处理函数}，处理函数的参数为参数字符串，返回结果字符串；可能被多个线程同时调用
+        """
+        self.handlers = handlers
+        self.server = socket.create_server(("127.0.0.1", port))
+        self.port = self.server.getsockname()[1]  # 实际监听的端口
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.close()
+
+    def _run(self):
+        while True:
+            try: conn, _ = self.server.accept()
+            except OSError: break  # 已关闭
+            Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    # 处理一个连接
+    def _handle(self, conn: socket.socket):
+        with conn:
+            conn.settimeout(5)
+            try: line = conn.makefile("r", encoding="utf-8").readline().strip()
+            except (OSError, UnicodeDecodeError): return  # 超时或非法数据
+            name, _, arg = line.partition(" ")
+            handler = self.handlers.get(name)
+            reply = handler(arg) if handler else f"未知命令[{name}]，可用命令: {', '.join(self.handlers)}"
+            try: conn.sendall(f"{reply}\n".encode("utf-8"))
+            except OSError: pass
+
+
+# 发送控制命令
+def send_command(port: int, command: str, timeout: float = 10) -> str:
+    """
+    :param port:    控制通道端口
+    :param command: 命令行，如 “exit 123456”
+    :param timeout: 超时时间，单位为秒
+    :return:        结果
+    """
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as conn:
+        conn.sendall(f"{command}\n".encode("utf-8"))
+        return conn.makefile("r", encoding="utf-8").readline().strip()
+
+
+if __name__ == '__main__':
+    # 用法: python control.py 端口 命令 [参数]
+    if len(sys.argv) < 3:
+        print("用法: python control.py 端口 命令 [参数]")
+        sys.exit(1)
+    print(send_command(int(sys.argv[1]), " ".join(sys.argv[2:])))
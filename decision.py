@@ -0,0 +1,101 @@
+from collections import OrderedDict
+
+from matcher import RuleMatcher
+
+__all__ = ["VerdictCache", "Decider"]
+
+_MISSING = object()  # 缓存中没有该键
+
+
+# 判定结果缓存
+class VerdictCache:
+    MAX_TITLE = 512  # 超过该长度的标题不缓存，与capacity一起限制内存占用
+
+    def __init__(self, matcher: RuleMatcher, capacity: int = 1024):
+        """
+        缓存最近使用的 “(窗口标题, 进程名称): 匹配结果”，容量已满时淘汰最久未使用的结果；与规则匹配器接口相同，可直接替换
+        :param matcher:  规则匹配器
+        :param capacity: 最多缓存的结果数量，0表示不缓存
+        """
+        self.matcher = matcher
+        self.capacity = max(capacity, 0)
+        self.cache: OrderedDict[tuple[str, str], tuple[str, str] | None] = OrderedDict()
+        self.hits = 0  # 命中次数
+        self.misses = 0  # 未命中次数
+        self.invalidations = 0  # 因规则变化清空的次数
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def update(self, matcher: RuleMatcher):
+        """
+        替换规则匹配器，并清空所有缓存的结果
+        :param matcher: 新的规则匹配器
+        """
+        self.matcher = matcher
+        self.cache.clear()
+        self.invalidations += 1
+
+    def __call__(self, title: str, exe: str = "") -> tuple[str, str] | None:
+        """
+        见RuleMatcher.__call__
+        """
+        key = (title, exe)
+        result = self.cache.get(key, _MISSING)
+        if result is not _MISSING:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = self.matcher(title, exe)
+        if self.capacity and len(title) <= self.MAX_TITLE:
+            self.cache[key] = result
+            if len(self.cache) > self.capacity: self.cache.popitem(last=False)
+        return result
+
+    def summary(self) -> str:
+        """
+        :return: 单行文本，如 “verdict_cache: 12/1024 命中98次 未命中3次 命中率97.0%”
+        """
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return (f"verdict_cache: {len(self.cache)}/{self.capacity} 命中{self.hits}次 未命中{self.misses}次 "
+                f"命中率{rate:.1f}% 清空{self.invalidations}次")
+
+
+# 检测判定，不调用任何系统接口，可在检测线程中使用，也可离线回放轨迹
+class Decider:
+    def __init__(self, matcher: RuleMatcher):
+        """
+        按前台窗口序列判定应执行的动作，同一窗口标题只判定一次；强制关闭目标的后续检查见escalation.Escalator
+        :param matcher: 规则匹配器，可以是带缓存的VerdictCache
+        """
+        self.matcher = matcher
+        self.last_text = ""  # 上一次检测的窗口标题
+        self.last_hwnd = 0  # 上一次检测的窗口句柄
+
+    def update(self, matcher: RuleMatcher) -> tuple[int, str]:
+        """
+        替换规则匹配器，并清空上一个窗口标题以便按新规则重新检测
+        :param matcher: 新的规则匹配器
+        :return:        (hwnd, 窗口标题)，需要重新检测的当前窗口
+        """
+        self.matcher = matcher
+        current, self.last_text = (self.last_hwnd, self.last_text), ""
+        return current
+
+    def __call__(self, hwnd: int, window_text: str, exe: str = "") -> tuple[str, str] | None:
+        """
+        :param hwnd:        前台窗口句柄
+        :param window_text: 前台窗口标题
+        :param exe:         前台窗口所属进程名称，为空时只按窗口标题判定
+        :return:            (动作, 命中的规则) | None，None表示无需处理；
+                            动作为规则类型(Protect/Ordinary/Force/Include/ExInclude)，Pass表示新窗口未命中规则
+        """
+        if not hwnd or not window_text: return None  # 窗口无效，跳过
+        if window_text == "InkWn": return None  # 自己写的程序，跳过
+        if window_text == self.last_text: return None  # 窗口标题未变化，跳过
+        self.last_text, self.last_hwnd = window_text, hwnd  # 更新窗口标题
+        result = self.matcher(window_text, exe)  # 按优先级匹配规则
+        if result is None: return "Pass", ""
+        return result
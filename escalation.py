@@ -0,0 +1,64 @@
+import heapq
+import time
+
+__all__ = ["Escalator"]
+
+
+# 强制关闭升级调度
+class Escalator:
+    def __init__(self, delay: float):
+        """
+        记录已发送关闭指令的强制关闭目标，到期后由检测线程检查窗口是否仍存在，与前台窗口无关；
+        目标按到期时间存放在堆中，每次检查只取出已到期的目标
+        :param delay: 发送关闭指令后等待多少秒再检查，单位为秒
+        """
+        self.delay = delay
+        self.heap: list[tuple[float, int, int, int, str, str]] = []  # [(到期时间, 序号, hwnd, pid, 窗口标题, 规则类型), ...]
+        self.pending: set[int] = set()  # 堆中目标的hwnd，同一窗口只记录一次
+        self.count = 0  # 序号，到期时间相同时按加入顺序取出
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def schedule(self, hwnd: int, pid: int, window_text: str, category: str, now: float | None = None,
+                 delay: float | None = None) -> bool:
+        """
+        加入目标
+        :param hwnd:        窗口句柄
+        :param pid:         窗口所属进程pid，用于识别被复用的hwnd
+        :param window_text: 窗口标题
+        :param category:    命中的规则类型，Force或ExInclude
+        :param now:         当前时刻(time.monotonic)，默认为调用时刻
+        :param delay:       等待多少秒再检查，默认为创建时的delay
+        :return:            是否已加入，窗口已在等待中时返回False
+        """
+        if hwnd in self.pending: return False
+        deadline = (time.monotonic() if now is None else now) + (self.delay if delay is None else delay)
+        self.count += 1
+        heapq.heappush(self.heap, (deadline, self.count, hwnd, pid, window_text, category))
+        self.pending.add(hwnd)
+        return True
+
+    def timeout(self, default: float, now: float | None = None) -> float:
+        """
+        :param default: 没有目标时的等待时间，单位为秒
+        :param now:     当前时刻(time.monotonic)，默认为调用时刻
+        :return:        距最早到期的目标的秒数，不超过default
+        """
+        if not self.heap: return default
+        remain = self.heap[0][0] - (time.monotonic() if now is None else now)
+        return min(max(remain, 0), default)
+
+    def due(self, now: float | None = None) -> list[tuple[int, int, str, str]]:
+        """
+        取出已到期的目标
+        :param now: 当前时刻(time.monotonic)，默认为调用时刻
+        :return:    [(hwnd, pid, 窗口标题, 规则类型), ...]
+        """
+        now = time.monotonic() if now is None else now
+        result = []
+        while self.heap and self.heap[0][0] <= now:
+            _, _, hwnd, pid, window_text, category = heapq.heappop(self.heap)
+            self.pending.discard(hwnd)
+            result.append((hwnd, pid, window_text, category))
+        return result
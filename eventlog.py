@@ -0,0 +1,262 @@
+import json
+import os
+import queue
+import struct
+import sys
+import time
+from threading import Lock, Thread
+
+__all__ = ["CATEGORIES", "EventWriter", "recover_index", "read_index", "query"]
+
+# 事件文件格式：每行一个JSON对象 {"t": Unix时间, "cat": 类型, "title": 窗口标题, "rule": 命中的规则, "pid": pid, "outcome": 结果}
+# 索引文件（事件文件路径 + ".idx"）：每写入一块事件追加一条定长记录
+#   <ddQII: 块内最早时间, 块内最晚时间, 块在事件文件中的偏移, 块的字节数, 块内事件类型的位掩码
+# 查询时只读取时间范围与事件类型都可能命中的块；程序异常退出时未写入索引的事件在下次打开时补建索引
+CATEGORIES = ("Protect", "Ordinary", "Force", "Include", "ExInclude", "Pass", "Close", "Kill", "Exit", "Info")
+INDEX = struct.Struct("<ddQII")
+OTHER = 1 << 31  # 未知类型
+
+
+# 事件类型的位掩码
+def _mask(categories) -> int:
+    mask = 0
+    for category in categories:
+        mask |= 1 << CATEGORIES.index(category) if category in CATEGORIES else OTHER
+    return mask
+
+
+# 补建索引
+def recover_index(data, index) -> int:
+    """
+    补建异常退出时未写入索引的事件的索引，去除不完整的索引记录
+    :param data:  以 “ab+” 打开的事件文件
+    :param index: 以 “ab+” 打开的索引文件
+    :return:      事件文件的写入位置
+    """
+    index.seek(0, os.SEEK_END)
+    index.truncate(index.tell() - index.tell() % INDEX.size)  # 去除不完整的索引记录
+    end = 0
+    if index.tell():
+        index.seek(-INDEX.size, os.SEEK_END)
+        _, _, offset, length, _ = INDEX.unpack(index.read(INDEX.size))
+        end = offset + length
+    data.seek(0, os.SEEK_END)
+    size = data.tell()
+    if end > size: end = size  # 事件文件被截断，之前的索引仍可使用，查询时按实际内容解析
+    if end < size:
+        data.seek(end)
+        tail = data.read()
+        if not tail.endswith(b"\n"):  # 不完整的最后一行，补换行后查询时跳过该行
+            data.write(b"\n")
+            tail += b"\n"
+        events = []
+        for line in tail.splitlines():
+            try: events.append(json.loads(line))
+            except ValueError: pass
+        if events:
+            times = [event.get("t", 0) for event in events]
+            index.write(INDEX.pack(min(times), max(times), end, len(tail), _mask(e.get("cat") for e in events)))
+        else:
+            index.write(INDEX.pack(0, 0, end, len(tail), 0))
+    index.flush()
+    return data.tell()
+
+
+# 结构化事件日志写入
+class EventWriter:
+    def __init__(self, path: str, block_size: int = 256, capacity: int = 10000, flush_interval: float = 0.5):
+        """
+        事件先进入有界队列，由写入线程追加到事件文件，每block_size条事件或每次刷新时为已写入的事件追加一条索引
+        :param path:           事件文件路径
+        :param block_size:     每块最多的事件数量
+        :param capacity:       队列容量，队列已满时丢弃新事件并计数
+        :param flush_interval: 距上次刷新超过多少秒后刷新到磁盘
+        """
+        self.path = path
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue[dict | None] = queue.Queue(capacity)
+        self.dropped = 0  # 因队列已满丢弃的事件数
+        self.lock = Lock()  # 保护dropped，写入线程读取并清零时不丢失其他线程的计数
+        self.written = 0  # 已写入的事件数
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, category: str, title: str, rule: str = "", pid: int = 0, outcome: str = "",
+              timestamp: float | None = None):
+        """
+        写入一条事件，不阻塞，可在任意线程中调用
+        :param category:  事件类型，见CATEGORIES
+        :param title:     窗口标题
+        :param rule:      命中的规则内容
+        :param pid:       窗口所属进程pid，未知时为0
+        :param outcome:   结果，如close_sent、success、fail
+        :param timestamp: 事件时间(Unix时间)，默认为当前时间
+        """
+        event = {"t": round(time.time() if timestamp is None else timestamp, 3), "cat": category, "title": title,
+                 "rule": rule, "pid": pid, "outcome": outcome}
+        try: self.queue.put_nowait(event)
+        except queue.Full:
+            with self.lock: self.dropped += 1
+
+    def close(self):
+        """
+        写入剩余事件与索引并结束写入线程
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        with open(self.path, "ab+") as data, open(f"{self.path}.idx", "ab+") as index:
+            offset = recover_index(data, index)
+            block: list[bytes] = []  # 当前块中尚未写入索引的事件
+            first = last = 0.0
+            mask = 0
+            pending = False  # 是否有未刷新的事件
+            last_flush = time.monotonic()
+            running = True
+            while running:
+                try: events = [self.queue.get(timeout=self.flush_interval)]
+                except queue.Empty: events = []
+                while len(events) < self.block_size:  # 取出队列中已有的事件
+                    try: events.append(self.queue.get_nowait())
+                    except queue.Empty: break
+                if None in events:  # 收到结束信号
+                    events = events[:events.index(None)]
+                    running = False
+                if self.dropped:
+                    with self.lock: dropped, self.dropped = self.dropped, 0
+                    events.append({"t": round(time.time(), 3), "cat": "Info", "title": "", "rule": "", "pid": 0,
+                                   "outcome": f"dropped {dropped}"})
+                for event in events:
+                    line = json.dumps(event, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+                    data.write(line)
+                    if not block: first = last = event["t"]
+                    first, last = min(first, event["t"]), max(last, event["t"])
+                    mask |= 1 << CATEGORIES.index(event["cat"]) if event["cat"] in CATEGORIES else OTHER
+                    block.append(line)
+                    pending = True
+                    self.written += 1
+                    if len(block) >= self.block_size:  # 当前块已满，写入索引
+                        length = sum(map(len, block))
+                        index.write(INDEX.pack(first, last, offset, length, mask))
+                        offset += length
+                        block, mask = [], 0
+                now = time.monotonic()
+                if pending and (now - last_flush >= self.flush_interval or not running):
+                    if block:  # 刷新时未满的块也写入索引，下一块从此处开始
+                        length = sum(map(len, block))
+                        index.write(INDEX.pack(first, last, offset, length, mask))
+                        offset += length
+                        block, mask = [], 0
+                    data.flush()
+                    index.flush()
+                    pending, last_flush = False, now
+
+
+# 读取索引
+def read_index(path: str) -> list[tuple[float, float, int, int, int]]:
+    """
+    :param path: 事件文件路径
+    :return:     [(最早时间, 最晚时间, 偏移, 字节数, 类型位掩码), ...]，索引不存在时为[]
+    """
+    try:
+        with open(f"{path}.idx", "rb") as f:
+            data = f.read()
+    except OSError: return []
+    return [INDEX.unpack_from(data, pos) for pos in range(0, len(data) - INDEX.size + 1, INDEX.size)]
+
+
+# 查询事件
+def query(path: str, start: float | None = None, end: float | None = None, categories=None, title: str = "",
+          agent: str = ""):
+    """
+    按索引只读取可能命中的块；索引之后的事件（写入中或异常退出）逐行检查
+    :param path:       事件文件路径
+    :param start:      最早时间(Unix时间)，None表示不限
+    :param end:        最晚时间(Unix时间)，None表示不限
+    :param categories: 事件类型，None表示全部
+    :param title:      窗口标题包含的内容，空字符串表示不限
+    :param agent:      代理名称，仅收集端的事件文件中有该字段，空字符串表示不限
+    :return:           生成器，依次产生事件字典
+    """
+    wanted = _mask(categories) if categories else -1
+    start = float("-inf") if start is None else start
+    end = float("inf") if end is None else end
+    blocks, indexed = [], 0
+    for first, last, offset, length, mask in read_index(path):
+        indexed = max(indexed, offset + length)
+        if last >= start and first <= end and mask & wanted: blocks.append((offset, length))
+    needle = json.dumps(title, ensure_ascii=False)[1:-1].encode("utf-8") if title else b""  # 按原始字节预筛选
+    source = f'"agent":{json.dumps(agent, ensure_ascii=False)},'.encode("utf-8") if agent else b""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > indexed: blocks.append((indexed, f.tell() - indexed))  # 尚未写入索引的事件
+        for offset, length in blocks:
+            f.seek(offset)
+            for line in f.read(length).splitlines():
+                if needle and needle not in line: continue
+                if source and source not in line: continue
+                try: event = json.loads(line)
+                except ValueError: continue  # 不完整的行
+                if not (start <= event["t"] <= end): continue
+                if categories and event["cat"] not in categories: continue
+                if title and title not in event["title"]: continue
+                if agent and event.get("agent") != agent: continue
+                yield event
+
+
+# 解析命令行中的时间
+def _parse_time(text: str) -> float:
+    """
+    :param text: “2026-09-01”、“2026-09-01 08:00:00”或相对时间 “30d”、“12h”、“15m”
+    :return:     Unix时间
+    """
+    units = {"d": 86400, "h": 3600, "m": 60}
+    if text[-1:] in units and text[:-1].replace(".", "", 1).isdigit():
+        return time.time() - float(text[:-1]) * units[text[-1]]
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try: return time.mktime(time.strptime(text, fmt))
+        except ValueError: pass
+    raise ValueError(f"无法识别的时间[{text}]")
+
+
+if __name__ == '__main__':
+    # 用法: python eventlog.py 事件文件 [--since 时间] [--until 时间] [--category 类型,...] [--title 内容] [--agent 名称] [--count]
+    # 例:   python eventlog.py events.jsonl --since 30d --category Kill --title 微信 --count
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查询WinStart结构化事件日志")
+    parser.add_argument("path", help="事件文件路径，如events.jsonl")
+    parser.add_argument("--since", help="最早时间，如 2026-09-01、2026-09-01 08:00:00、30d、12h")
+    parser.add_argument("--until", help="最晚时间，格式同--since")
+    parser.add_argument("--category", help=f"事件类型，逗号分隔，可选: {', '.join(CATEGORIES)}")
+    parser.add_argument("--title", default="", help="窗口标题包含的内容")
+    parser.add_argument("--agent", default="", help="代理名称，用于查询收集端的事件文件")
+    parser.add_argument("--count", action="store_true", help="只输出各类型、各结果的事件数量")
+    args = parser.parse_args()
+    try:
+        _start = _parse_time(args.since) if args.since else None
+        _end = _parse_time(args.until) if args.until else None
+    except ValueError as _error:
+        print(_error)
+        sys.exit(1)
+    _categories = set(args.category.split(",")) if args.category else None
+    _counts: dict[tuple[str, str], int] = {}
+    _total = 0
+    _begin = time.perf_counter()
+    for _event in query(args.path, _start, _end, _categories, args.title, args.agent):
+        _total += 1
+        if args.count:
+            _key = (_event["cat"], _event["outcome"])
+            _counts[_key] = _counts.get(_key, 0) + 1
+            continue
+        _rule = f"({_event['rule']})" if _event["rule"] else ""
+        _outcome = f">>>{_event['outcome']}" if _event["outcome"] else ""
+        _agent = f"{_event['agent']}\t" if "agent" in _event else ""
+        print(f"{_agent}{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_event['t']))}\t[{_event['cat']}]"
+              f"{_event['title']}{_rule}{_outcome}\t{_event['pid']}")
+    if args.count:
+        for (_category, _outcome), _count in sorted(_counts.items()):
+            print(f"{_category}\t{_outcome or '-'}\t{_count}")
+    print(f"共{_total}条事件，查询耗时{(time.perf_counter() - _begin) * 1000:.1f}ms", file=sys.stderr)
@@ -0,0 +1,248 @@
+import queue
+import time
+from bisect import bisect_right
+from threading import Event
+
+from pipeline import StageTimer
+
+__all__ = ["AdaptiveSchedule", "PollingSource", "HookSource", "FakeSource", "create_source"]
+
+
+# 自适应轮询间隔
+class AdaptiveSchedule:
+    def __init__(self, min_interval: float, max_interval: float, backoff: float = 2.0, cpu_budget: float = 0.01,
+                 hold: float = 1.0):
+        """
+        前台窗口变化后hold秒内保持min_interval，用户连续切换窗口时不会遗漏；之后前台窗口不变时每次轮询后将间隔乘以backoff，
+        直到max_interval；前台窗口变化或有待处理的关闭目标时立即回到min_interval；
+        按每次轮询的CPU耗时限制间隔下限，使轮询占用的CPU不超过cpu_budget，但间隔不会超过max_interval
+        :param min_interval: 最小轮询间隔，单位为秒
+        :param max_interval: 最大轮询间隔，单位为秒
+        :param backoff:      前台窗口不变时间隔的增长倍数
+        :param cpu_budget:   轮询最多占用的单核CPU比例，0表示不限
+        :param hold:         前台窗口变化后保持最小间隔的秒数
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = max(backoff, 1.0)
+        self.cpu_budget = cpu_budget
+        self.hold = hold
+        self.last_change = 0.0  # 上一次前台窗口变化或有待处理的关闭目标的时刻
+        self.interval = min_interval  # 当前轮询间隔
+        self.cost = 0.0  # 每次轮询CPU耗时的指数移动平均，单位为秒
+        self.polls = 0  # 轮询次数
+        self.changes = 0  # 检测到前台窗口变化的次数
+        self.start = time.monotonic()
+        self.last_poll = 0.0  # 上一次轮询的时刻，0表示尚未轮询
+        self.gap_timer = StageTimer()  # 检测到变化时距上一次轮询的时间，即检测延迟的上限
+        self.wake = Event()  # 有待处理的关闭目标时唤醒轮询线程
+
+    # 按CPU预算计算的间隔下限
+    def _floor(self) -> float:
+        floor = self.cost / self.cpu_budget if self.cpu_budget > 0 else 0.0
+        return min(max(self.min_interval, floor), self.max_interval)
+
+    def record(self, cpu: float, changed: bool, now: float | None = None):
+        """
+        记录一次轮询并计算下一次的间隔，由轮询线程调用
+        :param cpu:     本次轮询的CPU耗时，单位为秒
+        :param changed: 前台窗口是否变化
+        :param now:     当前时刻(time.monotonic)，默认为调用时刻
+        """
+        now = time.monotonic() if now is None else now
+        self.cost = cpu if not self.polls else self.cost * 0.9 + cpu * 0.1
+        self.polls += 1
+        if changed:
+            self.changes += 1
+            if self.last_poll: self.gap_timer.add(now - self.last_poll)
+            self.last_change = now
+        if now - self.last_change < self.hold: self.interval = self._floor()
+        else: self.interval = min(max(self.interval * self.backoff, self._floor()), self.max_interval)
+        self.last_poll = now
+
+    def urgent(self):
+        """
+        有待处理的关闭目标，回到最小间隔并唤醒轮询线程，可在任意线程中调用
+        """
+        floor = self._floor()
+        self.last_change = time.monotonic()
+        if self.interval > floor:
+            self.interval = floor
+            self.wake.set()
+
+    def wait(self, limit: float):
+        """
+        等待到下一次轮询，最多limit秒，由轮询线程调用
+        """
+        self.wake.wait(min(self.interval, limit))
+        self.wake.clear()
+
+    def rate(self) -> float:
+        """
+        :return: 启动以来平均每秒轮询次数
+        """
+        elapsed = time.monotonic() - self.start
+        return self.polls / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        """
+        :return: 单行文本，如 “poll: 每秒3.2次 当前间隔0.50s 检测延迟上限p99 20.00ms”，未轮询时为空字符串
+        """
+        if not self.polls: return ""
+        gap = self.gap_timer.summary()
+        return (f"poll: 每秒{self.rate():.1f}次 当前间隔{self.interval:.2f}s 每次CPU{self.cost * 1e3:.3f}ms "
+                f"检测延迟上限平均{gap['avg_ms']:.2f}ms p99 {gap['p99_ms']:.2f}ms")
+
+
+# 轮询事件源
+class PollingSource:
+    def __init__(self, interval: float, get_fg_window, get_window_text, schedule: AdaptiveSchedule | None = None):
+        """
+        每隔interval秒读取一次前台窗口，仅在前台窗口或标题变化时产生事件
+        :param interval:        轮询间隔，单位为秒，schedule不为None时不使用
+        :param get_fg_window:   获取前台窗口句柄的函数，如GetFgWindow()
+        :param get_window_text: 获取窗口标题的函数，如GetWindowText()
+        :param schedule:        自适应轮询间隔，None表示固定间隔
+        """
+        self.interval = interval
+        self.get_fg_window = get_fg_window
+        self.get_window_text = get_window_text
+        self.schedule = schedule
+        self.last: tuple[int, str] | None = None  # 上一次产生事件时的前台窗口
+
+    def get(self, timeout: float) -> tuple[int, str] | None:
+        """
+        等待前台窗口变化
+        :param timeout: 超时时间，单位为秒
+        :return:        (hwnd, 窗口标题) | None，None表示超时前前台窗口未变化
+        """
+        deadline = time.monotonic() + timeout
+        schedule = self.schedule
+        while True:
+            cpu = time.thread_time() if schedule else 0.0
+            hwnd = self.get_fg_window() or 0
+            current = (hwnd, self.get_window_text(hwnd) if hwnd else "")
+            changed = current != self.last
+            if schedule: schedule.record(time.thread_time() - cpu, changed)
+            if changed:
+                self.last = current
+                return current
+            remain = deadline - time.monotonic()
+            if remain <= 0: return None
+            if schedule: schedule.wait(remain)
+            else: time.sleep(min(self.interval, remain))
+
+    def close(self):
+        pass
+
+
+# 系统事件源
+class HookSource:
+    def __init__(self, api, capacity: int = 1024):
+        """
+        由前台窗口切换与标题变化通知驱动，不占用轮询开销，也不会遗漏两次轮询之间出现的窗口；
+        事件进入有界队列，判定阶段停滞时队列已满则丢弃最早的事件并计数，保留最新的前台窗口
+        :param api:      平台后端，见backend.load_backend
+        :param capacity: 队列容量
+        """
+        if not hasattr(api, "WinEventHook"):
+            raise OSError("平台后端不支持事件通知")
+        self.queue: queue.Queue[tuple[int, str]] = queue.Queue(capacity)
+        self.dropped = 0  # 因队列已满丢弃的事件数，仅在钩子线程中修改
+        self.get_fg_window = api.GetFgWindow()
+        self.get_window_text = api.GetWindowText()  # 仅在钩子线程中使用
+        self.hook = api.WinEventHook(self._on_event)
+        if not self.hook.start():
+            raise OSError("SetWinEventHook调用失败")
+        hwnd = self.get_fg_window() or 0
+        self.queue.put((hwnd, api.GetWindowText()(hwnd) if hwnd else ""))  # 当前前台窗口作为首个事件
+
+    # 钩子回调，在事件发生时立即读取标题，窗口随后关闭也不会丢失
+    def _on_event(self, event: int, hwnd: int):
+        if event == self.hook.NAMECHANGE and hwnd != self.get_fg_window():  # 非前台窗口的标题变化
+            return
+        item = (hwnd or 0, self.get_window_text(hwnd) if hwnd else "")
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:  # 丢弃最早的事件，已不在前台的窗口仍可由后台扫描检查
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty: pass
+
+    def get(self, timeout: float) -> tuple[int, str] | None:
+        """
+        等待前台窗口变化
+        :param timeout: 超时时间，单位为秒
+        :return:        (hwnd, 窗口标题) | None，None表示超时前前台窗口未变化
+        """
+        try: return self.queue.get(timeout=timeout)
+        except queue.Empty: return None
+
+    def close(self):
+        self.hook.stop()
+
+
+# 脚本化事件源，用于在非Windows系统上测量检测延迟与空闲开销
+class FakeSource:
+    def __init__(self, script: list[tuple[float, int, str]]):
+        """
+        按脚本在指定时刻切换前台窗口
+        :param script: [(相对创建时刻的秒数, hwnd, 窗口标题), ...]
+        """
+        self.script = sorted(script, key=lambda x: x[0])
+        self.times = [at for at, _, _ in self.script]
+        self.index = 0  # 下一个待产生的事件
+        self.start = time.monotonic()
+        self.delays: list[float] = []  # 每个事件从发生到被取走的延迟，单位为秒
+
+    # 按当前时刻返回前台窗口，可作为PollingSource的get_fg_window
+    def foreground(self) -> int:
+        index = bisect_right(self.times, time.monotonic() - self.start) - 1
+        return self.script[index][1] if index >= 0 else 0
+
+    # 按当前时刻返回前台窗口标题，可作为PollingSource的get_window_text
+    def window_text(self, hwnd: int | None = None) -> str:
+        index = bisect_right(self.times, time.monotonic() - self.start) - 1
+        if index < 0: return ""
+        _, current, title = self.script[index]
+        return title if hwnd in (None, current) else ""
+
+    def get(self, timeout: float) -> tuple[int, str] | None:
+        """
+        等待下一个脚本事件
+        :param timeout: 超时时间，单位为秒
+        :return:        (hwnd, 窗口标题) | None
+        """
+        if self.index >= len(self.script):
+            time.sleep(timeout)
+            return None
+        at, hwnd, title = self.script[self.index]
+        wait = self.start + at - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return None
+        if wait > 0: time.sleep(wait)
+        self.index += 1
+        self.delays.append(time.monotonic() - self.start - at)
+        return hwnd, title
+
+    def close(self):
+        pass
+
+
+# 创建事件源
+def create_source(mode: str, interval: float, api, schedule: AdaptiveSchedule | None = None):
+    """
+    :param mode:     hook或poll，hook不可用时回退为轮询
+    :param interval: 轮询间隔，单位为秒
+    :param api:      平台后端，见backend.load_backend
+    :param schedule: 轮询时使用的自适应轮询间隔，None表示固定间隔
+    :return:         事件源
+    """
+    if mode == "hook":
+        try: return HookSource(api)
+        except OSError: pass  # 钩子安装失败，回退为轮询
+    return PollingSource(interval, api.GetFgWindow(), api.GetWindowText(), schedule)
@@ -1,22 +1,69 @@
 import os
+import socket
 import sys
 import time
-from threading import Thread
+from threading import Lock, Thread, get_ident
+from typing import Callable
 
-from api import *
-from process_ui import MainWindow, QApplication
+STARTUP = time.perf_counter()  # 程序开始导入的时刻，用于统计启动到开始检测的耗时
+
+from backend import load_backend
+from control import ControlServer
+from decision import Decider, VerdictCache
+from escalation import Escalator
+from eventlog import EventWriter
+from events import AdaptiveSchedule, create_source
+from matcher import PRIORITY, RuleMatcher
+from metrics import InstrumentedApi, Metrics, MetricsDumper, MetricsServer
+from netsink import NetworkSink, parse_address
+from pipeline import Enforcer, Sampler, StageTimer, format_timers
+from proctree import ExeCache
+from profiler import SamplingProfiler
+from reloader import RuleReloader, StatWatcher
+from recorder import LogRotation, RecordWriter, TimeCache
+from rules import load_rule
+from sweep import Sweeper
+from tracing import TraceWriter
+from usage import UsageAggregator
+
+# 平台后端，通过环境变量WINSTART_BACKEND选择，win32为Windows系统，sim为模拟桌面（用于测试与压测）
+BACKEND = os.environ.get("WINSTART_BACKEND", "win32")
 
 # 是否为windows系统
-if os.name != "nt":
+if BACKEND == "win32" and os.name != "nt":
     print("请在Windows系统上运行本程序！")
     sys.exit(0)
+API = load_backend(BACKEND)
 
 # item文件默认内容
 ITEM_DEFAULT_DATA = """:enable(true)
 :password(123456)
 :record_all(true)
 :interval(0.1)
+:interval_min(0.02)
+:interval_max(0)
+:cpu_budget(1)
+:sweep(0)
+:verdict_cache(1024)
 :level(1)
+:listen(hook)
+:reload(1)
+:ui(true)
+:control(0)
+:trace(false)
+:kill_tree(false)
+:record_format(text)
+:log_max_size(10)
+:log_daily(true)
+:log_keep(0)
+:log_keep_days(0)
+:usage_interval(300)
+:metrics(0)
+:metrics_dump(0)
+:profile(0)
+:collector()
+:collector_token()
+:agent()
 ;;
 
 [Protect]{
@@ -44,13 +91,39 @@ QQ
 ;;;;
 """
 
+# 无强制关闭目标时等待前台窗口变化的超时时间，用于及时响应ui线程退出
+IDLE_TIMEOUT = 0.5
+# 执行关闭窗口与结束进程的线程数量
+ENFORCE_WORKERS = 2
+# 发送关闭指令的超时时间，单位为秒，无响应的程序最多占用一个执行线程这么久
+CLOSE_TIMEOUT = 1.0
+# 单次性能分析的最长时间，单位为秒
+PROFILE_LIMIT = 600.0
+
+# 重载item文件时在运行中生效的配置，其余配置变化后需重启程序才生效
+RELOADABLE = ("password", "record_all", "level", "interval", "kill_tree")
+
 # 路径常量
 ITEM_PATH = ...    # 待检测文件路径
 RECORD_PATH = ...  # 日志文件的路径
+CACHE_PATH = ...  # 规则缓存文件的路径
+TRACE_PATH = ...  # 采样轨迹文件的路径
+EVENTS_PATH = ...  # 结构化事件日志的路径
+USAGE_PREFIX = ...  # 窗口使用时长快照的路径前缀，文件名为 “usage-年月日.jsonl”
+METRICS_PATH = ...  # 指标文件的路径
+PROFILE_PREFIX = ...  # 性能分析结果的路径前缀，文件名为 “profile-年月日-时分秒.collapsed”
+SPOOL_PATH = ...  # 收集端不可达时暂存事件的路径
 
 # 全局变量
 UiExit = False  # ui线程退出标志
 PasswordCorrectness = False  # 密码正确标志
+UiThread: Thread | None = None  # ui线程，无界面模式下在收到ui命令后才创建
+UiLock = Lock()  # 保证ui线程只创建一次，控制通道的多个连接可能同时发送ui命令
+Stages: dict[str, StageTimer] = {}  # 检测各阶段的耗时统计，由监听线程创建
+Verdicts: VerdictCache | None = None  # 判定结果缓存，由监听线程创建
+Profile: Callable[[str], str] | None = None  # 启动或查询性能分析，由监听线程创建
+Schedule: AdaptiveSchedule | None = None  # 自适应轮询间隔，由监听线程创建，未轮询时为None
+RecordStat: tuple[int, float] | None = None  # 本次运行写入前日志文件的(大小, 修改时间)，用于启动时轮转
 
 
 # 获取当前日期
@@ -58,17 +131,26 @@ def get_date() -> str:
     return time.strftime("%Y年%m月%d日", time.localtime(time.time()))
 
 
-# 获取当前时间
-def get_time() -> str:
-    return time.strftime("%H:%M:%S", time.localtime(time.time()))
+# 获取当前时间，同一秒内复用格式化结果
+get_time = TimeCache("%H:%M:%S")
 
 
 # 检测文件并修复
 def check_file():
-    global ITEM_PATH, RECORD_PATH
+    global ITEM_PATH, RECORD_PATH, CACHE_PATH, TRACE_PATH, EVENTS_PATH, USAGE_PREFIX, METRICS_PATH, PROFILE_PREFIX, SPOOL_PATH
+    global RecordStat
     path = os.path.dirname(sys.argv[0])   # 获取当前程序路径
-    ITEM_PATH = path + "\\item"
-    RECORD_PATH = path + "\\record.log"
+    ITEM_PATH = os.path.join(path, "item")
+    RECORD_PATH = os.path.join(path, "record.log")
+    CACHE_PATH = os.path.join(path, "item.cache")
+    TRACE_PATH = os.path.join(path, "trace.bin")
+    EVENTS_PATH = os.path.join(path, "events.jsonl")
+    USAGE_PREFIX = os.path.join(path, "usage")
+    METRICS_PATH = os.path.join(path, "metrics.prom")
+    PROFILE_PREFIX = os.path.join(path, "profile")
+    SPOOL_PATH = os.path.join(path, "events.spool")
+    try: RecordStat = os.path.getsize(RECORD_PATH), os.path.getmtime(RECORD_PATH)
+    except OSError: RecordStat = None  # 日志文件不存在
     if not os.path.exists(RECORD_PATH):  # 日志文件不存在
         with open(RECORD_PATH, "w", encoding="utf-8") as f:
             f.write(f"{get_date()}\n\t[{get_time()}]: [Info]日志文件({RECORD_PATH})已创建;\n")
@@ -86,67 +168,18 @@ def check_file():
 
 
 # 获取配置信息
-def get_config() -> tuple[dict, dict]:
+def get_config() -> tuple[dict, dict, RuleMatcher]:
     """
-    :return: tuple[dict, dict] -> (配置信息, 规则信息)
+    item文件内容未变化时从缓存加载
+    :return: tuple[dict, dict, RuleMatcher] -> (配置信息, 规则信息, 规则匹配器)
     """
-    config = {
-        "enable": 'true',
-        "password": '123456',
-        "record_all": 'true',
-        "interval": '0.1',
-        "level": '1',
-    }  # 默认配置信息
-    rule = {
-        "Protect": {0: [], 1: []},
-        "Ordinary": [],
-        "Force": [],
-        "Include": [],
-        "ExInclude": [],
-    }  # 规则信息
-    with open(ITEM_PATH, "r", encoding="utf-8") as f:
-        text = f.readlines()
-        text = [line.strip() for line in text if line.strip()]  # 去除所有\n与空字符串
-    read_type = "config"  # 循环时读取类型，data或rule或protect或other
-    rule_value = ""  # 记录当前rule类型键
-    for line in text:
-        if not line: continue  # 空行，跳过
-        if line.startswith("#"): continue  # 注释行，跳过
-        if read_type == "config":  # 读取配置信息
-            if line == ";;": read_type = "rule"  # 配置信息分隔符
-            if line.startswith(":"):  # ':'开头的是配置信息
-                try: key, value = line.strip(":").split("(")  # 去除':'和'('
-                except ValueError: continue  # 格式错误，跳过
-                if key not in config: continue  # 未知配置信息，跳过
-                config[key] = value.strip(")")  # 去除')'并赋值
-        elif read_type == "rule":  # 读取规则信息
-            if line == ";;;;": break  # 文本末尾，结束读取
-            if line.startswith("["):  # [开头的行是规则信息
-                if line == "[Protect]{":  # 进入Protect规则读取
-                    read_type = "protect"  # 进入保护规则读取
-                else:  # 非Protect规则
-                    try: rule_value = line.strip("[]{").strip()  # 提取[]内的规则类型
-                    except ValueError: continue  # 格式错误，跳过
-                    read_type = "other"  # 进入除Protect外的规则读取
-        elif read_type == "protect":  # 读取保护内容
-            if line == "}":  # 到达规则内容结束符
-                read_type = "rule"  # 回到规则信息读取
-                continue
-            if len(line) <= 3: continue  # 仅有'(0)'、'(1)'或太短
-            if line.startswith("(0)"):  # (0)开头的行表示根据进程名检测
-                rule["Protect"][0].append(line[3:])  # 加入规则内容
-            elif line.startswith("(1)"):  # (1)开头的行表示根据窗口标题检测
-                rule["Protect"][1].append(line[3:])  # 加入规则内容
-        else:  # 读取除Protect外的规则内容
-            if line == "}":  # 到达规则内容结束符
-                read_type = "rule"  # 回到规则信息读取
-                continue
-            rule[rule_value].append(line)  # 加入规则内容
-    return config, rule
+    return load_rule(ITEM_PATH, CACHE_PATH)
 
 
 # ui主程序
 def ui_main(password: str):
+    from process_ui import MainWindow, QApplication  # 延迟导入PyQt6，无界面模式下不导入
+
     def exit_func(event):  # 退出函数，必须有参数event，该函数用于替换PyQt6的退出函数
         global PasswordCorrectness, UiExit
         PasswordCorrectness = window.password_correctness  # 获取密码正确标志
@@ -158,126 +191,453 @@ def ui_main(password: str):
     sys.exit(app.exec())
 
 
+# 启动ui线程，已启动时不重复启动
+def start_ui(password: str):
+    global UiThread
+    with UiLock:
+        if UiThread is not None: return
+        UiThread = Thread(target=ui_main, kwargs={"password": password}, daemon=True)
+        UiThread.start()
+
+
+# 创建控制通道
+def start_control(config: dict, record: RecordWriter) -> ControlServer | None:
+    """
+    控制命令：exit 密码 -> 退出程序；ui -> 显示密码界面；stats -> 检测各阶段耗时与判定结果缓存命中率；
+              profile [秒数|stop] -> 对检测线程进行性能分析，不带参数时查询状态
+    :return: 控制通道 | None，None表示未启用或启动失败
+    """
+    def control_exit(arg: str) -> str:  # 每次读取config中的密码，重载item文件后使用新密码
+        global PasswordCorrectness, UiExit
+        if arg != config["password"]:
+            time.sleep(1)  # 限制密码尝试频率，只延迟本次连接
+            return "密码错误"
+        PasswordCorrectness = True
+        UiExit = True  # 与ui线程退出时相同，通知监听线程退出
+        return "密码正确，正在退出"
+
+    def control_ui(arg: str) -> str:
+        _ = arg
+        start_ui(config["password"])
+        return "已显示界面"
+
+    def control_stats(arg: str) -> str:
+        _ = arg
+        if Verdicts is None: return "检测尚未开始"
+        return "；".join(filter(None, (format_timers(Stages), Verdicts.summary(), Schedule.summary() if Schedule else "")))
+
+    def control_profile(arg: str) -> str:
+        if Profile is None: return "检测尚未开始"
+        return Profile(arg)
+
+    try: port = int(config["control"])
+    except ValueError: port = 0
+    if port <= 0: return None
+    try:
+        server = ControlServer(port, {"exit": control_exit, "ui": control_ui, "stats": control_stats,
+                                      "profile": control_profile})
+    except OSError as error:  # 端口被占用等
+        record.write(f"\t[{get_time()}]: [Info]控制通道启动失败({error});\n")
+        return None
+    record.write(f"\t[{get_time()}]: [Info]控制通道已启动(127.0.0.1:{server.port});\n")
+    return server
+
+
+# 创建指标服务与指标文件
+def start_metrics(config: dict, metrics: Metrics, record: RecordWriter) -> tuple[MetricsServer | None, MetricsDumper | None]:
+    """
+    :return: (指标HTTP服务 | None, 指标文件写入 | None)，None表示未启用或启动失败
+    """
+    server = dumper = None
+    try: port = int(config["metrics"])
+    except ValueError: port = 0
+    try: interval = float(config["metrics_dump"])
+    except ValueError: interval = 0.0
+    if port > 0:
+        try:
+            server = MetricsServer(port, metrics)
+            record.write(f"\t[{get_time()}]: [Info]指标服务已启动(http://127.0.0.1:{server.port}/metrics);\n")
+        except OSError as error:  # 端口被占用等
+            record.write(f"\t[{get_time()}]: [Info]指标服务启动失败({error});\n")
+    if interval > 0: dumper = MetricsDumper(METRICS_PATH, metrics, max(interval, 1))
+    return server, dumper
+
+
+# 创建发送事件到收集端的网络输出
+def start_sink(config: dict, metrics: Metrics, record: RecordWriter) -> NetworkSink | None:
+    """
+    :return: 网络输出 | None，None表示未启用或地址无效
+    """
+    if not config["collector"]: return None
+    try: address = parse_address(config["collector"])
+    except ValueError:
+        record.write(f"\t[{get_time()}]: [Info]收集端地址[{config['collector']}]无效;\n")
+        return None
+    agent = config["agent"] or socket.gethostname()
+    sink = NetworkSink(address, agent, SPOOL_PATH, config["collector_token"])
+    metrics.counter_func("sink_sent_events_total", "收集端已确认的事件数", lambda: sink.sent)
+    metrics.gauge("sink_spooled", "暂存文件中等待发送的事件数", lambda: sink.spooled)
+    metrics.counter_func("sink_dropped_events_total", "因队列已满或暂存文件过大丢弃的事件数", lambda: sink.dropped)
+    metrics.gauge("sink_connected", "是否已连接收集端", lambda: sink.connected)
+    record.write(f"\t[{get_time()}]: [Info]事件将发送到收集端({address[0]}:{address[1]}，代理名称{agent});\n")
+    return sink
+
+
+# 创建日志轮转
+def create_rotation(config: dict) -> LogRotation | None:
+    """
+    :return: 日志轮转 | None，None表示不按大小也不按天轮转
+    """
+    max_size = 10.0  # 日志文件大小上限，单位为MB，0表示不按大小轮转
+    keep = 0  # 最多保留的已轮转日志数量，0表示不限
+    keep_days = 0.0  # 已轮转日志的保留天数，0表示不限
+    try:
+        max_size = max(float(config["log_max_size"]), 0)
+    except ValueError: pass  # 无效的大小上限
+    try:
+        keep = max(int(config["log_keep"]), 0)
+    except ValueError: pass  # 无效的保留数量
+    try:
+        keep_days = max(float(config["log_keep_days"]), 0)
+    except ValueError: pass  # 无效的保留天数
+    daily = config["log_daily"] == "true"
+    if not max_size and not daily: return None
+    rotation = LogRotation(RECORD_PATH, int(max_size * 1024 * 1024), daily, keep, keep_days,
+                           header=lambda: f"{get_date()}\n")
+    if RecordStat: rotation.resume(*RecordStat, keep_from=RecordStat[0])  # 上次运行的日志不是今天的或已过大
+    return rotation
+
+
+# 编译规则
+def compile_rule(config: dict, rule: dict, matcher: RuleMatcher,
+                 get_process_info: Callable[[], dict]) -> tuple[bool, set, RuleMatcher]:
+    """
+    :return: (是否记录所有记录, 保护进程pid集合, 规则匹配器)
+    """
+    record_all = config["record_all"] == "true"  # 是否记录所有记录，usage时改为统计窗口使用时长
+    # 获取保护进程pid
+    protect_names = set(rule["Protect"][0])
+    protect_pids = {_pid for _pid, name in get_process_info().items() if name in protect_names}   # 保护进程pid集合
+    return record_all, protect_pids, matcher
+
+
 # 监听窗口标题
-def listen_text(config: dict, rule: dict):
+def listen_text(config: dict, rule: dict, matcher: RuleMatcher, record: RecordWriter,
+                events: EventWriter | None = None, metrics: Metrics | None = None, sink: NetworkSink | None = None):
+    global Verdicts, Profile, Schedule
     # 常量
     interval = 0.1  # 检测间隔，单位为秒
-    level = 2  # 检测等级
-    record_all = config["record_all"] == "true"  # 是否记录所有记录
+    reload = 1.0  # 检测item文件变化的间隔，单位为秒，0表示不重载
+    sweep = 0.0  # 扫描所有顶层窗口的间隔，单位为秒，0表示不扫描
+    verdict_cache = 1024  # 判定结果缓存的容量，0表示不缓存
+    usage_interval = 300.0  # 窗口使用时长快照的间隔，单位为秒
+    profile = 0.0  # 开始检测后性能分析的时长，单位为秒，0表示不分析
+    interval_min = interval_max = 0.0  # 轮询的最小、最大间隔，单位为秒，最大间隔为0表示按检测间隔固定轮询
+    cpu_budget = 1.0  # 轮询最多占用的单核CPU百分比，0表示不限
     try:
         interval = float(config["interval"])
         if interval < 0.01: interval = 0.01  # 间隔不能小于0.01秒
     except ValueError: pass  # 无效的间隔
     try:
-        level = int(config["level"])
-        if not (1 <= level <= 3): level = 2  # 等级不能超过3或小于1
-    except ValueError: pass  # 无效的等级
-    # 变量
-    last_text = ""  # 上一次检测的窗口标题
-    last_froce = 0  # 上一个窗口是否是强制关闭目标
-    # 调用api
-    get_process_info = GetProcessInfo()
-    get_window_handle = GetWindowHandle()
-    get_fg_window = GetFgWindow()
-    get_window_text = GetWindowText()
-    send_close = SendClose()
-    froce_close = ForceClose()
-    # 获取保护进程pid
-    protect_pids = [_pid for _pid, name in get_process_info().items() if name in rule["Protect"][0]]   # 保护进程pid列表
-    # 高等级额外的功能
-    if level >= 2:  # 加入任务管理器、cmd（有GUI界面）
-        rule["Ordinary"].append("任务管理器")
-        rule["Include"].append("cmd.exe")
-    if level >= 3:  # 待拓展
-        pass
+        reload = max(float(config["reload"]), 0)
+    except ValueError: pass  # 无效的重载间隔
+    try:
+        sweep = max(float(config["sweep"]), 0)
+    except ValueError: pass  # 无效的扫描间隔
+    try:
+        verdict_cache = max(int(config["verdict_cache"]), 0)
+    except ValueError: pass  # 无效的缓存容量
+    try:
+        usage_interval = max(float(config["usage_interval"]), 1)
+    except ValueError: pass  # 无效的快照间隔
+    try:
+        profile = min(max(float(config["profile"]), 0), PROFILE_LIMIT)
+    except ValueError: pass  # 无效的分析时长
+    try:
+        interval_min = max(float(config["interval_min"]), 0.01)  # 间隔不能小于0.01秒
+        interval_max = max(float(config["interval_max"]), 0)
+    except ValueError: pass  # 无效的轮询间隔，按检测间隔固定轮询
+    try:
+        cpu_budget = max(float(config["cpu_budget"]), 0)
+    except ValueError: pass  # 无效的CPU预算
+    if metrics is None: metrics = Metrics()  # 未启用指标服务与指标文件时仍计数，开销可以忽略
+    api = InstrumentedApi(API, metrics)  # 记录每次调用平台接口的耗时
+    # 调用api，关闭窗口与结束进程由执行线程完成
+    get_process_info = api.GetProcessInfo()
+    get_window_info = api.GetWindowInfo()
+    exe_cache = ExeCache(get_process_info, api.GetProcessTime())  # 进程名称规则(0)使用的pid: 进程名称缓存
+    record_all, protect_pids, matcher = compile_rule(config, rule, matcher, get_process_info)
+    verdicts = Verdicts = VerdictCache(matcher, verdict_cache)  # 在几个窗口间来回切换时不重复匹配规则
+    decider = Decider(verdicts)  # 按窗口序列判定动作
+    # 强制关闭目标在关闭指令的超时时间加检测间隔后检查，窗口仍存在则结束进程；关闭指令由执行线程异步发送
+    escalator = Escalator(interval + CLOSE_TIMEOUT)
+    recheck = None  # 规则重载后需要重新检测的窗口
+    # item文件变化时在后台线程重新解析并编译规则，同时重新获取保护进程pid
+    reloader = None
+    if reload:
+        def rebuild():  # 在重载线程中调用
+            new_config, new_rule, new_matcher = get_config()
+            return new_config, *compile_rule(new_config, new_rule, new_matcher, api.GetProcessInfo())
+
+        reloader = RuleReloader(StatWatcher(ITEM_PATH), rebuild, reload)
+    trace = TraceWriter(TRACE_PATH) if config["trace"] == "true" else None  # 记录每次采样，用于离线回放
+    # 统计每个窗口的前台时长，定期保存快照，取代逐条记录所有窗口标题
+    usage = UsageAggregator(USAGE_PREFIX, usage_interval) if config["record_all"] == "usage" else None
+    tree = "及其子进程" if config["kill_tree"] == "true" else ""  # 是否结束整个进程树
+    text_log = config["record_format"] != "events"  # 是否将检测结果写入文本日志
+
+    def report(category: str, title: str, line: str, hit: str = "", pid: int = 0, outcome: str = ""):
+        # 按record_format写入文本日志与结构化事件，可在执行线程中调用
+        if text_log: record.write(f"\t[{get_time()}]: {line};\n")
+        if events: events.write(category, title, hit, pid, outcome)
+        if sink: sink.write(category, title, hit, pid, outcome)
+
+    def on_done(action: str, _hwnd: int, text: str, result):  # 执行线程完成任务后记录结果
+        outcome = ("sent" if result else "timeout") if action == "Close" else result
+        metrics.counter("enforce_total", "关闭窗口与结束进程的结果", action=action, result=outcome).inc()
+        if action == "Close":
+            if not result: report("Close", text, f"[Info]窗口[{text}]在{CLOSE_TIMEOUT}s内未响应关闭指令", outcome="timeout")
+        elif result == "protect":  # 窗口pid在保护进程pid中，可能是误判，跳过
+            report("Kill", text, f"[Kill]窗口[{text}]关闭失败，该窗口可能为被保护程序", outcome="protect")
+        elif result == "success":
+            report("Kill", text, f"[Kill]正在尝试强制关闭[{text}]{tree}>>>关闭成功", outcome="success")
+        elif result == "fail":
+            report("Kill", text, f"[Kill]正在尝试强制关闭[{text}]{tree}>>>关闭失败", outcome="fail")
+
+    # 采样、判定、执行分为三个阶段，由有界队列连接，无响应的目标不会阻塞对下一个窗口的检测
+    # 轮询时前台窗口不变则逐渐延长间隔，前台窗口变化或有待处理的关闭目标时回到最小间隔
+    schedule = AdaptiveSchedule(interval_min, interval_max, cpu_budget=cpu_budget / 100) if interval_max else None
+    source = Sampler(create_source(config["listen"], interval, api, schedule), poll_timeout=IDLE_TIMEOUT)
+    enforcer = Enforcer(api, on_done, ENFORCE_WORKERS, timeout=CLOSE_TIMEOUT, tree=bool(tree))
+    sweeper = Sweeper(api, sweep) if sweep else None  # 后台扫描，检测不在前台的窗口
+    decide_timer = StageTimer()
+    Stages.clear()
+    Stages.update({"sample": source.timer, "decide": decide_timer, "enforce_wait": enforcer.wait_timer,
+                   "close": enforcer.timers["Close"], "kill": enforcer.timers["Kill"]})
+    if sweeper: Stages["sweep"] = sweeper.timer
+    if schedule and getattr(source.source, "schedule", None) is not schedule: schedule = None  # 钩子可用时不轮询
+    Schedule = schedule
+    if schedule: Stages["poll_gap"] = schedule.gap_timer
+    # 指标：检测循环每次处理的耗时、各来源的判定结果，队列与缓存的状态在输出时读取
+    loop_seconds = metrics.histogram("loop_seconds", "检测循环每次处理的耗时，不含等待前台窗口变化")
+    decide_seconds = metrics.histogram("decide_seconds", "前台窗口从取得到判定完成的耗时")
+    decisions = {(name, action): metrics.counter("decisions_total", "各来源的判定结果", source=name, action=action)
+                 for name in ("foreground", "sweep") for action in (*PRIORITY, "Pass")}
+    escalations = {outcome: metrics.counter("escalations_total", "强制关闭目标到期后的处理结果", outcome=outcome)
+                   for outcome in ("gone", "cleared", "kill")}
+    metrics.gauge("sample_queue", "等待判定的前台窗口数量", source.queue.qsize)
+    if hasattr(source.source, "dropped"):
+        metrics.counter_func("hook_dropped_total", "因事件队列已满丢弃的前台窗口事件数", lambda: source.source.dropped)
+    metrics.gauge("enforce_queue", "等待执行的关闭与结束任务数量", enforcer.queue.qsize)
+    metrics.counter_func("enforce_dropped_total", "因执行队列已满丢弃的任务数量", lambda: enforcer.dropped)
+    metrics.counter_func("enforce_deduped_total", "因目标已在处理中跳过的任务数量", lambda: enforcer.deduped)
+    metrics.gauge("escalation_pending", "等待到期的强制关闭目标数量", escalator.__len__)
+    metrics.counter_func("verdict_cache_hits_total", "判定结果缓存命中次数", lambda: verdicts.hits)
+    metrics.counter_func("verdict_cache_misses_total", "判定结果缓存未命中次数", lambda: verdicts.misses)
+    metrics.gauge("verdict_cache_size", "判定结果缓存的条目数量", verdicts.__len__)
+    if schedule:
+        metrics.gauge("poll_interval_seconds", "当前轮询间隔", lambda: schedule.interval)
+        metrics.gauge("poll_rate", "启动以来平均每秒轮询次数", schedule.rate)
+        metrics.gauge("poll_cpu_seconds", "每次轮询CPU耗时的移动平均", lambda: schedule.cost)
+    busy = 0.0  # 本次循环开始处理的时刻，0表示尚未开始
+    # 性能分析由独立线程采样本线程的调用栈，分析期间替换判定、执行、写日志的函数以记录各阶段耗时，未分析时没有任何开销
+    profiler: SamplingProfiler | None = None
+    listen_id = get_ident()
+
+    def profile_done(done: SamplingProfiler):  # 分析线程写入结果后记录
+        if done.error: record.write(f"\t[{get_time()}]: [Info]性能分析结果写入失败({done.error});\n")
+        else: record.write(f"\t[{get_time()}]: [Info]性能分析已完成({done.path}，{done.summary()});\n")
+
+    profile_lock = Lock()  # 控制通道的多个连接可能同时调用start_profile
+
+    def start_profile(arg: str) -> str:  # 可在控制通道线程中调用
+        nonlocal profiler
+        with profile_lock:
+            running = profiler is not None and profiler.running
+            if arg == "stop":
+                if not running: return "没有正在进行的性能分析"
+                profiler.stop()
+                return f"性能分析已结束({profiler.path})"
+            if not arg:
+                if profiler is None: return "尚未进行性能分析"
+                return f"{'性能分析正在进行' if running else '上次性能分析'}({profiler.path}，{profiler.summary()})"
+            if running: return f"性能分析正在进行({profiler.path})"
+            try: duration = min(max(float(arg), 1), PROFILE_LIMIT)
+            except ValueError: return f"无效的分析时长[{arg}]"
+            probes = [("match", decider, "matcher"), ("act", enforcer, "submit"), ("log", record, "write")]
+            if events: probes.append(("log", events, "write"))
+            if sink: probes.append(("log", sink, "write"))
+            path = f"{PROFILE_PREFIX}-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+            profiler = SamplingProfiler(listen_id, path, duration, probes=probes, on_done=profile_done)
+            profiler.start()
+            return f"开始性能分析({duration:g}s)，结果将写入{path}"
+
+    Profile = start_profile
+    for line, reason in matcher.rejected:  # 被忽略的正则规则
+        record.write(f"\t[{get_time()}]: [Info]规则[{line}]已忽略({reason});\n")
+    logged = len(matcher.rejected)  # 已记录的被忽略规则数，匹配耗时过长的规则在运行中停用后加入rejected
+    mode = "有界面" if config["ui"] == "true" else "无界面"
+    record.write(f"\t[{get_time()}]: [Info]开始检测({mode}模式，启动耗时{(time.perf_counter() - STARTUP) * 1000:.0f}ms);\n")
+    if profile: record.write(f"\t[{get_time()}]: [Info]{start_profile(f'{profile:g}')};\n")
     # 循环直到ui线程退出
     while not UiExit:
-        hwnd = get_fg_window()  # 获取前台窗口hwnd
-        window_text = get_window_text(hwnd)  # 获取窗口标题
-        if not hwnd or not window_text:
-            time.sleep(interval)
-            continue  # 窗口无效，跳过
-        if window_text == "InkWn":
-            time.sleep(interval)
-            continue  # 自己写的程序，跳过
-        # 打开文件
-        f = open(RECORD_PATH, "a", encoding="utf-8")
-        if window_text == last_text:
-            if hwnd == last_froce:  # 上一个窗口是强制关闭目标，则代表窗口关闭失败
-                pid = get_window_handle()[hwnd][0]  # 获取窗口pid
-                if pid in protect_pids:  # 窗口pid在保护进程pid中，可能是误判，跳过
-                    f.write(f"\t[{get_time()}]: [Kill]窗口[{window_text}]关闭失败，该窗口可能为被保护程序;\n")
-                    last_froce = 0  # 重置last_froce标志
-                    time.sleep(interval)
-                    continue
-                if froce_close(pid):
-                    f.write(f"\t[{get_time()}]: [Kill]正在尝试强制关闭[{window_text}]>>>关闭成功;\n")
-                else:
-                    f.write(f"\t[{get_time()}]: [Kill]正在尝试强制关闭[{window_text}]>>>关闭失败;\n")
-                last_froce = 0  # 重置last_froce标志
-            time.sleep(interval)
-            continue  # 窗口标题未变化，跳过
-        last_text = window_text  # 更新窗口标题
-        last_froce = 0  # 重置last_froce标志
-        # 判断窗口标题是否在保护规则(1)中
-        if window_text in rule["Protect"][1]:
-            f.write(f"\t[{get_time()}]: [Protect]访客正在访问保护程序[{window_text}];\n")
-            time.sleep(interval)
-            continue
-        if window_text in rule["Ordinary"]:  # 窗口标题在普通规则中
-            f.write(f"\t[{get_time()}]: [Ordinary]访客尝试打开[{window_text}]>>>已发送关闭窗口指令;\n")
-            send_close(hwnd)  # 关闭窗口
-            time.sleep(interval)
-            continue
-        elif window_text in rule["Force"]:  # 窗口标题在强制关闭规则中
-            f.write(f"\t[{get_time()}]: [Force]访客尝试打开[{window_text}]>>>正在尝试关闭窗口;\n")
-            send_close(hwnd)  # 尝试关闭窗口
-            last_froce = hwnd  # 记录窗口为强制关闭目标
-            time.sleep(interval)
-            continue
-        else:  # 检测包含类的窗口标题
-            loop_signal = False  # for循环信号标志
-            for include in rule["Include"]:
-                if include in window_text:
-                    f.write(f"\t[{get_time()}]: [Include]访客尝试打开[{window_text}]({include})>>>已发送关闭窗口指令;\n")
-                    send_close(hwnd)  # 关闭窗口
-                    loop_signal = True  #
-                    time.sleep(interval)
-                    break  # 结束for循环
-            if loop_signal: continue  # 跳过本次while循环
-            for exinclude in rule["ExInclude"]:
-                if exinclude in window_text:
-                    f.write(f"\t[{get_time()}]: [ExInclude]访客尝试打开[{window_text}]({exinclude})>>>正在尝试关闭窗口;\n")
-                    send_close(hwnd)  # 关闭窗口
-                    last_froce = hwnd  # 记录窗口为强制关闭目标
-                    time.sleep(interval)
-                    break  # 结束for循环
-            if loop_signal: continue  # 跳过本次while循环
-        # 记录所有窗口标题
-        if record_all: f.write(f"\t[{get_time()}]: {window_text};\n")
-        f.close()  # 关闭文件
-        time.sleep(interval)
+        if busy: loop_seconds.observe(time.perf_counter() - busy)
+        # 在两次循环之间替换为新规则
+        update = reloader.take() if reloader else None
+        if isinstance(update, Exception):
+            record.write(f"\t[{get_time()}]: [Info]item文件重载失败({update})，继续使用原规则;\n")
+        elif update is not None:
+            new_config, record_all, protect_pids, matcher = update
+            verdicts.update(matcher)  # 清空按旧规则缓存的结果
+            recheck = decider.update(verdicts)  # 按新规则重新检测当前窗口
+            changed = [key for key, value in new_config.items() if config.get(key) != value]
+            applied = [key for key in changed if key in RELOADABLE]
+            if "record_all" in applied and "usage" in (config["record_all"], new_config["record_all"]):
+                applied.remove("record_all")  # 使用时长统计在启动时创建
+            for key in applied: config[key] = new_config[key]  # 与控制通道共用，密码随之更新
+            if "interval" in applied:
+                try: interval = max(float(config["interval"]), 0.01)
+                except ValueError: pass  # 无效的间隔，保持原间隔
+                escalator.delay = interval + CLOSE_TIMEOUT
+                if hasattr(source.source, "interval"): source.source.interval = interval  # 固定间隔轮询
+            if "kill_tree" in applied:
+                tree = "及其子进程" if config["kill_tree"] == "true" else ""
+                enforcer.tree = bool(tree)
+            restart = [key for key in changed if key not in applied]
+            notes = f"，已应用配置[{', '.join(applied)}]" if applied else ""
+            if restart: notes += f"，配置[{', '.join(restart)}]需重启后生效"
+            record.write(f"\t[{get_time()}]: [Info]item文件已更新，规则已重载{notes};\n")
+            for line, reason in matcher.rejected:
+                record.write(f"\t[{get_time()}]: [Info]规则[{line}]已忽略({reason});\n")
+            logged = len(matcher.rejected)
+        if schedule and (escalator or enforcer.pending): schedule.urgent()  # 有待处理的关闭目标，尽快检测窗口变化
+        # 等待前台窗口变化，有强制关闭目标时最多等到最早的目标到期
+        event = recheck or source.get(escalator.timeout(IDLE_TIMEOUT))
+        recheck = None
+        busy = time.perf_counter()
+        # 检查到期的强制关闭目标，与当前前台窗口无关
+        for target, pid, text, category in escalator.due():
+            if ("Close", target) in enforcer.pending:  # 关闭指令仍在队列中或目标程序仍在处理，之后再检查
+                escalator.schedule(target, pid, text, category, delay=interval)
+                continue
+            info = get_window_info(target)
+            if info is None or info[0] != pid:  # 窗口已关闭，或hwnd已被其他进程复用
+                escalations["gone"].inc()
+                continue
+            # 按当前标题与规则重新匹配，标题已变为不需关闭的内容或规则已删除时不再结束
+            result = verdicts(info[1], exe_cache(pid) if matcher.has_exe else "")
+            if result is None or result[0] not in ("Force", "ExInclude"):
+                escalations["cleared"].inc()
+                continue
+            escalations["kill"].inc()
+            enforcer.submit("Kill", target, info[1], protect_pids)
+        # 处理后台扫描到的新增或标题变化的窗口
+        for target, pid, title in sweeper.take() if sweeper else ():
+            if title == "InkWn": continue  # 自己写的程序，跳过
+            if target == decider.last_hwnd and title == decider.last_text: continue  # 前台窗口，已检测
+            result = verdicts(title, exe_cache(pid) if matcher.has_exe else "")
+            decisions["sweep", result[0] if result else "Pass"].inc()
+            if result is None or result[0] == "Protect": continue
+            category, hit = result
+            shown = f"({hit})" if hit != title else ""
+            report(category, title, f"[{category}]后台窗口[{title}]{shown}>>>已发送关闭窗口指令", hit, pid, "close_sent")
+            enforcer.submit("Close", target, title)
+            if category in ("Force", "ExInclude"): escalator.schedule(target, pid, title, category)  # 到期后窗口仍存在则结束进程
+        if usage: usage.tick()  # 定期保存使用时长快照
+        if event is None: continue  # 前台窗口未变化
+        hwnd, window_text = event
+        start = time.perf_counter()
+        pid, exe = 0, ""  # 窗口所属进程，仅在记录采样、统计使用时长或有进程名称规则时获取
+        if hwnd and window_text and (trace or usage or matcher.has_exe):
+            info = get_window_info(hwnd)
+            if info is not None: pid, exe = info[0], exe_cache(info[0])
+        if trace and hwnd and window_text: trace.write(hwnd, pid, exe, window_text)  # 记录采样，不记录无效窗口
+        if usage and window_text != "InkWn": usage.focus(exe, window_text if hwnd else "")  # 前台窗口变化，结束上一个窗口的计时
+        decision = decider(hwnd, window_text, exe)
+        if len(matcher.rejected) > logged:  # 有规则因匹配耗时过长被停用
+            for line, reason in matcher.rejected[logged:]:
+                record.write(f"\t[{get_time()}]: [Info]规则[{line}]已忽略({reason});\n")
+            logged = len(matcher.rejected)
+        if decision is None: continue
+        action, hit = decision
+        decisions["foreground", action].inc()
+        if (events or sink) and not pid and action != "Pass":  # 结构化事件记录命中规则的窗口所属进程
+            pid = (get_window_info(hwnd) or (0,))[0]
+        shown = f"({hit})" if hit != window_text else ""
+        if action == "Protect":  # 窗口标题在保护规则(1)中
+            report(action, window_text, f"[Protect]访客正在访问保护程序[{window_text}]", hit, pid, "visit")
+        elif action == "Ordinary":  # 窗口标题或进程名称在普通规则中
+            report(action, window_text, f"[Ordinary]访客尝试打开[{window_text}]{shown}>>>已发送关闭窗口指令", hit, pid, "close_sent")
+            enforcer.submit("Close", hwnd, window_text)  # 关闭窗口
+        elif action == "Force":  # 窗口标题或进程名称在强制关闭规则中
+            report(action, window_text, f"[Force]访客尝试打开[{window_text}]{shown}>>>正在尝试关闭窗口", hit, pid, "closing")
+            enforcer.submit("Close", hwnd, window_text)  # 尝试关闭窗口
+            if not pid: pid = (get_window_info(hwnd) or (0,))[0]
+            if pid: escalator.schedule(hwnd, pid, window_text, action)  # 到期后窗口仍存在则结束进程
+        elif action == "Include":  # 窗口标题包含普通包含规则
+            report(action, window_text, f"[Include]访客尝试打开[{window_text}]({hit})>>>已发送关闭窗口指令", hit, pid, "close_sent")
+            enforcer.submit("Close", hwnd, window_text)  # 关闭窗口
+        elif action == "ExInclude":  # 窗口标题包含强制包含规则
+            report(action, window_text, f"[ExInclude]访客尝试打开[{window_text}]({hit})>>>正在尝试关闭窗口", hit, pid, "closing")
+            enforcer.submit("Close", hwnd, window_text)  # 关闭窗口
+            if not pid: pid = (get_window_info(hwnd) or (0,))[0]
+            if pid: escalator.schedule(hwnd, pid, window_text, action)  # 到期后窗口仍存在则结束进程
+        elif record_all:  # 记录所有窗口标题
+            report("Pass", window_text, window_text, pid=pid)
+        decide_timer.add(time.perf_counter() - start)
+        decide_seconds.observe(time.perf_counter() - start)
+    Profile = None
+    if profiler: profiler.stop()  # 写入已采样的结果，恢复被替换的函数
+    source.close()
+    if sweeper: sweeper.close()
+    enforcer.close()
+    if reloader: reloader.stop()
+    if trace: trace.close()
+    if usage: usage.close()
+    summaries = (format_timers(Stages), verdicts.summary(), Schedule.summary() if Schedule else "")
+    record.write(f"\t[{get_time()}]: [Info]检测各阶段耗时({'；'.join(filter(None, summaries))});\n")
 
 
 # 主程序
-def main(config: dict, rule: dict):
-    # 启动线程
-    ui = Thread(target=ui_main, kwargs={"password": config["password"]}, daemon=True)
-    ui.start()  # 启动ui线程
-    Thread(target=listen_text, kwargs={"config": config, "rule": rule}).start()  # 启动监听窗口标题线程
-    ui.join()  # 等待ui线程退出
-    with open(RECORD_PATH, "a", encoding="utf-8") as f:
-        if PasswordCorrectness:
-            f.write(f"\t[{get_time()}]: [Exit]密码正确，已退出程序。\n")
-        else:
-            f.write(f"\t[{get_time()}]: [Exit]未知原因导致程序退出。\n")
+def main(config: dict, rule: dict, matcher: RuleMatcher):
+    # 启动线程，监听线程先于界面启动
+    record = RecordWriter(RECORD_PATH, rotation=create_rotation(config))  # 后台日志写入，由写入线程轮转
+    events = EventWriter(EVENTS_PATH) if config["record_format"] in ("events", "both") else None  # 结构化事件日志
+    metrics = Metrics()  # 检测线程与执行线程的计数与耗时
+    metrics.counter_func("uptime_seconds_total", "程序运行时长", lambda: time.perf_counter() - STARTUP)
+    metrics_server, metrics_dumper = start_metrics(config, metrics, record)
+    sink = start_sink(config, metrics, record)  # 发送事件到收集端
+    listen = Thread(target=listen_text, kwargs={"config": config, "rule": rule, "matcher": matcher, "record": record,
+                                                "events": events, "metrics": metrics, "sink": sink})
+    listen.start()  # 启动监听窗口标题线程
+    control = start_control(config, record)  # 本地控制通道
+    if config["ui"] == "true":
+        start_ui(config["password"])  # 启动ui线程
+    elif control is None:
+        record.write(f"\t[{get_time()}]: [Info]无界面模式且未启用控制通道，只能通过结束进程退出;\n")
+    listen.join()  # ui线程或控制通道通知退出后，等待监听线程写完最后的日志
+    if control: control.close()
+    if metrics_server: metrics_server.close()
+    if metrics_dumper: metrics_dumper.close()  # 写入最终的指标
+    if PasswordCorrectness:
+        record.write(f"\t[{get_time()}]: [Exit]密码正确，已退出程序。\n")
+    else:
+        record.write(f"\t[{get_time()}]: [Exit]未知原因导致程序退出。\n")
+    if events:
+        events.write("Exit", "", outcome="password" if PasswordCorrectness else "unknown")
+        events.close()
+    if sink:
+        sink.write("Exit", "", outcome="password" if PasswordCorrectness else "unknown")
+        sink.close()  # 未确认的事件写入暂存文件，下次启动后发送
+        record.write(f"\t[{get_time()}]: [Info]收集端({sink.summary()});\n")
+    record.close()  # 写入剩余日志
 
 
 if __name__ == '__main__':
     check_file()
-    Config, Rule = get_config()
+    Config, Rule, Matcher = get_config()
     if Config["enable"] != "true":  # 未启用，退出
         with open(RECORD_PATH, "a", encoding="utf-8") as file:
             file.write(f"\t[{get_time()}]: [Exit]程序未启用，已退出。\n")
         sys.exit(0)
-    main(Config, Rule)  # 启动主程序
+    main(Config, Rule, Matcher)  # 启动主程序
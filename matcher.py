@@ -0,0 +1,544 @@
+import fnmatch
+import re
+import time
+from collections import deque
+
+try: from re import _parser as sre_parse  # Python 3.11+
+except ImportError: import sre_parse
+
+__all__ = ["AhoCorasick", "PatternSet", "PRIORITY", "RuleMatcher"]
+
+
+# 多模式匹配自动机
+class AhoCorasick:
+    def __init__(self, patterns: list[str], state: tuple | None = None):
+        """
+        Aho-Corasick多模式匹配自动机，一次扫描即可找出文本中命中的所有模式
+        :param patterns: 模式列表，下标越小优先级越高
+        :param state:    dump()导出的状态，提供时直接恢复而不重新构建
+        """
+        self.patterns = patterns
+        self.own: list[int] | None = None  # findall使用，首次调用时构建
+        self.link: list[int] | None = None
+        if state is not None:
+            self.goto, self.fail, self.best = state
+            return
+        self.goto: list[dict[str, int]] = [{}]  # 状态转移表
+        self.fail: list[int] = [0]  # 失败指针
+        self.best: list[int] = [-1]  # 到达该状态时命中的最小模式下标，-1表示无命中
+        for index, pattern in enumerate(patterns):
+            self._insert(pattern, index)
+        self._build()
+
+    # 导出状态，仅包含内置类型，可用marshal序列化
+    def dump(self) -> tuple:
+        return self.goto, self.fail, self.best
+
+    # 插入模式
+    def _insert(self, pattern: str, index: int):
+        if not pattern: return  # 空模式，跳过
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:  # 新建状态
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.best.append(-1)
+            state = next_state
+        if self.best[state] == -1 or index < self.best[state]:  # 重复模式保留优先级高的
+            self.best[state] = index
+
+    # 广度优先构建失败指针，并沿失败链合并命中结果
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(char, 0)
+                self.fail[next_state] = fail
+                inherited = self.best[fail]  # 后缀状态命中的模式同样被当前状态命中
+                if inherited != -1 and (self.best[next_state] == -1 or inherited < self.best[next_state]):
+                    self.best[next_state] = inherited
+
+    def __call__(self, text: str) -> int:
+        """
+        扫描文本
+        :param text: 待扫描文本
+        :return:     命中的最小模式下标，-1表示无命中
+        """
+        goto, fail, best = self.goto, self.fail, self.best
+        state, result = 0, -1
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            hit = best[state]
+            if hit != -1 and (result == -1 or hit < result):
+                result = hit
+                if result == 0: break  # 已命中最高优先级模式
+        return result
+
+    # 构建findall使用的输出链接
+    def _build_output(self):
+        own = [-1] * len(self.goto)  # 恰好在该状态结束的模式下标
+        for index, pattern in enumerate(self.patterns):
+            if not pattern: continue
+            state = 0
+            for char in pattern:
+                state = self.goto[state][char]
+            if own[state] == -1: own[state] = index
+        link = [0] * len(self.goto)  # 沿失败链最近的有模式结束的状态，0表示没有
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fail = self.fail[state]
+            link[state] = fail if own[fail] != -1 else link[fail]
+            queue.extend(self.goto[state].values())
+        self.own, self.link = own, link
+
+    def findall(self, text: str) -> set[int]:
+        """
+        扫描文本
+        :param text: 待扫描文本
+        :return:     命中的所有模式下标，重复模式只返回最小下标
+        """
+        if self.own is None: self._build_output()
+        goto, fail, own, link = self.goto, self.fail, self.own, self.link
+        state, result = 0, set()
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            hit = state if own[state] != -1 else link[state]
+            while hit:
+                result.add(own[hit])
+                hit = link[hit]
+        return result
+
+
+# \d、\s与\w包含的字符，首次使用时按基本多文种平面生成
+_CLASSES = {sre_parse.CATEGORY_DIGIT: r"\d", sre_parse.CATEGORY_SPACE: r"\s", sre_parse.CATEGORY_WORD: r"\w"}
+_CATEGORIES: dict[object, set[int]] = {}
+
+
+# 字符集包含的字符
+def _charset(items) -> set[int] | None:
+    """
+    :param items: 字符集(IN)的内容
+    :return:      码点集合 | None，包含\\W等取反的分类、取反或较大范围时为None，视为任意字符
+    """
+    chars: set[int] = set()
+    for op, av in items:
+        if op == sre_parse.LITERAL: chars.add(av)
+        elif op == sre_parse.RANGE and av[1] - av[0] <= 1024: chars.update(range(av[0], av[1] + 1))
+        elif op == sre_parse.CATEGORY and av in _CLASSES:
+            if av not in _CATEGORIES:
+                test = re.compile(_CLASSES[av]).match
+                _CATEGORIES[av] = {code for code in range(0x10000) if test(chr(code))}
+            chars |= _CATEGORIES[av]
+        else: return None
+    return chars
+
+
+# 正则表达式可能匹配的所有字符
+def _chars(items) -> set[int] | None:
+    """
+    :param items: sre_parse解析结果
+    :return:      码点集合 | None，None表示无法确定，视为任意字符
+    """
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None))
+    chars: set[int] = set()
+    for op, av in items:
+        if op == sre_parse.LITERAL: sub = {av}
+        elif op == sre_parse.IN: sub = _charset(av)
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT): continue
+        elif op == sre_parse.SUBPATTERN: sub = _chars(av[-1])
+        elif op in repeats: sub = _chars(av[2])
+        elif op == sre_parse.BRANCH:
+            sub = set()
+            for branch in av[1]:
+                branch_chars = _chars(branch)
+                if branch_chars is None: return None
+                sub |= branch_chars
+        else: return None
+        if sub is None: return None
+        chars |= sub
+    return chars
+
+
+# 展开顺序连接的内容，用于_sequence
+def _flatten(items, result: list, ignore: bool = False):
+    """
+    分组内的内容同样展开，分支与重复内部的内容不展开
+    :param items:  sre_parse解析结果
+    :param result: 追加 ("repeat", 码点集合 | None, None) 表示无上限的重复，("char", 码点集合 | None, 字面量码点 | None)
+                   表示必须匹配的单个字符，("other", None, None) 表示其他内容
+    :param ignore: 是否位于忽略大小写的部分，此时码点集合均为None，字面量按小写比较
+    """
+    for op, av in items:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[1] == sre_parse.MAXREPEAT:
+            result.append(("repeat", None if ignore else _chars(av[2]), None))
+        elif op == sre_parse.LITERAL:
+            result.append(("char", None if ignore else {av}, ord(chr(av).lower()) if ignore else av))
+        elif op == sre_parse.IN: result.append(("char", None if ignore else _charset(av), None))
+        elif op == sre_parse.SUBPATTERN:
+            _flatten(av[-1], result, ignore or bool(av[1] & sre_parse.SRE_FLAG_IGNORECASE))
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT): continue  # 不占用字符
+        else: result.append(("other", None, None))
+
+
+# 两个无上限重复之间必须匹配的内容是否将二者分开
+def _separates(gap: list, left: set[int] | None, right: set[int] | None) -> bool:
+    """
+    有与两侧重复都不相交的字符（如\\d+-\\d+中的-），或有3个字符以上且不自重叠的字面量（如.*foo.*中的foo，在标题中最多出现1/3标题长度次）时，
+    两侧重复的分界只有少数可能，不会成倍增加回溯
+    :param gap:   _flatten的结果中两个重复之间的部分
+    :param left:  左侧重复可能匹配的字符，见_chars
+    :param right: 右侧重复可能匹配的字符
+    :return:      是否分开
+    """
+    run = ""
+    for kind, chars, code in gap + [("other", None, None)]:
+        if kind == "char" and None not in (chars, left, right) and not (left | right) & chars: return True
+        if code is not None:
+            run += chr(code)
+            continue
+        if len(run) >= 3 and run[1:] != run[:-1] and run[2:] != run[:-2]: return True  # 最小周期不小于3
+        run = ""
+    return False
+
+
+# 顺序连接的无上限重复可能匹配的字符，按中间必须匹配的内容分段
+def _sequence(items) -> list[list[set[int] | None]]:
+    """
+    分组内的重复同样计入，分支与重复内部的重复不计入；分段规则见_separates
+    :param items: sre_parse解析结果
+    :return:      [[码点集合 | None, ...], ...]，每段为可能相互回溯的重复，见_chars
+    """
+    flat: list = []
+    _flatten(items, flat)
+    segments, segment, gap = [], [], []
+    for entry in flat:
+        if entry[0] != "repeat":
+            gap.append(entry)
+            continue
+        if segment and _separates(gap, segment[-1], entry[1]):
+            segments.append(segment)
+            segment = []
+        segment.append(entry[1])
+        gap = []
+    segments.append(segment)
+    return segments
+
+
+# 正则表达式可能匹配的第一个字符
+def _first(items) -> tuple[set[int] | None, bool]:
+    """
+    :param items: sre_parse解析结果
+    :return:      (可能的第一个字符的码点集合 | None, 是否可能匹配空字符串)，None表示无法确定，视为任意字符
+    """
+    atomic = getattr(sre_parse, "ATOMIC_GROUP", None)
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None))
+    chars: set[int] = set()
+    for op, av in items:
+        if op == sre_parse.LITERAL: return chars | {av}, False
+        if op == sre_parse.IN:
+            first = _charset(av)
+            return (None if first is None else chars | first), False
+        if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT): continue  # 不占用字符
+        if op == sre_parse.SUBPATTERN: first, empty = _first(av[-1])
+        elif op == atomic: first, empty = _first(av)
+        elif op in repeats:
+            first, empty = _first(av[2])
+            empty = empty or av[0] == 0
+        elif op == sre_parse.BRANCH:
+            first, empty = set(), False
+            for branch in av[1]:
+                branch_first, branch_empty = _first(branch)
+                if branch_first is None: return None, False
+                first |= branch_first
+                empty = empty or branch_empty
+        else: return None, False
+        if first is None: return None, False
+        chars |= first
+        if not empty: return chars, False
+    return chars, True
+
+
+# 检查正则表达式是否可能导致灾难性回溯
+def _risky(items, repeated: bool = False) -> str | None:
+    """
+    保守检查，位于可重复多次的内容（无上限的重复或{n}等上限大于1的重复）内部的以下结构视为危险：
+    无上限的重复（如(a+)+、(.*a){12}），分支可能以相同字符开头或匹配空字符串（如(a|aa)+、(a|\\w)*）；
+    顺序连接且未被必须匹配的内容分开（见_separates）的无上限重复中有3个可能匹配相同字符（如a.*a.*a.*b、\\w+\\w+\\w+），
+    标题越长耗时增长越快，同样视为危险；
+    独占重复与原子分组不会回溯，不视为危险
+    :param items:    sre_parse解析结果
+    :param repeated: 是否位于可重复多次的内容内部
+    :return:         危险原因 | None
+    """
+    possessive = getattr(sre_parse, "POSSESSIVE_REPEAT", None)
+    atomic = getattr(sre_parse, "ATOMIC_GROUP", None)
+    for sequence in _sequence(items):
+        for i, a in enumerate(sequence):  # 重复通常很少，逐个组合检查
+            for j in range(i + 1, len(sequence)):
+                b = sequence[j]
+                if a is not None and b is not None and not a & b: continue
+                for c in sequence[j + 1:]:
+                    if all(x is None or y is None or x & y for x, y in ((a, c), (b, c))):
+                        return "顺序连接的重复过多，可能导致回溯过多"
+    for op, av in items:
+        subs = ()
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, possessive):
+            if op == possessive: continue  # 独占重复内部不回溯
+            _, high, sub = av
+            if high == sre_parse.MAXREPEAT and repeated: return "嵌套的重复可能导致回溯过多"
+            reason = _risky(sub, repeated or high > 1)
+            if reason: return reason
+            continue
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS): return "不支持反向引用"
+        if op == sre_parse.SUBPATTERN: subs = (av[-1],)
+        elif op == sre_parse.BRANCH:
+            subs = av[1]
+            if repeated:
+                seen: set[int] = set()
+                for branch in subs:
+                    first, empty = _first(branch)
+                    if first is None or empty or seen & first: return "重复内的分支可能匹配相同内容，可能导致回溯过多"
+                    seen |= first
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT): subs = (av[1],)
+        elif op == atomic: continue  # 原子分组内部不回溯
+        for sub in subs:
+            reason = _risky(sub, repeated)
+            if reason: return reason
+    return None
+
+
+# 提取正则表达式命中时必然出现的最长字面量
+def _literal(items, ignore: bool = False) -> str:
+    """
+    只考虑必然匹配的部分：顺序连接的字符、分组、原子分组与至少重复一次的内容，忽略大小写的部分不提取
+    :param items:  sre_parse解析结果
+    :param ignore: 是否位于忽略大小写的部分
+    :return:       字面量，没有时为空字符串
+    """
+    atomic = getattr(sre_parse, "ATOMIC_GROUP", None)
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None))
+    best, run = "", []
+    for op, av in items:
+        if op == sre_parse.LITERAL and not ignore:
+            run.append(chr(av))
+            continue
+        if len(run) > len(best): best = "".join(run)
+        run = []
+        sub, sub_ignore = None, ignore
+        if op == sre_parse.SUBPATTERN:
+            sub, sub_ignore = av[-1], ignore or bool(av[1] & sre_parse.SRE_FLAG_IGNORECASE)
+        elif op == atomic: sub = av
+        elif op in repeats and av[0] >= 1: sub = av[2]
+        if sub is not None:
+            literal = _literal(sub, sub_ignore)
+            if len(literal) > len(best): best = literal
+    if len(run) > len(best): best = "".join(run)
+    return best
+
+
+# 编译单条正则或通配符规则
+def compile_pattern(line: str) -> tuple[re.Pattern | None, str, str]:
+    """
+    (re)开头为正则表达式，按search匹配标题的任意位置；(glob)开头为通配符，*匹配任意字符串，?匹配单个字符，须匹配整个标题
+    :param line: 规则内容，含(re)或(glob)前缀
+    :return:     (编译结果, 必然出现的字面量, "") | (None, "", 忽略原因)
+    """
+    if line.startswith("(glob)"):
+        pattern = r"\A(?:" + fnmatch.translate(line[6:]) + ")"  # translate生成的表达式使用原子分组，不会回溯过多
+        return re.compile(pattern), _literal(sre_parse.parse(pattern)), ""
+    if not line.startswith("(re)"): return None, "", "未知的规则类型"
+    pattern = line[4:]
+    flags = re.match(r"\(\?([aiLmsux]+)\)", pattern)
+    if flags:  # 开头的全局标志改为局部标志，否则无法与其他规则合并
+        pattern = f"(?{flags.group(1)}:{pattern[flags.end():]})"
+    try:
+        parsed = sre_parse.parse(pattern)
+        compiled = re.compile(pattern)
+    except (re.error, OverflowError) as e: return None, "", f"语法错误: {e}"
+    reason = _risky(parsed)
+    if reason: return None, "", reason
+    return compiled, _literal(parsed), ""
+
+
+# 正则与通配符规则
+class PatternSet:
+    TEXT_LIMIT = 256  # 只匹配标题的前若干个字符，限制异常长的标题的匹配耗时
+    BUDGET = 0.05  # 单次匹配的耗时上限，单位为秒，超过后停用该规则
+
+    def __init__(self, lines: list[str], rejected: list | None = None):
+        """
+        同一规则类型的所有正则与通配符规则一起匹配，每个标题只需扫描一次：
+        各规则命中时必然出现的字面量合并为一个自动机，只有字面量出现在标题中的规则才需要逐条确认；
+        没有字面量的规则合并为一个表达式，命中时再逐条确认；
+        可能导致灾难性回溯或无法编译的规则不会加入，记录在rejected中；
+        re模块的匹配无法中途停止，检查遗漏的规则单次匹配超过BUDGET秒后停用并记录，之后不再拖慢检测
+        :param lines:    规则内容列表，见compile_pattern，下标越小优先级越高
+        :param rejected: 记录被忽略的规则的列表，为None时新建
+        """
+        self.lines: list[str] = []  # 已加入的规则内容
+        self.compiled: list[re.Pattern] = []
+        self.rejected: list[tuple[str, str]] = [] if rejected is None else rejected  # [(规则内容, 忽略原因), ...]
+        self.disabled: set[int] = set()  # 匹配耗时过长而停用的规则下标
+        literals: dict[str, list[int]] = {}  # {字面量: [规则下标, ...], ...}
+        self.always: list[int] = []  # 没有字面量的规则下标
+        for line in lines:
+            compiled, literal, reason = compile_pattern(line)
+            if compiled is None:
+                self.rejected.append((line, reason))
+                continue
+            if literal: literals.setdefault(literal, []).append(len(self.lines))
+            else: self.always.append(len(self.lines))
+            self.lines.append(line)
+            self.compiled.append(compiled)
+        self.literals = AhoCorasick(list(literals))
+        self.candidates = list(literals.values())  # 与自动机模式下标对应
+        self._combine()
+
+    # 没有字面量的规则合并为一个表达式
+    def _combine(self):
+        self.combined = None
+        if self.always:
+            try: self.combined = re.compile("|".join(f"(?:{self.compiled[i].pattern})" for i in self.always))
+            except re.error: pass  # 命名分组重名等，逐条确认
+
+    # 停用匹配耗时过长的规则
+    def _disable(self, index: int, elapsed: float):
+        self.disabled.add(index)
+        if index in self.always:
+            self.always.remove(index)
+            self._combine()
+        self.rejected.append((self.lines[index], f"单次匹配耗时{elapsed * 1000:.0f}ms，已停用"))
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __call__(self, text: str) -> str | None:
+        """
+        :param text: 窗口标题
+        :return:     命中的规则内容 | None
+        """
+        text = text[:self.TEXT_LIMIT]
+        indexes = [i for hit in self.literals.findall(text) for i in self.candidates[hit]] if self.candidates else []
+        if self.always:
+            start = time.perf_counter()
+            if self.combined is None or self.combined.search(text): indexes += self.always
+            if time.perf_counter() - start > self.BUDGET: self.combined = None  # 逐条确认，找出耗时过长的规则
+        for index in sorted(indexes):  # 按优先级逐条确认，候选规则通常很少
+            if index in self.disabled: continue
+            start = time.perf_counter()
+            hit = self.compiled[index].search(text)
+            elapsed = time.perf_counter() - start
+            if elapsed > self.BUDGET: self._disable(index, elapsed)
+            if hit: return self.lines[index]
+        return None
+
+
+# 规则类型的优先级，数字越小优先级越高
+PRIORITY = {"Protect": 0, "Ordinary": 1, "Force": 2, "Include": 3, "ExInclude": 4}
+
+
+# 编译后的规则匹配器
+class RuleMatcher:
+    def __init__(self, rule: dict | None = None):
+        """
+        将get_config返回的规则信息编译为匹配器，优先级：Protect > Ordinary > Force > Include > ExInclude
+        窗口标题与进程名称规则分别编译，进程名称不区分大小写；同一类型中普通规则优先于正则与通配符规则
+        :param rule: 规则信息，为None时需通过load恢复
+        """
+        if rule is None: return
+        # 精确匹配类规则合并为一个哈希表，低优先级先写入，高优先级覆盖
+        self.exact: dict[str, str] = {}
+        for category, titles in (("Force", rule["Force"]), ("Ordinary", rule["Ordinary"]),
+                                 ("Protect", rule["Protect"][1])):
+            for title in titles:
+                self.exact[title] = category
+        # 包含类规则合并为一个自动机，Include排在ExInclude之前
+        self.include_count = len(rule["Include"])
+        self.contains = AhoCorasick(list(rule["Include"]) + list(rule["ExInclude"]))
+        # 进程名称规则(0)，结构与窗口标题规则相同
+        process = rule["Process"]
+        self.exe_exact: dict[str, str] = {}
+        for category in ("Force", "Ordinary"):
+            for exe in process[category]:
+                self.exe_exact[exe.casefold()] = category
+        self.exe_include_count = len(process["Include"])
+        self.exe_contains = AhoCorasick([exe.casefold() for exe in process["Include"] + process["ExInclude"]])
+        # 正则与通配符规则，每种规则类型合并为一个表达式
+        self._build_patterns(rule["Pattern"])
+
+    # 按优先级编译各规则类型的正则与通配符规则
+    def _build_patterns(self, pattern: dict[str, list[str]]):
+        self.pattern_lines = pattern
+        self.patterns: list[tuple[str, PatternSet]] = []
+        self.rejected: list[tuple[str, str]] = []  # 被忽略的规则，[(规则内容, 忽略原因), ...]
+        for category in ("Ordinary", "Force", "Include", "ExInclude"):
+            patterns = PatternSet(pattern[category], self.rejected)  # 运行中停用的规则同样记录在rejected中
+            if patterns: self.patterns.append((category, patterns))
+
+    # 是否有进程名称规则，没有时无需获取窗口所属进程
+    @property
+    def has_exe(self) -> bool:
+        return bool(self.exe_exact or self.exe_contains.patterns)
+
+    # 导出状态，仅包含内置类型，可用marshal序列化
+    def dump(self) -> tuple:
+        return (self.exact, self.include_count, self.contains.patterns, self.contains.dump(),
+                self.exe_exact, self.exe_include_count, self.exe_contains.patterns, self.exe_contains.dump(),
+                self.pattern_lines)
+
+    # 从dump()导出的状态恢复匹配器
+    @classmethod
+    def load(cls, state: tuple) -> "RuleMatcher":
+        matcher = cls()
+        (matcher.exact, matcher.include_count, patterns, contains,
+         matcher.exe_exact, matcher.exe_include_count, exe_patterns, exe_contains, pattern_lines) = state
+        matcher.contains = AhoCorasick(patterns, contains)
+        matcher.exe_contains = AhoCorasick(exe_patterns, exe_contains)
+        matcher._build_patterns(pattern_lines)  # 编译结果无法序列化，按规则内容重新编译
+        return matcher
+
+    def __call__(self, title: str, exe: str = "") -> tuple[str, str] | None:
+        """
+        匹配窗口标题与进程名称，两者均命中时取优先级高的
+        :param title: 窗口标题
+        :param exe:   窗口所属进程名称，为空时只匹配窗口标题
+        :return:      (规则类型, 命中的规则内容) | None，进程名称规则命中时规则内容以(0)开头
+        """
+        result = self._match(title, self.exact, self.contains, self.include_count)
+        for category, patterns in self.patterns:  # 只检查优先级高于已命中规则的类型
+            if result is not None and PRIORITY[category] >= PRIORITY[result[0]]: break
+            hit = patterns(title)
+            if hit is not None:
+                result = category, hit
+                break
+        if not exe or (result is not None and result[0] == "Protect"): return result
+        by_exe = self._match(exe.casefold(), self.exe_exact, self.exe_contains, self.exe_include_count)
+        if by_exe is None: return result
+        if result is None or PRIORITY[by_exe[0]] < PRIORITY[result[0]]:
+            return by_exe[0], f"(0){by_exe[1]}"
+        return result
+
+    @staticmethod
+    def _match(text: str, exact: dict, contains: AhoCorasick, include_count: int) -> tuple[str, str] | None:
+        category = exact.get(text)
+        if category is not None:
+            return category, text
+        index = contains(text)
+        if index == -1:
+            return None
+        if index < include_count:
+            return "Include", contains.patterns[index]
+        return "ExInclude", contains.patterns[index]
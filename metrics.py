@@ -0,0 +1,303 @@
+import os
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+
+__all__ = ["BUCKETS", "Metrics", "InstrumentedApi", "MetricsServer", "MetricsDumper"]
+
+# 耗时直方图的默认桶上界，单位为秒，覆盖从微秒级的缓存命中到秒级的无响应程序
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# 计数器
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = Lock()
+
+    def inc(self, amount: int = 1):
+        with self.lock:
+            self.value += amount
+
+
+# 直方图
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        """
+        :param buckets: 各桶上界，从小到大排列，超过最大上界的计入+Inf桶
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 各桶的计数，不累加，输出时再累加
+        self.sum = 0.0
+        self.lock = Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)  # 等于上界时计入该桶，与Prometheus的le一致
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> tuple[list[int], float]:
+        """
+        :return: (各桶计数，不累加, 总和)
+        """
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+# 转义标签值
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# 格式化数值，保留全部精度，计数超过百万时不转为科学计数法
+def _number(value: float) -> str:
+    if value != value: return "NaN"
+    if value in (float("inf"), float("-inf")): return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() and abs(value) < 2 ** 53 else repr(value)
+
+
+# 格式化标签
+def _labels(labels: tuple[tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra: parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# 指标注册表
+class Metrics:
+    def __init__(self, prefix: str = "winstart_"):
+        """
+        按名称与标签保存计数器、直方图与在输出时才读取的数值或累计值，输出为Prometheus文本格式；
+        计数与记录耗时只需一次加锁，输出时不阻塞计数
+        :param prefix: 指标名称前缀
+        """
+        self.prefix = prefix
+        self.families: dict[str, tuple[str, str, dict]] = {}  # {名称: (类型, 说明, {标签: 指标}), ...}
+        self.lock = Lock()
+
+    def _get(self, kind: str, name: str, help_text: str, labels: dict, factory):
+        name = self.prefix + name
+        key = tuple(sorted((key, str(value)) for key, value in labels.items()))
+        with self.lock:
+            family = self.families.get(name)
+            if family is None: family = self.families[name] = (kind, help_text, {})
+            elif family[0] != kind: raise ValueError(f"指标[{name}]已注册为{family[0]}")
+            metric = family[2].get(key)
+            if metric is None: metric = family[2][key] = factory()
+            return metric
+
+    def counter(self, name: str, help_text: str, **labels) -> Counter:
+        """
+        获取计数器，同名同标签的计数器只创建一次
+        :param name:      指标名称，不含前缀，以_total结尾
+        :param help_text: 说明
+        :param labels:    标签
+        :return:          计数器
+        """
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name: str, help_text: str, buckets: tuple[float, ...] = BUCKETS, **labels) -> Histogram:
+        """
+        获取直方图，同名同标签的直方图只创建一次
+        :param name:      指标名称，不含前缀，耗时以_seconds结尾
+        :param help_text: 说明
+        :param buckets:   各桶上界，同名的直方图应使用相同的上界
+        :param labels:    标签
+        :return:          直方图
+        """
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def gauge(self, name: str, help_text: str, func, **labels):
+        """
+        注册在输出时才读取的数值，如队列长度，计数时没有任何开销；重复注册时替换读取函数
+        :param name:      指标名称，不含前缀
+        :param help_text: 说明
+        :param func:      无参数，返回数值的函数
+        :param labels:    标签
+        """
+        self._register("gauge", name, help_text, func, labels)
+
+    def counter_func(self, name: str, help_text: str, func, **labels):
+        """
+        注册在输出时才读取的累计值，如缓存命中次数、已发送的事件数，输出为counter，可用rate()计算速率；
+        重复注册时替换读取函数
+        :param name:      指标名称，不含前缀，以_total结尾
+        :param help_text: 说明
+        :param func:      无参数，返回只增不减的数值的函数
+        :param labels:    标签
+        """
+        self._register("counter", name, help_text, func, labels)
+
+    def _register(self, kind: str, name: str, help_text: str, func, labels: dict):
+        name = self.prefix + name
+        key = tuple(sorted((key, str(value)) for key, value in labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, (kind, help_text, {}))
+            if family[0] != kind: raise ValueError(f"指标[{name}]已注册为{family[0]}")
+            family[2][key] = func
+
+    def render(self) -> str:
+        """
+        :return: Prometheus文本格式(0.0.4)
+        """
+        with self.lock:  # 只复制注册表，读取数值时不持有注册表的锁
+            families = [(name, kind, help_text, list(series.items()))
+                        for name, (kind, help_text, series) in sorted(self.families.items())]
+        lines = []
+        for name, kind, help_text, series in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in sorted(series, key=lambda item: item[0]):
+                if kind == "counter" and not callable(metric):
+                    lines.append(f"{name}{_labels(labels)} {metric.value}")
+                elif kind in ("counter", "gauge"):
+                    try: value = float(metric())
+                    except Exception: continue  # 读取失败时不输出该值
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                else:
+                    counts, total = metric.snapshot()
+                    cumulative = 0
+                    for bound, count in zip((*metric.buckets, "+Inf"), counts):
+                        cumulative += count
+                        le = f'le="{bound}"'
+                        lines.append(f"{name}_bucket{_labels(labels, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {total:.9g}")
+                    lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+# 记录耗时的接口对象
+class _Timed:
+    def __init__(self, target, metrics: Metrics, call: str, methods: tuple[str, ...]):
+        """
+        记录接口对象每次调用的耗时与异常次数，其余属性直接读取原对象
+        :param target:  接口对象，如GetWindowInfo()
+        :param metrics: 指标注册表
+        :param call:    接口名称，作为call标签
+        :param methods: 需要记录耗时的方法，如snapshot
+        """
+        self._target = target
+        self._seconds = metrics.histogram("api_seconds", "平台接口每次调用的耗时", call=call)
+        self._errors = metrics.counter("api_errors_total", "平台接口调用抛出异常的次数", call=call)
+        for method in methods:
+            if hasattr(target, method):
+                setattr(self, method, _Timed(getattr(target, method), metrics, f"{call}.{method}", ()))
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try: return self._target(*args, **kwargs)
+        except Exception:
+            self._errors.inc()
+            raise
+        finally: self._seconds.observe(time.perf_counter() - start)
+
+    def __getattr__(self, name: str):
+        return getattr(self._target, name)
+
+
+# 记录耗时的平台后端
+class InstrumentedApi:
+    # 除调用本身外还需记录耗时的方法
+    METHODS = {"GetProcessInfo": ("snapshot",), "GetWindowHandle": ("diff",)}
+    # 不记录耗时的接口，如钩子只启动一次
+    SKIP = ("WinEventHook",)
+
+    def __init__(self, api, metrics: Metrics):
+        """
+        与平台后端接口相同，创建的接口对象每次调用都记录耗时，见backend.load_backend
+        :param api:     平台后端
+        :param metrics: 指标注册表
+        """
+        self._api = api
+        self._metrics = metrics
+
+    def __getattr__(self, name: str):
+        factory = getattr(self._api, name)
+        if name in self.SKIP or not callable(factory) or not name[:1].isupper(): return factory
+
+        def create(*args, **kwargs):
+            return _Timed(factory(*args, **kwargs), self._metrics, name, self.METHODS.get(name, ()))
+
+        setattr(self, name, create)  # 之后直接读取，不再经过__getattr__
+        return create
+
+
+# 指标HTTP服务
+class MetricsServer:
+    def __init__(self, port: int, metrics: Metrics):
+        """
+        在127.0.0.1上提供GET /metrics，返回Prometheus文本格式，每个请求在独立线程中处理
+        :param port:    端口，0表示由系统分配
+        :param metrics: 指标注册表
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # 不向标准错误输出访问记录
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]  # 实际监听的端口
+        self.thread = Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.5}, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# 指标定期写入文件
+class MetricsDumper:
+    def __init__(self, path: str, metrics: Metrics, interval: float):
+        """
+        每隔interval秒将指标写入文件，先写入临时文件再替换，可由node_exporter的textfile收集器读取
+        :param path:     文件路径
+        :param metrics:  指标注册表
+        :param interval: 写入间隔，单位为秒
+        """
+        self.path = path
+        self.metrics = metrics
+        self.interval = interval
+        self.stopped = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def dump(self) -> bool:
+        """
+        :return: 是否写入成功
+        """
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp, "w", encoding="utf-8", newline="\n") as f:
+                f.write(self.metrics.render())
+            os.replace(temp, self.path)
+            return True
+        except OSError:  # 目录只读等，不影响运行
+            try: os.remove(temp)
+            except OSError: pass
+            return False
+
+    def close(self):
+        """
+        写入最后一次指标并结束写入线程
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.dump()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
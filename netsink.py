@@ -0,0 +1,298 @@
+import json
+import os
+import queue
+import random
+import select
+import socket
+import struct
+import time
+from collections import deque
+from threading import Lock, Thread
+
+from eventlog import CATEGORIES, OTHER
+
+__all__ = ["FRAME", "ACK", "VERSION", "NetworkSink", "parse_address", "read_spool"]
+
+# 协议：TCP连接建立后代理先发送一行握手JSON {"agent": 代理名称, "token": 口令, "version": VERSION}，
+# 收集端回复一行 {"ok": true}，拒绝时回复 {"ok": false, "error": 原因} 后关闭连接
+# 之后代理连续发送事件批次，每批为 FRAME头 + 内容：
+#   FRAME: >IQQddI 内容字节数, 会话编号, 批次序号, 批内最早时间, 批内最晚时间, 批内事件类型的位掩码
+#   内容:  与事件文件相同的JSON行，每行以换行结尾
+# 收集端写入后按接收顺序回复 ACK: >QQ 会话编号, 批次序号；未确认的批次重连后重发，收集端按(代理, 会话, 序号)去重
+# 暂存文件由连续的 FRAME头 + 内容 组成，与发送的字节相同
+FRAME = struct.Struct(">IQQddI")
+ACK = struct.Struct(">QQ")
+VERSION = 1
+
+
+# 解析收集端地址
+def parse_address(text: str, port: int = 9400) -> tuple[str, int]:
+    """
+    :param text: “主机:端口”或“主机”，如 “10.0.0.5:9400”
+    :param port: 未指定端口时使用的端口
+    :return:     (主机, 端口)
+    """
+    host, sep, value = text.strip().rpartition(":")
+    if not sep: return text.strip(), port
+    return host.strip("[]"), int(value)
+
+
+# 读取暂存文件
+def read_spool(path: str) -> list[bytes]:
+    """
+    :param path: 暂存文件路径
+    :return:     [FRAME头 + 内容, ...]，文件不存在时为[]，末尾不完整的批次被忽略
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError: return []
+    frames, pos = [], 0
+    while pos + FRAME.size <= len(data):
+        end = pos + FRAME.size + FRAME.unpack_from(data, pos)[0]
+        if end > len(data): break  # 写入暂存文件时异常退出
+        frames.append(data[pos:end])
+        pos = end
+    return frames
+
+
+# 发送事件到收集端
+class NetworkSink:
+    def __init__(self, address: tuple[str, int], agent: str, spool_path: str, token: str = "",
+                 batch_size: int = 500, flush_interval: float = 1.0, capacity: int = 10000, window: int = 8,
+                 max_spool: int = 64 << 20, retry: tuple[float, float] = (1.0, 60.0), timeout: float = 5.0):
+        """
+        与EventWriter接口相同；事件先进入有界队列，由发送线程每batch_size条或每flush_interval秒打包为一批，
+        通过一条长期保持的连接连续发送，最多window批未确认，不必逐批等待确认；
+        不使用多条连接：收集端按批次序号去重，要求同一会话的批次按顺序到达，单条连接连续发送已足够每秒数万条
+        连接断开或收集端不可达时批次追加到暂存文件，重连后按原顺序先发送暂存的批次，全部确认后删除暂存文件；
+        重连间隔从retry[0]秒起每次失败加倍，最多retry[1]秒
+        :param address:        收集端地址 (主机, 端口)
+        :param agent:          代理名称，区分各台电脑的事件
+        :param spool_path:     暂存文件路径
+        :param token:          口令，与收集端一致时才接受连接，空字符串表示不验证
+        :param batch_size:     每批最多的事件数量
+        :param flush_interval: 未满的批次最多等待多少秒后发送
+        :param capacity:       队列容量，队列已满时丢弃新事件并计数
+        :param window:         最多未确认的批次数量
+        :param max_spool:      暂存文件最大字节数，超过后丢弃新批次并计数
+        :param retry:          (最短, 最长)重连间隔，单位为秒
+        :param timeout:        连接与握手的超时时间，单位为秒
+        """
+        self.address = address
+        self.agent = agent
+        self.spool_path = spool_path
+        self.token = token
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.window = window
+        self.max_spool = max_spool
+        self.retry = retry
+        self.timeout = timeout
+        self.queue: queue.Queue[dict | None] = queue.Queue(capacity)
+        self.session = random.getrandbits(63)  # 会话编号，每次启动不同，与批次序号一起用于去重
+        self.seq = 0  # 最后一批的序号
+        self.pending: deque[bytes] = deque()  # 待发送的批次，连接期间包含暂存文件中的全部批次
+        self.inflight: deque[bytes] = deque()  # 已发送未确认的批次
+        self.sock: socket.socket | None = None
+        self.buffer = b""  # 未解析完的确认
+        self.backoff = retry[0]  # 下次重连失败后的等待时间
+        self.retry_at = 0.0  # 下次尝试连接的时间(monotonic)
+        self.error = ""  # 最近一次连接失败或断开的原因
+        self.dropped = 0  # 因队列已满或暂存文件过大丢弃的事件数
+        self.lock = Lock()  # 保护dropped，调用write的线程与发送线程都会计数
+        self.sent = 0  # 已确认的事件数
+        self.spooled = 0  # 暂存文件中的事件数
+        self.connects = 0  # 连接成功的次数
+        self.close_timeout = 2.0  # 结束时等待确认的最长时间
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def write(self, category: str, title: str, rule: str = "", pid: int = 0, outcome: str = "",
+              timestamp: float | None = None):
+        """
+        写入一条事件，不阻塞，可在任意线程中调用，参数见EventWriter.write
+        """
+        event = {"t": round(time.time() if timestamp is None else timestamp, 3), "cat": category, "title": title,
+                 "rule": rule, "pid": pid, "outcome": outcome}
+        try: self.queue.put_nowait(event)
+        except queue.Full:
+            with self.lock: self.dropped += 1
+
+    def close(self, timeout: float = 2.0):
+        """
+        打包剩余事件，已连接时最多等待timeout秒发送完，未确认的批次写入暂存文件，下次启动后发送
+        :param timeout: 等待确认的最长时间，单位为秒
+        """
+        self.close_timeout = timeout
+        self.queue.put(None)
+        self.thread.join()
+
+    def summary(self) -> str:
+        """
+        :return: 单行文本，如 “已连接；已发送1200条，暂存0条，丢弃0条，待确认2批”
+        """
+        state = "已连接" if self.connected else f"未连接({self.error or '等待重连'})"
+        return (f"{state}；已发送{self.sent}条，暂存{self.spooled}条，丢弃{self.dropped}条，"
+                f"待确认{len(self.inflight) + len(self.pending)}批")
+
+    # 将一批事件打包为FRAME头 + 内容
+    def _seal(self, events: list[dict]) -> bytes:
+        lines, mask = [], 0
+        for event in events:
+            lines.append(json.dumps(event, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+            mask |= 1 << CATEGORIES.index(event["cat"]) if event["cat"] in CATEGORIES else OTHER
+        payload = b"".join(lines)
+        times = [event["t"] for event in events]
+        self.seq += 1
+        return FRAME.pack(len(payload), self.session, self.seq, min(times), max(times), mask) + payload
+
+    def _connect(self) -> bool:
+        try:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+        except OSError as error:
+            self._fail(str(error))
+            return False
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            hello = {"agent": self.agent, "token": self.token, "version": VERSION}
+            sock.sendall(json.dumps(hello, ensure_ascii=False).encode("utf-8") + b"\n")
+            reply = b""
+            while not reply.endswith(b"\n"):
+                data = sock.recv(4096)
+                if not data: raise ConnectionError("收集端关闭了连接")
+                reply += data
+            answer = json.loads(reply)
+            if not answer.get("ok"): raise ConnectionError(answer.get("error", "收集端拒绝连接"))
+            sock.settimeout(self.timeout)  # 发送时收集端长时间不读取视为断开
+        except (OSError, ValueError) as error:
+            sock.close()
+            self._fail(str(error))
+            return False
+        self.sock, self.buffer = sock, b""
+        self.backoff, self.error = self.retry[0], ""
+        self.connects += 1
+        self.pending.extendleft(reversed(read_spool(self.spool_path)))  # 暂存的批次较早，先发送
+        return True
+
+    # 连接失败，等待后重连
+    def _fail(self, reason: str):
+        self.error = reason
+        self.retry_at = time.monotonic() + self.backoff
+        self.backoff = min(self.backoff * 2, self.retry[1])
+
+    # 断开连接，未确认的批次重写暂存文件
+    def _disconnect(self, reason: str):
+        if self.sock:
+            try: self.sock.close()
+            except OSError: pass
+            self.sock = None
+        self.pending.extendleft(reversed(self.inflight))
+        self.inflight.clear()
+        self._spill(rewrite=True)
+        self._fail(reason)
+
+    # 将待发送的批次写入暂存文件
+    def _spill(self, rewrite: bool = False):
+        """
+        :param rewrite: 是否覆盖暂存文件；连接期间暂存文件中的批次都在pending中，断开时覆盖，未连接时追加
+        """
+        if not self.pending and not rewrite: return
+        if rewrite and not self.pending:
+            self._remove_spool()
+            return
+        try: size = 0 if rewrite else os.path.getsize(self.spool_path)
+        except OSError: size = 0
+        kept = []
+        for frame in self.pending:
+            count = frame.count(b"\n", FRAME.size)
+            if size + len(frame) > self.max_spool:
+                with self.lock: self.dropped += count
+                continue
+            size += len(frame)
+            kept.append(frame)
+        self.pending.clear()
+        count = sum(frame.count(b"\n", FRAME.size) for frame in kept)
+        temp = f"{self.spool_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp if rewrite else self.spool_path, "wb" if rewrite else "ab") as f:
+                f.write(b"".join(kept))
+            if rewrite: os.replace(temp, self.spool_path)
+            self.spooled = count if rewrite else self.spooled + count
+        except OSError:  # 目录只读等，丢弃并计数
+            with self.lock: self.dropped += count
+
+    def _remove_spool(self):
+        try: os.remove(self.spool_path)
+        except OSError: pass
+        self.spooled = 0
+
+    # 发送批次并读取确认
+    def _pump(self, wait: float = 0.0):
+        """
+        :param wait: 有未确认的批次时最多等待确认多少秒
+        """
+        if self.sock is None:
+            if (self.pending or os.path.exists(self.spool_path)) and time.monotonic() >= self.retry_at:
+                self._connect()
+            if self.sock is None:
+                self._spill()
+                return
+        try:
+            while self.pending or self.inflight:
+                while self.pending and len(self.inflight) < self.window:
+                    frame = self.pending.popleft()
+                    self.inflight.append(frame)
+                    self.sock.sendall(frame)
+                readable, _, _ = select.select([self.sock], [], [], wait)
+                if not readable: break
+                data = self.sock.recv(65536)
+                if not data: raise ConnectionError("收集端关闭了连接")
+                self.buffer += data
+                acked = len(self.buffer) // ACK.size
+                for pos in range(0, acked * ACK.size, ACK.size):
+                    frame = self.inflight.popleft() if self.inflight else b""
+                    if not frame or ACK.unpack_from(self.buffer, pos) != FRAME.unpack_from(frame)[1:3]:
+                        raise ConnectionError("收到的确认与发送的批次不一致")
+                    self.sent += frame.count(b"\n", FRAME.size)
+                self.buffer = self.buffer[acked * ACK.size:]
+                wait = 0.0  # 只在第一次读取时等待
+        except OSError as error:
+            self._disconnect(str(error))
+            return
+        if not self.pending and not self.inflight and os.path.exists(self.spool_path):
+            self._remove_spool()  # 暂存的批次已全部确认
+
+    def _run(self):
+        events: list[dict] = []  # 尚未打包的事件
+        started = 0.0  # 当前批次第一条事件的时间(monotonic)
+        running = True
+        while running:
+            timeout = 0.05 if self.inflight else self.flush_interval  # 有未确认的批次时尽快读取确认
+            try: items = [self.queue.get(timeout=timeout)]
+            except queue.Empty: items = []
+            while len(items) < self.batch_size:
+                try: items.append(self.queue.get_nowait())
+                except queue.Empty: break
+            if None in items:  # 收到结束信号
+                items = items[:items.index(None)]
+                running = False
+            if items and not events: started = time.monotonic()
+            events.extend(items)
+            while len(events) >= self.batch_size:
+                self.pending.append(self._seal(events[:self.batch_size]))
+                events = events[self.batch_size:]
+                started = time.monotonic()
+            if events and (time.monotonic() - started >= self.flush_interval or not running):
+                self.pending.append(self._seal(events))
+                events = []
+            self._pump()
+        deadline = time.monotonic() + self.close_timeout
+        while self.sock and (self.pending or self.inflight) and time.monotonic() < deadline:
+            self._pump(0.05)
+        if self.sock: self._disconnect("已关闭")
+        else: self._spill()
@@ -0,0 +1,188 @@
+import queue
+import time
+from threading import Event, Lock, Thread
+
+from proctree import kill_tree
+
+__all__ = ["StageTimer", "format_timers", "Sampler", "Enforcer"]
+
+
+# 阶段耗时统计
+class StageTimer:
+    def __init__(self, size: int = 1024):
+        """
+        记录总次数、最大耗时与最近size次的耗时，用于计算分位数
+        :param size: 保留的最近耗时数量
+        """
+        self.size = size
+        self.recent: list[float] = []  # 环形缓冲区
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        if len(self.recent) < self.size: self.recent.append(seconds)
+        else: self.recent[self.index] = seconds
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max: self.max = seconds
+
+    def summary(self) -> dict:
+        """
+        :return: {"count": 次数, "avg_ms": 平均耗时, "p50_ms": 最近中位数, "p99_ms": 最近99分位数, "max_ms": 最大耗时}
+        """
+        recent = sorted(self.recent)
+        pick = (lambda q: recent[min(int(len(recent) * q), len(recent) - 1)] * 1e3) if recent else (lambda q: 0.0)
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1e3 if self.count else 0.0,
+            "p50_ms": pick(0.5),
+            "p99_ms": pick(0.99),
+            "max_ms": self.max * 1e3,
+        }
+
+
+# 格式化各阶段耗时
+def format_timers(timers: dict[str, StageTimer]) -> str:
+    """
+    :param timers: {阶段名称: 耗时统计}
+    :return:       单行文本，如 “decide: 12次 平均0.01ms p99 0.05ms 最大0.20ms”
+    """
+    parts = []
+    for name, timer in timers.items():
+        s = timer.summary()
+        parts.append(f"{name}: {s['count']}次 平均{s['avg_ms']:.2f}ms p99 {s['p99_ms']:.2f}ms 最大{s['max_ms']:.2f}ms")
+    return "；".join(parts)
+
+
+# 采样阶段
+class Sampler:
+    def __init__(self, source, capacity: int = 1024, poll_timeout: float = 0.5):
+        """
+        在独立线程中从事件源读取前台窗口，经有界队列交给判定阶段；与事件源接口相同，可直接替换事件源
+        :param source:       事件源，见events.create_source
+        :param capacity:     队列容量，队列已满时采样线程等待判定阶段
+        :param poll_timeout: 采样线程每次等待事件源的超时时间，单位为秒，用于及时响应close
+        """
+        self.source = source
+        self.poll_timeout = poll_timeout
+        self.queue: queue.Queue[tuple[float, tuple[int, str]]] = queue.Queue(capacity)
+        self.timer = StageTimer()  # 采样到被判定阶段取走的耗时
+        self.stopped = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            event = self.source.get(self.poll_timeout)
+            if event is None: continue
+            item = (time.perf_counter(), event)
+            while not self.stopped.is_set():
+                try:
+                    self.queue.put(item, timeout=self.poll_timeout)
+                    break
+                except queue.Full: pass
+
+    def get(self, timeout: float) -> tuple[int, str] | None:
+        """
+        等待前台窗口变化
+        :param timeout: 超时时间，单位为秒
+        :return:        (hwnd, 窗口标题) | None，None表示超时前前台窗口未变化
+        """
+        try: sampled, event = self.queue.get(timeout=timeout)
+        except queue.Empty: return None
+        self.timer.add(time.perf_counter() - sampled)
+        return event
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.source.close()
+
+
+# 执行阶段
+class Enforcer:
+    def __init__(self, api, on_done, workers: int = 2, capacity: int = 256, timeout: float = 1.0, tree: bool = False):
+        """
+        由线程池执行关闭窗口与结束进程，同一目标已在队列中或正在执行时不重复提交
+        :param api:      平台后端，每个线程各自创建接口对象
+        :param on_done:  完成回调，参数为(动作, hwnd, 窗口标题, 结果)，在执行线程中调用；
+                         Close的结果为目标程序是否在超时前处理了关闭指令，
+                         Kill的结果为 “closed”窗口已关闭 | “protect”保护进程 | “success”结束成功 | “fail”结束失败
+        :param workers:  线程数量，单个无响应的目标最多占用一个线程timeout秒
+        :param capacity: 队列容量，队列已满时丢弃新任务
+        :param timeout:  发送关闭指令的超时时间，单位为秒
+        :param tree:     Kill时是否按同一个进程快照结束窗口所属进程及其所有后代进程，从叶子进程开始
+        """
+        self.api = api
+        self.on_done = on_done
+        self.timeout = timeout
+        self.tree = tree
+        self.queue: queue.Queue[tuple | None] = queue.Queue(capacity)
+        self.pending: set[tuple[str, int]] = set()  # 在队列中或正在执行的(动作, hwnd)
+        self.lock = Lock()
+        self.dropped = 0  # 因队列已满丢弃的任务数
+        self.deduped = 0  # 因目标已在处理中跳过的任务数
+        self.wait_timer = StageTimer()  # 提交到开始执行的耗时
+        self.timers = {"Close": StageTimer(), "Kill": StageTimer()}  # 各动作的执行耗时
+        self.threads = [Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self.threads: thread.start()
+
+    def submit(self, action: str, hwnd: int, window_text: str, protect_pids=()) -> bool:
+        """
+        提交任务，不阻塞
+        :param action:       Close关闭窗口 | Kill结束窗口所属进程
+        :param hwnd:         窗口句柄
+        :param window_text:  窗口标题，用于记录
+        :param protect_pids: 保护进程pid，Kill时窗口属于其中的进程则不结束
+        :return:             是否已提交
+        """
+        key = (action, hwnd)
+        with self.lock:
+            if key in self.pending:
+                self.deduped += 1
+                return False
+            try: self.queue.put_nowait((key, window_text, protect_pids, time.perf_counter()))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.pending.add(key)
+        return True
+
+    def close(self):
+        """
+        执行完已提交的任务后结束所有线程
+        """
+        for _ in self.threads: self.queue.put(None)
+        for thread in self.threads: thread.join()
+
+    def _run(self):
+        send_close = self.api.SendClose(timeout=self.timeout)
+        froce_close = self.api.ForceClose()
+        get_window_info = self.api.GetWindowInfo()
+        get_process_info = self.api.GetProcessInfo()
+        get_process_time = self.api.GetProcessTime()
+        while True:
+            job = self.queue.get()
+            if job is None: break
+            (action, hwnd), window_text, protect_pids, submitted = job
+            start = time.perf_counter()
+            if action == "Close":
+                result = send_close(hwnd) or get_window_info(hwnd) is None  # 窗口已关闭也视为已处理
+            else:
+                info = get_window_info(hwnd)  # 获取窗口pid
+                if info is None: result = "closed"
+                elif info[0] in protect_pids: result = "protect"
+                elif self.tree:
+                    killed, failed = kill_tree(froce_close, get_process_info.snapshot(), info[0], protect_pids,
+                                               get_process_time)
+                    result = "success" if killed and not failed else "fail"
+                else: result = "success" if froce_close(info[0]) else "fail"
+            with self.lock:
+                self.wait_timer.add(start - submitted)
+                self.timers[action].add(time.perf_counter() - start)
+                self.pending.discard((action, hwnd))
+            try: self.on_done(action, hwnd, window_text, result)
+            except Exception: pass  # 回调异常不影响执行线程
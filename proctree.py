@@ -0,0 +1,132 @@
+import time
+
+__all__ = ["ProcessTable", "kill_tree", "ExeCache"]
+
+
+# 进程快照表
+class ProcessTable:
+    def __init__(self):
+        """
+        保存一次进程快照的 “pid: (父进程pid, 进程名称, 线程数)”，并在同一次遍历中建立 “父进程pid: [子进程pid, ...]” 索引
+        """
+        self.rows: dict[int, tuple[int, str, int]] = {}  # {pid: (ppid, exe, threads), ...}
+        self.children: dict[int, list[int]] = {}  # {ppid: [pid, ...], ...}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, pid: int) -> bool:
+        return pid in self.rows
+
+    def add(self, pid: int, ppid: int, exe: str, threads: int):
+        """
+        加入一个进程，由快照遍历调用
+        """
+        self.rows[pid] = (ppid, exe, threads)
+        if ppid != pid:  # System Idle Process的父进程是自身
+            self.children.setdefault(ppid, []).append(pid)
+
+    def names(self, sort: bool = False) -> dict[int, str]:
+        """
+        :param sort: 是否按pid排序
+        :return:     pid: name字典
+        """
+        pids = sorted(self.rows) if sort else self.rows
+        return {pid: self.rows[pid][1] for pid in pids}
+
+    def subtree(self, pid: int, get_process_time=None) -> list[int]:
+        """
+        获取进程及其所有后代进程，子进程在父进程之前
+        Windows不会为父进程已退出的进程重新指定父进程，父进程的pid被复用后，旧父进程的子进程会被误认为新进程的子进程；
+        提供get_process_time时只在子进程创建时间不早于父进程时才视为其子进程，无法获取创建时间的进程不计入；
+        另按已访问集合去重，避免形成环
+        :param pid:              根进程pid
+        :param get_process_time: 获取进程创建时间的函数，如GetProcessTime()，为None时只按父进程pid判断
+        :return:                 [pid, ...]，根进程在最后；进程不存在时为[]
+        """
+        if pid not in self.rows: return []
+        created = {pid: get_process_time(pid)} if get_process_time else {}
+        if get_process_time and created[pid] is None: return [pid]  # 无法确认根进程的创建时间，不结束后代进程
+        order, seen, stack = [], {pid}, [(pid, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if expanded:
+                order.append(current)
+                continue
+            stack.append((current, True))
+            for child in self.children.get(current, ()):
+                if child in seen: continue
+                if get_process_time:
+                    created[child] = get_process_time(child)
+                    if created[child] is None or created[child] < created[current]: continue  # pid被复用前的子进程
+                seen.add(child)
+                stack.append((child, False))
+        return order
+
+
+# 结束进程树
+def kill_tree(froce_close, table: ProcessTable, pid: int, protect=(), get_process_time=None) -> tuple[int, int]:
+    """
+    按同一个快照从叶子进程开始结束整个进程树，不为每个进程重新创建快照
+    :param froce_close:      结束单个进程的函数，如ForceClose()
+    :param table:            进程快照表
+    :param pid:              根进程pid
+    :param protect:          保护进程pid，这些进程不会被结束（其后代仍会被结束，用户程序通常是explorer.exe的后代）
+    :param get_process_time: 获取进程创建时间的函数，如GetProcessTime()，用于排除pid被复用前的子进程，见ProcessTable.subtree
+    :return:                 (结束成功的进程数, 结束失败的进程数)
+    """
+    killed = failed = 0
+    for current in table.subtree(pid, get_process_time):
+        if current in protect: continue
+        if froce_close(current): killed += 1
+        else: failed += 1
+    return killed, failed
+
+
+# 进程名称缓存
+class ExeCache:
+    def __init__(self, get_process_info, get_process_time):
+        """
+        缓存 “pid: 进程名称”，以pid与进程创建时间识别进程，pid被复用后不会返回旧进程的名称；
+        只有遇到未缓存或已被复用的pid时才创建一次进程快照，并同时更新快照中的所有进程
+        :param get_process_info: 进程信息，需提供snapshot()，如GetProcessInfo()
+        :param get_process_time: 获取进程创建时间的函数，如GetProcessTime()
+        """
+        self.get_process_info = get_process_info
+        self.get_process_time = get_process_time
+        self.cache: dict[int, tuple[float | None, str, float]] = {}  # {pid: (创建时间, 进程名称, 快照时间), ...}
+        self.hits = 0  # 命中次数
+        self.misses = 0  # 未命中次数，每次未命中创建一次快照
+
+    def __call__(self, pid: int) -> str:
+        """
+        :param pid: 进程ID
+        :return:    进程名称，进程不存在时为空字符串
+        """
+        created = self.get_process_time(pid)
+        entry = self.cache.get(pid)
+        if entry is not None:
+            known, exe, snapshot_time = entry
+            if created is None or created == known:  # 无权获取创建时间时沿用缓存
+                self.hits += 1
+                return exe
+            if known is None and created <= snapshot_time:  # 快照时该进程已存在，补记创建时间
+                self.cache[pid] = (created, exe, snapshot_time)
+                self.hits += 1
+                return exe
+        self.misses += 1
+        now = self._refresh()
+        entry = self.cache.get(pid)
+        if entry is None: return ""  # 进程已退出
+        if created is not None: self.cache[pid] = (created, entry[1], now)  # 进程创建于快照之前
+        return entry[1]
+
+    # 按新快照更新缓存，移除已退出的进程
+    def _refresh(self) -> float:
+        now = time.time()
+        cache = {}
+        for pid, (_, exe, _) in self.get_process_info.snapshot().rows.items():
+            entry = self.cache.get(pid)
+            cache[pid] = entry if entry is not None and entry[1] == exe else (None, exe, now)
+        self.cache = cache
+        return now
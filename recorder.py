@@ -0,0 +1,238 @@
+import glob
+import gzip
+import os
+import queue
+import shutil
+import time
+from threading import Lock, Thread
+
+__all__ = ["TimeCache", "LogRotation", "RecordWriter"]
+
+
+# 按秒缓存的时间格式化
+class TimeCache:
+    def __init__(self, fmt: str):
+        """
+        同一秒内重复格式化时直接返回缓存结果，避免每行日志都调用time.strftime
+        :param fmt: time.strftime格式
+        """
+        self.fmt = fmt
+        self.cache: tuple[int, str] = (-1, "")  # (秒, 格式化结果)，整体替换以保证线程安全
+
+    def __call__(self) -> str:
+        now = int(time.time())
+        second, text = self.cache
+        if second != now:
+            text = time.strftime(self.fmt, time.localtime(now))
+            self.cache = (now, text)
+        return text
+
+
+# 日志轮转
+class LogRotation:
+    def __init__(self, path: str, max_bytes: int = 0, daily: bool = True, keep: int = 0, keep_days: float = 0,
+                 header=None):
+        """
+        日志文件超过大小上限或跨天时改名为 “record.年月日-时分秒.log”，由压缩线程流式压缩为.gz并删除原文件，
+        再按保留数量与天数删除旧的日志；轮转由日志写入线程执行，压缩在独立线程中执行，均不阻塞检测线程
+        :param path:      日志文件路径
+        :param max_bytes: 大小上限，单位为字节，0表示不按大小轮转
+        :param daily:     是否每天轮转
+        :param keep:      最多保留多少个已轮转的日志，0表示不限
+        :param keep_days: 已轮转的日志最多保留多少天，0表示不限
+        :param header:    返回新日志文件第一行的函数，如日期行，None表示不写入
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self.keep = keep
+        self.keep_days = keep_days
+        self.header = header
+        self.day = self._day(time.time())  # 当前日志文件开始的日期
+        root, ext = os.path.splitext(path)
+        self.pattern = f"{glob.escape(root)}.*{ext}"  # 已轮转的日志，压缩后再加.gz
+        self.queue: queue.Queue[str | None] = queue.Queue()
+        for temp in glob.glob(f"{self.pattern}.gz.tmp"): self._remove(temp)
+        for segment in sorted(glob.glob(self.pattern)):  # 上次运行时未压缩完的日志
+            self.queue.put(segment)
+        self.compressed = 0  # 已压缩的日志数量
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _day(timestamp: float) -> str:
+        return time.strftime("%Y%m%d", time.localtime(timestamp))
+
+    @staticmethod
+    def _remove(path: str):
+        try: os.remove(path)
+        except OSError: pass
+
+    def due(self, size: int, now: float | None = None) -> bool:
+        """
+        :param size: 当前日志文件的大小，单位为字节
+        :param now:  当前时间(Unix时间)，默认为调用时刻
+        :return:     是否需要轮转
+        """
+        if self.max_bytes and size >= self.max_bytes: return True
+        return self.daily and self._day(time.time() if now is None else now) != self.day
+
+    def resume(self, size: int, mtime: float, keep_from: int | None = None) -> bool:
+        """
+        接续已存在的日志文件，文件上次写入不在今天或已超过大小上限时立即轮转；需在写入线程打开日志文件之前调用
+        :param size:      本次运行写入前日志文件的大小
+        :param mtime:     本次运行写入前日志文件的修改时间
+        :param keep_from: 该偏移之后的内容（本次运行已写入的内容）保留在新日志文件中
+        :return:          是否已轮转
+        """
+        self.day = self._day(mtime)
+        if not size or not self.due(size): return False
+        return self.rotate(keep_from)
+
+    def rotate(self, keep_from: int | None = None) -> bool:
+        """
+        将当前日志文件改名并交给压缩线程，调用前需关闭日志文件
+        :param keep_from: 见resume，None表示全部轮转
+        :return:          是否已轮转
+        """
+        root, ext = os.path.splitext(self.path)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        segment, count = f"{root}.{stamp}{ext}", 1
+        while os.path.exists(segment) or os.path.exists(f"{segment}.gz"):  # 同一秒内多次轮转，编号保证按字典序排列
+            count += 1
+            segment = f"{root}.{stamp}_{count:03d}{ext}"
+        try: os.replace(self.path, segment)
+        except OSError: return False  # 文件被占用等，下次再轮转
+        if keep_from is not None:
+            with open(segment, "r+b") as f:
+                f.seek(keep_from)
+                tail = f.read()
+                f.truncate(keep_from)
+            with open(self.path, "wb") as f:
+                f.write(tail)
+        self.day = self._day(time.time())
+        self.queue.put(segment)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """
+        等待压缩线程处理完已轮转的日志，超时后未压缩完的日志在下次启动时继续压缩
+        """
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def prune(self):
+        """
+        按保留数量与天数删除旧的日志
+        """
+        segments = sorted(glob.glob(f"{self.pattern}.gz"))  # 文件名中的时间按字典序排列
+        expired = segments[:-self.keep] if self.keep and len(segments) > self.keep else []
+        if self.keep_days:
+            deadline = time.time() - self.keep_days * 86400
+            for segment in segments[len(expired):]:
+                try:
+                    if os.path.getmtime(segment) < deadline: expired.append(segment)
+                except OSError: pass
+        for segment in expired: self._remove(segment)
+
+    def _run(self):
+        self.prune()
+        while True:
+            segment = self.queue.get()
+            if segment is None: break
+            temp = f"{segment}.gz.tmp"
+            try:
+                with open(segment, "rb") as src, gzip.open(temp, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)  # 流式压缩，内存占用与日志大小无关
+                os.replace(temp, f"{segment}.gz")
+                os.remove(segment)
+                self.compressed += 1
+            except OSError:
+                self._remove(temp)
+                continue
+            self.prune()
+
+
+# 后台日志写入
+class RecordWriter:
+    def __init__(self, path: str, capacity: int = 10000, batch_size: int = 256, flush_interval: float = 0.5,
+                 rotation: LogRotation | None = None):
+        """
+        日志行先进入有界队列，由写入线程批量写入文件，调用方不会因文件IO阻塞
+        :param path:           日志文件路径
+        :param capacity:       队列容量，队列已满时丢弃新日志并计数
+        :param batch_size:     累计多少行后立即刷新到磁盘
+        :param flush_interval: 距上次刷新超过多少秒后刷新到磁盘
+        :param rotation:       日志轮转，None表示不轮转；由写入线程在写入前检查
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotation = rotation
+        self.queue: queue.Queue[str | None] = queue.Queue(capacity)
+        self.dropped = 0  # 因队列已满丢弃的行数
+        self.lock = Lock()  # 保护dropped，写入线程读取并清零时不丢失其他线程的计数
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, line: str):
+        """
+        写入一行日志，不阻塞
+        :param line: 日志内容，需自带换行符
+        """
+        try: self.queue.put_nowait(line)
+        except queue.Full:
+            with self.lock: self.dropped += 1
+
+    def close(self):
+        """
+        写入剩余日志并结束写入线程
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.rotation: self.rotation.close()
+
+    # 轮转日志文件，返回新文件及其大小；轮转失败时继续写入原文件
+    def _rotate(self, f, size: int):
+        f.close()
+        rotated = self.rotation.rotate()
+        f = open(self.path, "a", encoding="utf-8")
+        if not rotated: return f, size
+        header = self.rotation.header() if self.rotation.header else ""
+        f.write(header)
+        return f, len(header.encode("utf-8"))
+
+    def _run(self):
+        f = open(self.path, "a", encoding="utf-8")
+        try:
+            size = os.path.getsize(self.path)  # 当前文件大小，仅用于轮转
+            pending = 0  # 未刷新的行数
+            last_flush = time.monotonic()
+            running = True
+            while running:
+                try: lines = [self.queue.get(timeout=self.flush_interval)]
+                except queue.Empty: lines = []
+                while len(lines) < self.batch_size:  # 取出队列中已有的日志
+                    try: lines.append(self.queue.get_nowait())
+                    except queue.Empty: break
+                if None in lines:  # 收到结束信号
+                    lines = lines[:lines.index(None)]
+                    running = False
+                if self.dropped:
+                    with self.lock: dropped, self.dropped = self.dropped, 0
+                    lines.append(f"\t[{time.strftime('%H:%M:%S')}]: [Info]日志队列已满，丢弃了{dropped}条日志;\n")
+                if lines:
+                    text = "".join(lines)
+                    if self.rotation:
+                        if self.rotation.due(size):
+                            f, size = self._rotate(f, size)
+                            pending = 0
+                        size += len(text.encode("utf-8"))
+                    f.write(text)
+                    pending += len(lines)
+                now = time.monotonic()
+                if pending and (pending >= self.batch_size or now - last_flush >= self.flush_interval or not running):
+                    f.flush()
+                    pending, last_flush = 0, now
+        finally:
+            f.close()
@@ -0,0 +1,70 @@
+import os
+from threading import Event, Lock, Thread
+
+__all__ = ["StatWatcher", "RuleReloader"]
+
+
+# 基于修改时间与大小的文件监视
+class StatWatcher:
+    def __init__(self, path: str):
+        """
+        通过比较文件的修改时间与大小判断文件是否变化
+        :param path: 被监视的文件路径
+        """
+        self.path = path
+        self.state = self._stat()
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except OSError:  # 文件不存在或暂时无法访问
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self) -> bool:
+        """
+        :return: 自上次调用以来文件是否变化
+        """
+        state = self._stat()
+        if state == self.state: return False
+        self.state = state
+        return state is not None  # 文件被删除时保留原规则
+
+
+# 规则热重载
+class RuleReloader:
+    def __init__(self, watcher, build, interval: float = 1.0):
+        """
+        在后台线程中检测文件变化并构建新规则，检测线程通过take在两次循环之间取走新规则
+        :param watcher:  文件监视器，需提供changed()方法
+        :param build:    无参函数，返回构建好的规则，在后台线程中调用
+        :param interval: 检测文件变化的间隔，单位为秒
+        """
+        self.watcher = watcher
+        self.build = build
+        self.interval = interval
+        self.pending = None  # 待取走的新规则或构建时的异常
+        self.lock = Lock()
+        self.stopped = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def take(self):
+        """
+        取走新规则
+        :return: 新规则 | 构建时的异常 | None，None表示规则未变化
+        """
+        with self.lock:
+            pending, self.pending = self.pending, None
+        return pending
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.watcher.changed(): continue
+            try: result = self.build()
+            except Exception as error: result = error  # 保留原规则，由检测线程记录错误
+            with self.lock:
+                self.pending = result
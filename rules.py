@@ -0,0 +1,184 @@
+import hashlib
+import marshal
+import os
+
+from matcher import RuleMatcher
+
+__all__ = ["parse_item", "build_matcher", "RuleCache", "load_rule"]
+
+
+# 解析item文件内容
+def parse_item(text: str) -> tuple[dict, dict]:
+    """
+    :param text: item文件内容
+    :return: tuple[dict, dict] -> (配置信息, 规则信息)
+    """
+    config = {
+        "enable": 'true',
+        "password": '123456',
+        "record_all": 'true',
+        "interval": '0.1',
+        "interval_min": '0.02',
+        "interval_max": '0',
+        "cpu_budget": '1',
+        "sweep": '0',
+        "verdict_cache": '1024',
+        "level": '1',
+        "listen": 'hook',
+        "reload": '1',
+        "ui": 'true',
+        "control": '0',
+        "trace": 'false',
+        "kill_tree": 'false',
+        "record_format": 'text',
+        "log_max_size": '10',
+        "log_daily": 'true',
+        "log_keep": '0',
+        "log_keep_days": '0',
+        "usage_interval": '300',
+        "metrics": '0',
+        "metrics_dump": '0',
+        "profile": '0',
+        "collector": '',
+        "collector_token": '',
+        "agent": '',
+    }  # 默认配置信息
+    rule = {
+        "Protect": {0: [], 1: []},
+        "Ordinary": [],
+        "Force": [],
+        "Include": [],
+        "ExInclude": [],
+        "Process": {"Ordinary": [], "Force": [], "Include": [], "ExInclude": []},  # 除Protect外各规则中的进程名称规则(0)
+        "Pattern": {"Ordinary": [], "Force": [], "Include": [], "ExInclude": []},  # 除Protect外各规则中的正则(re)与通配符(glob)规则
+    }  # 规则信息
+    text = [line.strip() for line in text.splitlines() if line.strip()]  # 去除所有\n与空字符串
+    read_type = "config"  # 循环时读取类型，data或rule或protect或other
+    rule_value = ""  # 记录当前rule类型键
+    for line in text:
+        if not line: continue  # 空行，跳过
+        if line.startswith("#"): continue  # 注释行，跳过
+        if read_type == "config":  # 读取配置信息
+            if line == ";;": read_type = "rule"  # 配置信息分隔符
+            if line.startswith(":"):  # ':'开头的是配置信息
+                try: key, value = line.strip(":").split("(")  # 去除':'和'('
+                except ValueError: continue  # 格式错误，跳过
+                if key not in config: continue  # 未知配置信息，跳过
+                config[key] = value.strip(")")  # 去除')'并赋值
+        elif read_type == "rule":  # 读取规则信息
+            if line == ";;;;": break  # 文本末尾，结束读取
+            if line.startswith("["):  # [开头的行是规则信息
+                if line == "[Protect]{":  # 进入Protect规则读取
+                    read_type = "protect"  # 进入保护规则读取
+                else:  # 非Protect规则
+                    try: rule_value = line.strip("[]{").strip()  # 提取[]内的规则类型
+                    except ValueError: continue  # 格式错误，跳过
+                    read_type = "other"  # 进入除Protect外的规则读取
+        elif read_type == "protect":  # 读取保护内容
+            if line == "}":  # 到达规则内容结束符
+                read_type = "rule"  # 回到规则信息读取
+                continue
+            if len(line) <= 3: continue  # 仅有'(0)'、'(1)'或太短
+            if line.startswith("(0)"):  # (0)开头的行表示根据进程名检测
+                rule["Protect"][0].append(line[3:])  # 加入规则内容
+            elif line.startswith("(1)"):  # (1)开头的行表示根据窗口标题检测
+                rule["Protect"][1].append(line[3:])  # 加入规则内容
+        else:  # 读取除Protect外的规则内容
+            if line == "}":  # 到达规则内容结束符
+                read_type = "rule"  # 回到规则信息读取
+                continue
+            if line.startswith("(0)"):  # (0)开头的行表示根据进程名检测
+                if len(line) > 3 and rule_value in rule["Process"]: rule["Process"][rule_value].append(line[3:])
+                continue
+            if line.startswith(("(re)", "(glob)")):  # 正则与通配符规则，保留前缀，由RuleMatcher编译
+                if rule_value in rule["Pattern"]: rule["Pattern"][rule_value].append(line)
+                continue
+            rule[rule_value].append(line)  # 加入规则内容
+    return config, rule
+
+
+# 编译规则匹配器
+def build_matcher(config: dict, rule: dict) -> RuleMatcher:
+    """
+    按检测等级加入额外规则后编译，不修改传入的规则信息
+    :param config: 配置信息
+    :param rule:   规则信息
+    :return:       规则匹配器
+    """
+    level = 2  # 检测等级
+    try:
+        level = int(config["level"])
+        if not (1 <= level <= 3): level = 2  # 等级不能超过3或小于1
+    except ValueError: pass  # 无效的等级
+    rule = {key: value if isinstance(value, dict) else list(value) for key, value in rule.items()}
+    # 高等级额外的功能
+    if level >= 2:  # 加入任务管理器、cmd（有GUI界面）
+        rule["Ordinary"].append("任务管理器")
+        rule["Include"].append("cmd.exe")
+    if level >= 3:  # 待拓展
+        pass
+    return RuleMatcher(rule)
+
+
+# 规则缓存文件
+class RuleCache:
+    VERSION = 17  # 缓存格式版本，parse_item的默认配置或RuleMatcher.dump()的结构变化时需递增
+
+    def __init__(self, path: str):
+        """
+        将解析、编译后的规则以marshal格式保存，以item文件内容的哈希为键，内容未变化时跳过解析与编译
+        :param path: 缓存文件路径
+        """
+        self.path = path
+
+    @staticmethod
+    def digest(data: bytes) -> bytes:
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def load(self, data: bytes) -> tuple[dict, dict, RuleMatcher] | None:
+        """
+        :param data: item文件内容
+        :return:     (配置信息, 规则信息, 规则匹配器) | None，None表示缓存不存在、已损坏或已过期
+        """
+        try:
+            with open(self.path, "rb") as f:
+                version, digest, config, rule, state = marshal.loads(f.read())  # 一次读入，marshal.load逐段读取文件较慢
+            if version != self.VERSION or digest != self.digest(data): return None
+            return config, rule, RuleMatcher.load(state)
+        except (OSError, EOFError, ValueError, TypeError):  # 缓存不存在或已损坏
+            return None
+
+    def save(self, data: bytes, config: dict, rule: dict, matcher: RuleMatcher) -> bool:
+        """
+        先写入临时文件再替换，避免其他进程读取到写了一半的缓存
+        :return: 是否保存成功
+        """
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp, "wb") as f:
+                f.write(marshal.dumps((self.VERSION, self.digest(data), config, rule, matcher.dump())))
+            os.replace(temp, self.path)
+            return True
+        except OSError:  # 目录只读等，不影响运行
+            try: os.remove(temp)
+            except OSError: pass
+            return False
+
+
+# 读取规则
+def load_rule(path: str, cache_path: str | None = None) -> tuple[dict, dict, RuleMatcher]:
+    """
+    :param path:       item文件路径
+    :param cache_path: 缓存文件路径，为None时不使用缓存
+    :return:           (配置信息, 规则信息, 规则匹配器)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    cache = RuleCache(cache_path) if cache_path else None
+    if cache:
+        cached = cache.load(data)
+        if cached is not None: return cached
+    config, rule = parse_item(data.decode("utf-8"))
+    matcher = build_matcher(config, rule)
+    if cache: cache.save(data, config, rule, matcher)
+    return config, rule, matcher
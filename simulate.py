@@ -0,0 +1,379 @@
+import random
+import time
+from functools import partial
+from threading import Event, RLock, Thread
+
+from proctree import ProcessTable
+
+__all__ = ["Desktop", "Churn", "SimulatedApi"]
+
+
+# 模拟窗口
+class Window:
+    __slots__ = ("hwnd", "pid", "title", "stubborn", "hang", "visible")
+
+    def __init__(self, hwnd: int, pid: int, title: str, stubborn: bool = False, hang: float = 0, visible: bool = True):
+        """
+        :param stubborn: 是否忽略WM_CLOSE
+        :param hang:     处理WM_CLOSE前阻塞的秒数，模拟无响应的程序
+        :param visible:  是否可见，隐藏的窗口模拟辅助窗口、托盘与输入法窗口
+        """
+        self.hwnd = hwnd
+        self.pid = pid
+        self.title = title
+        self.stubborn = stubborn
+        self.hang = hang
+        self.visible = visible
+
+
+# 模拟进程
+class Process:
+    __slots__ = ("pid", "ppid", "exe", "threads", "windows", "created")
+
+    def __init__(self, pid: int, ppid: int, exe: str, threads: int = 1):
+        self.pid = pid
+        self.ppid = ppid
+        self.exe = exe
+        self.threads = threads
+        self.created = time.time()  # 创建时间(Unix时间)
+        self.windows: set[int] = set()  # 进程拥有的窗口
+
+
+# 内存中的模拟桌面
+class Desktop:
+    FOREGROUND = 0x0003  # 与api.WinEventHook相同的事件类型
+    NAMECHANGE = 0x800C
+
+    def __init__(self):
+        """
+        保存进程、窗口与前台窗口，窗口按Z序排列，最后一个为最上层
+        所有操作线程安全，前台窗口切换与前台窗口标题变化时通知已注册的钩子
+        """
+        self.lock = RLock()
+        self.processes: dict[int, Process] = {}
+        self.windows: dict[int, Window] = {}  # 按Z序排列
+        self.foreground = 0  # 前台窗口句柄
+        self.hooks: list = []  # 钩子回调，参数为(事件类型, hwnd)
+        self.next_pid = 1000
+        self.next_hwnd = 0x10000
+        # 统计
+        self.events = 0  # 产生的钩子事件数
+        self.closed = 0  # 通过WM_CLOSE关闭的窗口数
+        self.killed = 0  # 被强制结束的进程数
+
+    # 创建进程
+    def spawn(self, exe: str, ppid: int = 0, threads: int = 1) -> int:
+        with self.lock:
+            pid = self.next_pid
+            self.next_pid += 4
+            self.processes[pid] = Process(pid, ppid, exe, threads)
+            return pid
+
+    # 创建窗口并置于前台
+    def open_window(self, pid: int, title: str, stubborn: bool = False, hang: float = 0, focus: bool = True,
+                    visible: bool = True) -> int:
+        with self.lock:
+            hwnd = self.next_hwnd
+            self.next_hwnd += 2
+            self.windows[hwnd] = Window(hwnd, pid, title, stubborn, hang, visible)
+            self.processes[pid].windows.add(hwnd)
+            if focus and visible: self.focus(hwnd)
+            return hwnd
+
+    # 将窗口置于前台
+    def focus(self, hwnd: int):
+        with self.lock:
+            window = self.windows.pop(hwnd, None)
+            if window is None: return
+            self.windows[hwnd] = window  # 移到Z序最上层
+            if self.foreground != hwnd:
+                self.foreground = hwnd
+                self._notify(self.FOREGROUND, hwnd)
+
+    # 修改窗口标题
+    def retitle(self, hwnd: int, title: str):
+        with self.lock:
+            window = self.windows.get(hwnd)
+            if window is None or window.title == title: return
+            window.title = title
+            if hwnd == self.foreground:
+                self._notify(self.NAMECHANGE, hwnd)
+
+    # 关闭窗口，前台窗口关闭后由Z序中的下一个窗口成为前台窗口
+    def close_window(self, hwnd: int):
+        with self.lock:
+            window = self.windows.pop(hwnd, None)
+            if window is None: return
+            process = self.processes.get(window.pid)
+            if process: process.windows.discard(hwnd)
+            if hwnd == self.foreground:
+                self.foreground = 0
+                if self.windows: self.focus(next(reversed(self.windows)))
+
+    # 结束进程及其所有窗口
+    def kill(self, pid: int) -> bool:
+        with self.lock:
+            process = self.processes.pop(pid, None)
+            if process is None: return False
+            for hwnd in list(process.windows):
+                self.close_window(hwnd)
+            self.killed += 1
+            return True
+
+    # 批量创建进程与窗口
+    def populate(self, processes: int, windows_per_process: int = 1, stubborn_ratio: float = 0, seed: int = 0):
+        rand = random.Random(seed)
+        for index in range(processes):
+            pid = self.spawn(f"app{index}.exe")
+            for number in range(windows_per_process):
+                self.open_window(pid, f"app{index} - {number}", stubborn=rand.random() < stubborn_ratio)
+
+    def _notify(self, event: int, hwnd: int):
+        self.events += 1
+        for hook in self.hooks:
+            hook(event, hwnd)
+
+
+# 按指定速率随机改变桌面
+class Churn:
+    def __init__(self, desktop: Desktop, rate: float, titles: list[str], windows: int = 100,
+                 stubborn_ratio: float = 0, hang_ratio: float = 0, hang: float = 2.0, seed: int = 0):
+        """
+        在后台线程中以rate次/秒的速率随机新建、切换、修改标题或关闭窗口，窗口数量维持在windows附近
+        :param desktop:        模拟桌面
+        :param rate:           每秒操作次数
+        :param titles:         新建窗口或修改标题时使用的标题
+        :param windows:        目标窗口数量
+        :param stubborn_ratio: 新建窗口忽略WM_CLOSE的比例
+        :param hang_ratio:     新建窗口无响应的比例
+        :param hang:           无响应的窗口处理WM_CLOSE前阻塞的秒数
+        :param seed:           随机种子
+        """
+        self.desktop = desktop
+        self.rate = rate
+        self.titles = titles
+        self.target = windows
+        self.stubborn_ratio = stubborn_ratio
+        self.hang_ratio = hang_ratio
+        self.hang = hang
+        self.rand = random.Random(seed)
+        self.actions = 0  # 已执行的操作数
+        self.stopped = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+
+    def start(self, duration: float | None = None):
+        """
+        :param duration: 运行秒数，None表示直到调用stop
+        """
+        self.duration = duration
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def step(self):
+        desktop, rand = self.desktop, self.rand
+        with desktop.lock:
+            count = len(desktop.windows)
+            roll = rand.random()
+            if count < self.target * 0.5 or (roll < 0.3 and count < self.target * 1.5):  # 新建窗口
+                foreground = desktop.windows.get(desktop.foreground)
+                if foreground is None or rand.random() < 0.5:  # 新进程
+                    pid = desktop.spawn(f"app{rand.randrange(1000)}.exe")
+                else:  # 前台程序打开新窗口
+                    pid = foreground.pid
+                desktop.open_window(pid, rand.choice(self.titles), stubborn=rand.random() < self.stubborn_ratio,
+                                    hang=self.hang if rand.random() < self.hang_ratio else 0)
+            elif roll < 0.6:  # 切换窗口，从最上层的若干窗口中选择，模拟alt+tab
+                recent = [hwnd for hwnd, _ in zip(reversed(desktop.windows), range(8))]
+                desktop.focus(rand.choice(recent))
+            elif roll < 0.8:  # 修改前台窗口标题
+                desktop.retitle(desktop.foreground, rand.choice(self.titles))
+            else:  # 关闭最上层的窗口之一，进程的最后一个窗口关闭后进程退出
+                recent = [hwnd for hwnd, _ in zip(reversed(desktop.windows), range(8))]
+                window = desktop.windows[rand.choice(recent)]
+                desktop.close_window(window.hwnd)
+                process = desktop.processes.get(window.pid)
+                if process is not None and not process.windows:
+                    del desktop.processes[window.pid]
+        self.actions += 1
+
+    def _run(self):
+        start = time.perf_counter()
+        while not self.stopped.is_set():
+            elapsed = time.perf_counter() - start
+            if self.duration is not None and elapsed >= self.duration: break
+            due = int(elapsed * self.rate) - self.actions  # 按速率应执行的操作数
+            for _ in range(due):
+                self.step()
+            time.sleep(0.001)
+
+
+# 获取前台窗口句柄
+class SimGetFgWindow:
+    def __init__(self, desktop: Desktop):
+        self.desktop = desktop
+
+    def __call__(self) -> int | None:
+        return self.desktop.foreground or None
+
+
+# 获取窗口名称
+class SimGetWindowText:
+    def __init__(self, desktop: Desktop):
+        self.desktop = desktop
+
+    def __call__(self, hwnd: int | None = None) -> str:
+        with self.desktop.lock:
+            window = self.desktop.windows.get(hwnd or self.desktop.foreground)
+            return window.title if window else ""
+
+
+# 获取进程信息
+class SimGetProcessInfo:
+    def __init__(self, desktop: Desktop):
+        self.desktop = desktop
+
+    def __call__(self, sort: bool = False) -> dict:
+        return self.snapshot().names(sort)
+
+    def snapshot(self) -> ProcessTable:
+        table = ProcessTable()
+        with self.desktop.lock:
+            for pid, process in self.desktop.processes.items():
+                table.add(pid, process.ppid, process.exe, process.threads)
+        return table
+
+
+# 获取进程创建时间
+class SimGetProcessTime:
+    def __init__(self, desktop: Desktop):
+        self.desktop = desktop
+
+    def __call__(self, pid: int) -> float | None:
+        process = self.desktop.processes.get(pid)
+        return process.created if process else None
+
+
+# 获取所有顶层窗口句柄及相关信息
+class SimGetWindowHandle:
+    def __init__(self, desktop: Desktop, visible: bool = False):
+        self.desktop = desktop
+        self.visible = visible
+        self.ProcessData: dict[int, tuple[int, str]] = {}  # {hwnd: (pid, title), ...}
+        self.opened: dict[int, tuple[int, str]] = {}
+        self.closed: dict[int, tuple[int, str]] = {}
+        self.retitled: dict[int, tuple[int, str]] = {}
+
+    def __call__(self, sort: bool = False) -> dict:
+        self._enumerate()
+        return dict(sorted(self.ProcessData.items())) if sort else self.ProcessData
+
+    def diff(self) -> tuple[dict, dict, dict]:
+        self._enumerate()
+        return self.opened, self.closed, self.retitled
+
+    def stream(self):
+        with self.desktop.lock:  # 先复制，避免生成器长时间持有锁
+            windows = [(w.hwnd, w.pid, w.title) for w in reversed(self.desktop.windows.values())
+                       if w.title and (w.visible or not self.visible)]
+        yield from windows
+
+    def _enumerate(self):
+        with self.desktop.lock:
+            current = {w.hwnd: (w.pid, w.title) for w in self.desktop.windows.values()
+                       if w.title and (w.visible or not self.visible)}
+        old = self.ProcessData
+        self.opened, self.closed, self.retitled = {}, {}, {}
+        for hwnd, data in current.items():
+            previous = old.get(hwnd)
+            if previous is None or previous[0] != data[0]:  # 新窗口，或hwnd已被其他进程复用
+                if previous is not None: self.closed[hwnd] = previous
+                self.opened[hwnd] = data
+            elif previous[1] != data[1]:  # 标题变化
+                self.retitled[hwnd] = data
+        self.closed.update((hwnd, data) for hwnd, data in old.items() if hwnd not in current)
+        self.ProcessData = current
+
+
+# 获取单个窗口的信息
+class SimGetWindowInfo:
+    def __init__(self, desktop: Desktop):
+        self.desktop = desktop
+
+    def __call__(self, hwnd: int) -> tuple[int, str, str] | None:
+        with self.desktop.lock:
+            window = self.desktop.windows.get(hwnd)
+            if window is None: return None
+            process = self.desktop.processes.get(window.pid)
+            return window.pid, window.title, process.exe if process else ""
+
+
+# 关闭窗口
+class SimSendClose:
+    def __init__(self, desktop: Desktop, timeout: float = 1.0):
+        self.desktop = desktop
+        self.timeout = timeout
+
+    def __call__(self, hwnd: int) -> bool:
+        window = self.desktop.windows.get(hwnd)
+        if window is None: return False
+        if window.hang:  # 模拟SendMessageTimeoutW等待无响应的程序
+            time.sleep(min(window.hang, self.timeout))
+            if window.hang > self.timeout: return False
+        if window.stubborn: return True  # 已处理但忽略WM_CLOSE
+        self.desktop.close_window(hwnd)
+        self.desktop.closed += 1
+        return True
+
+
+# 强制关闭应用
+class SimForceClose:
+    def __init__(self, desktop: Desktop):
+        self.desktop = desktop
+
+    def __call__(self, pid: int) -> bool:
+        return self.desktop.kill(pid)
+
+
+# 监听前台窗口切换与窗口标题变化
+class SimWinEventHook:
+    FOREGROUND = Desktop.FOREGROUND
+    NAMECHANGE = Desktop.NAMECHANGE
+
+    def __init__(self, desktop: Desktop, callback):
+        """
+        回调在修改桌面的线程中同步调用
+        """
+        self.desktop = desktop
+        self.callback = callback
+
+    def start(self) -> bool:
+        with self.desktop.lock:
+            self.desktop.hooks.append(self.callback)
+        return True
+
+    def stop(self):
+        with self.desktop.lock:
+            if self.callback in self.desktop.hooks: self.desktop.hooks.remove(self.callback)
+
+
+# 模拟桌面上的api，与api.py中的类同名同接口
+class SimulatedApi:
+    name = "sim"
+
+    def __init__(self, desktop: Desktop | None = None):
+        """
+        :param desktop: 模拟桌面，默认为空桌面
+        """
+        self.desktop = desktop or Desktop()
+        self.GetFgWindow = partial(SimGetFgWindow, self.desktop)
+        self.GetWindowText = partial(SimGetWindowText, self.desktop)
+        self.GetProcessInfo = partial(SimGetProcessInfo, self.desktop)
+        self.GetProcessTime = partial(SimGetProcessTime, self.desktop)
+        self.GetWindowHandle = partial(SimGetWindowHandle, self.desktop)
+        self.GetWindowInfo = partial(SimGetWindowInfo, self.desktop)
+        self.SendClose = partial(SimSendClose, self.desktop)
+        self.ForceClose = partial(SimForceClose, self.desktop)
+        self.WinEventHook = partial(SimWinEventHook, self.desktop)
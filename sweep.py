@@ -0,0 +1,56 @@
+import queue
+import time
+from threading import Event, Thread
+
+from pipeline import StageTimer
+
+__all__ = ["Sweeper"]
+
+
+# 后台窗口扫描
+class Sweeper:
+    def __init__(self, api, period: float, capacity: int = 64):
+        """
+        每隔period秒枚举所有顶层窗口，只把与上一次枚举相比新增或标题变化的窗口交给判定阶段，
+        最小化、被遮挡或未获得焦点的窗口也会被检测，隐藏的窗口（辅助窗口、托盘与输入法窗口等）不检测；
+        首次枚举时所有窗口均视为新增
+        :param api:      平台后端，需提供GetWindowHandle
+        :param period:   扫描间隔，单位为秒
+        :param capacity: 队列容量，队列已满时扫描线程等待判定阶段，不丢弃窗口
+        """
+        self.period = period
+        self.get_window_handle = api.GetWindowHandle(visible=True)  # 仅在扫描线程中使用
+        self.queue: queue.Queue[list[tuple[int, int, str]]] = queue.Queue(capacity)
+        self.timer = StageTimer()  # 每次枚举与比较的耗时
+        self.changed = 0  # 交给判定阶段的窗口总数
+        self.stopped = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def take(self) -> list[tuple[int, int, str]]:
+        """
+        取走已扫描到的窗口，不阻塞
+        :return: [(hwnd, pid, 窗口标题), ...]
+        """
+        result = []
+        while True:
+            try: result += self.queue.get_nowait()
+            except queue.Empty: return result
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            start = time.perf_counter()
+            opened, _, retitled = self.get_window_handle.diff()
+            changed = [(hwnd, pid, title) for windows in (opened, retitled) for hwnd, (pid, title) in windows.items()]
+            self.timer.add(time.perf_counter() - start)
+            while changed and not self.stopped.is_set():
+                try:
+                    self.queue.put(changed, timeout=self.period)
+                    self.changed += len(changed)
+                    break
+                except queue.Full: pass
+            self.stopped.wait(self.period)
@@ -0,0 +1,212 @@
+import struct
+import sys
+import time
+
+from decision import Decider
+from matcher import RuleMatcher
+
+__all__ = ["TraceWriter", "read_trace", "replay"]
+
+# 轨迹文件格式：由若干段组成，每次打开文件追加一段
+#   段头:     MAGIC + 起始时间(<d，Unix时间)
+#   字符串:   0x01 + 长度(varint) + UTF-8内容，编号按出现顺序从0开始
+#   窗口:     0x02 + hwnd(varint) + pid(varint) + 进程名称编号(varint) + 标题编号(varint)，编号按出现顺序从0开始
+#   采样:     0x03 + 距上一次采样的微秒数(varint) + 窗口编号(varint)
+# 字符串与窗口编号仅在本段内有效，重复出现的窗口每次采样只需3~6字节
+MAGIC = b"WSTR\x01"
+STRING, WINDOW, SAMPLE = 1, 2, 3
+
+
+# 写入无符号变长整数
+def _varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+# 前台窗口轨迹记录
+class TraceWriter:
+    def __init__(self, path: str, flush_interval: float = 1.0, max_windows: int = 65536):
+        """
+        以追加方式记录每次采样的 “(时间, hwnd, pid, 进程名称, 窗口标题)”，标题与窗口去重后只写入一次
+        :param path:           轨迹文件路径
+        :param flush_interval: 距上次写入超过多少秒后写入文件
+        :param max_windows:    每段最多记录的不同窗口数量，超过后开始新的一段，限制去重表的内存占用
+        """
+        self.file = open(path, "ab")
+        self.flush_interval = flush_interval
+        self.max_windows = max_windows
+        self.buffer = bytearray()
+        self.strings: dict[str, int] = {}  # {字符串: 编号, ...}
+        self.windows: dict[tuple[int, int, int, int], int] = {}  # {(hwnd, pid, 进程名称编号, 标题编号): 编号, ...}
+        self.last = 0.0  # 上一次采样的时间
+        self.last_flush = time.monotonic()
+        self.count = 0  # 已记录的采样数量
+        self._begin(time.time())
+
+    # 开始新的一段
+    def _begin(self, now: float):
+        self.strings.clear()
+        self.windows.clear()
+        self.buffer += MAGIC + struct.pack("<d", now)
+        self.last = now
+
+    # 字符串编号，首次出现时写入
+    def _string(self, text: str) -> int:
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+            data = text.encode("utf-8", "replace")
+            self.buffer.append(STRING)
+            _varint(self.buffer, len(data))
+            self.buffer += data
+        return index
+
+    def write(self, hwnd: int, pid: int, exe: str, title: str, timestamp: float | None = None):
+        """
+        记录一次采样
+        :param hwnd:      窗口句柄
+        :param pid:       窗口所属进程pid，未知时为0
+        :param exe:       进程名称，未知时为空字符串
+        :param title:     窗口标题
+        :param timestamp: 采样时间(Unix时间)，默认为当前时间
+        """
+        now = time.time() if timestamp is None else timestamp
+        if len(self.windows) >= self.max_windows: self._begin(now)
+        key = (hwnd, pid, self._string(exe), self._string(title))
+        index = self.windows.get(key)
+        if index is None:
+            index = self.windows[key] = len(self.windows)
+            self.buffer.append(WINDOW)
+            for value in key: _varint(self.buffer, value)
+        self.buffer.append(SAMPLE)
+        _varint(self.buffer, max(round((now - self.last) * 1000000), 0))  # 系统时间回拨时记为0
+        _varint(self.buffer, index)
+        self.last = max(now, self.last)
+        self.count += 1
+        if len(self.buffer) >= 65536 or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.buffer.clear()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+# 读取轨迹
+def read_trace(path: str):
+    """
+    文件末尾不完整的记录（如程序异常退出时）会被忽略
+    :param path: 轨迹文件路径
+    :return:     生成器，依次产生 (时间, hwnd, pid, 进程名称, 窗口标题)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    size, pos = len(data), 0
+    strings: list[str] = []
+    windows: list[tuple[int, int, str, str]] = []
+    now = 0.0
+    magic_size = len(MAGIC)
+    try:
+        while pos < size:
+            tag = data[pos]
+            if tag == SAMPLE:
+                # 内联解码两个varint，回放速度主要取决于此处
+                pos += 1
+                delta = shift = 0
+                while True:
+                    byte = data[pos]
+                    pos += 1
+                    delta |= (byte & 0x7F) << shift
+                    if byte < 0x80: break
+                    shift += 7
+                index = shift = 0
+                while True:
+                    byte = data[pos]
+                    pos += 1
+                    index |= (byte & 0x7F) << shift
+                    if byte < 0x80: break
+                    shift += 7
+                now += delta / 1000000
+                yield now, *windows[index]
+                continue
+            if data.startswith(MAGIC, pos):  # 新的一段
+                now = struct.unpack_from("<d", data, pos + magic_size)[0]
+                pos += magic_size + 8
+                strings, windows = [], []
+                continue
+            values = []
+            pos += 1
+            for _ in range(1 if tag == STRING else 4):
+                value = shift = 0
+                while True:
+                    byte = data[pos]
+                    pos += 1
+                    value |= (byte & 0x7F) << shift
+                    if byte < 0x80: break
+                    shift += 7
+                values.append(value)
+            if tag == STRING:
+                if pos + values[0] > size: return  # 不完整的记录
+                strings.append(data[pos:pos + values[0]].decode("utf-8", "replace"))
+                pos += values[0]
+            elif tag == WINDOW:
+                hwnd, pid, exe, title = values
+                windows.append((hwnd, pid, strings[exe], strings[title]))
+            else:
+                raise ValueError(f"轨迹文件({path})格式错误，位置{pos - 1}")
+    except IndexError:  # 不完整的记录
+        return
+
+
+# 离线回放轨迹
+def replay(samples, matcher: RuleMatcher):
+    """
+    按检测线程的判定逻辑重放采样，不调用任何系统接口，也不按原时间间隔等待；
+    强制关闭目标到期后是否需要结束进程取决于窗口当时是否存在，轨迹中没有该信息，因此不重放
+    :param samples: 采样序列，见read_trace
+    :param matcher: 规则匹配器
+    :return:        生成器，依次产生 (时间, hwnd, pid, 进程名称, 窗口标题, 动作, 命中的规则)，动作见Decider
+    """
+    decider = Decider(matcher)
+    for timestamp, hwnd, pid, exe, title in samples:
+        decision = decider(hwnd, title, exe)
+        if decision is None: continue
+        yield timestamp, hwnd, pid, exe, title, *decision
+
+
+if __name__ == '__main__':
+    # 用法: python tracing.py dump 轨迹文件
+    #       python tracing.py replay 轨迹文件 [item文件]
+    if len(sys.argv) < 3 or sys.argv[1] not in ("dump", "replay"):
+        print("用法: python tracing.py dump 轨迹文件\n      python tracing.py replay 轨迹文件 [item文件]")
+        sys.exit(1)
+    if sys.argv[1] == "dump":
+        for _time, _hwnd, _pid, _exe, _title in read_trace(sys.argv[2]):
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_time))}\t{_hwnd}\t{_pid}\t{_exe}\t{_title}")
+        sys.exit(0)
+    from rules import load_rule
+    _config, _rule, _matcher = load_rule(sys.argv[3] if len(sys.argv) > 3 else "item")
+    _counts: dict[str, int] = {}
+    _samples = 0
+
+    def _count(samples):  # 统计采样数量
+        global _samples
+        for sample in samples:
+            _samples += 1
+            yield sample
+
+    _start = time.perf_counter()
+    for _time, _hwnd, _pid, _exe, _title, _action, _hit in replay(_count(read_trace(sys.argv[2])), _matcher):
+        _counts[_action] = _counts.get(_action, 0) + 1
+        if _action == "Pass": continue
+        _hit = f"({_hit})" if _hit else ""
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_time))}\t[{_action}]{_title}{_hit}\t{_exe}")
+    _elapsed = time.perf_counter() - _start
+    print(f"共{_samples}次采样，回放耗时{_elapsed:.2f}s；" + "，".join(f"{k}: {v}" for k, v in sorted(_counts.items())))
@@ -0,0 +1,279 @@
+import json
+import os
+import queue
+import re
+import sys
+import time
+from threading import Thread
+
+__all__ = ["normalize_title", "UsageAggregator", "load_snapshot"]
+
+_UNREAD = re.compile(r"^[(\[]\d+[)\]]\s*")  # 标题开头的未读数，如 “(3) ”
+_DIGITS = re.compile(r"\d+")
+
+
+# 归一化窗口标题
+def normalize_title(title: str, limit: int = 128) -> str:
+    """
+    去除开头的未读数，数字替换为#，合并空白并截断，使仅计数、时间不同的标题归为同一项
+    :param title: 窗口标题
+    :param limit: 最大长度
+    :return:      归一化后的标题
+    """
+    return " ".join(_DIGITS.sub("#", _UNREAD.sub("", title)).split())[:limit]
+
+
+# 读取使用时长快照
+def load_snapshot(path: str) -> dict | None:
+    """
+    按顺序重放快照文件中的每一行，后出现的结果覆盖先出现的；文件末尾不完整的行会被忽略
+    :param path: 快照文件路径
+    :return:     {"day": 年月日, "updated": 快照时间, "other": [次数, 总时长],
+                  "windows": [[进程名称, 标题, 次数, 总时长, 最后出现时间], ...]}，按总时长从长到短排列；
+                 文件不存在或没有有效内容时为None
+    """
+    try:
+        with open(path, "rb") as f:
+            lines = f.read().splitlines()
+    except OSError: return None
+    keys: list[tuple[str, str]] = []  # 按编号排列的窗口
+    rows: dict[int, list] = {}  # {编号: [次数, 总时长, 最后出现时间], ...}
+    result = None
+    for line in lines:
+        try:
+            record = json.loads(line)
+            if record.get("full"): keys, rows = [], {}
+            keys += [(exe, title) for exe, title in record["new"]]
+            for index, count, seconds, last in record["rows"]: rows[index] = [count, seconds, last]
+            for index in record.get("drop", ()): rows.pop(index, None)
+            result = {"day": record["day"], "updated": record["t"], "other": record["other"]}
+        except (ValueError, KeyError, TypeError, IndexError): continue  # 不完整的行
+    if result is None: return None
+    result["windows"] = sorted(([*keys[index], *row] for index, row in rows.items() if index < len(keys)),
+                               key=lambda row: row[3], reverse=True)
+    return result
+
+
+# 窗口使用时长统计
+class UsageAggregator:
+    def __init__(self, prefix: str, interval: float = 300.0, max_keys: int = 1024):
+        """
+        按 “(进程名称, 归一化标题)” 统计每天的前台次数、前台总时长与最后一次出现的时间，
+        每隔interval秒向 “prefix-年月日.jsonl” 追加一行，只包含期间有变化的窗口，窗口在文件中首次出现时分配编号，之后只写编号；
+        追加的内容超过完整快照的数倍后改为覆盖写入一次完整快照，文件大小有上限；启动时接续当天已有的快照；
+        不同的标题超过max_keys项时合并总时长最短的一部分到other，内存占用与运行时长无关
+        :param prefix:   快照文件路径前缀，如 “usage”
+        :param interval: 快照间隔，单位为秒
+        :param max_keys: 最多统计的窗口数量
+        """
+        self.prefix = prefix
+        self.interval = interval
+        self.max_keys = max_keys
+        self.strings: dict[str, str] = {}  # 字符串驻留表，相同的进程名称与标题只保存一份
+        self.stats: dict[tuple[str, str], list] = {}  # {(进程名称, 标题): [次数, 总时长, 最后出现时间], ...}
+        self.other = [0, 0.0]  # 被合并的窗口的 [次数, 总时长]
+        self.current: tuple[str, str] | None = None  # 当前前台窗口，None表示没有有效窗口
+        self.since = time.time()  # 当前前台窗口开始的时间
+        self.day = self._day(self.since)
+        self.last_snapshot = time.monotonic()
+        self.evicted = 0  # 被合并的窗口数量
+        self.ids: dict[tuple[str, str], int] = {}  # 当前快照文件中已分配编号的窗口
+        self.next_id = 0  # 下一个窗口编号，编号不复用
+        self.changed: set[tuple[str, str]] = set()  # 上次快照后有变化的窗口
+        self.dropped: list[int] = []  # 上次快照后被合并的窗口编号
+        self.file_bytes = 0  # 当前快照文件的大小
+        self.full_bytes = 0  # 最近一次完整快照的大小
+        self.full_next = True  # 下一次快照是否覆盖写入完整快照
+        self.written = 0  # 已写入的快照字节数
+        self._load(self.since)
+        self.queue: queue.Queue[tuple[str, bytes, bool] | None] = queue.Queue(16)
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __len__(self) -> int:
+        return len(self.stats)
+
+    @staticmethod
+    def _day(timestamp: float) -> str:
+        return time.strftime("%Y%m%d", time.localtime(timestamp))
+
+    def path(self, day: str) -> str:
+        return f"{self.prefix}-{day}.jsonl"
+
+    # 接续当天已有的快照，之后的第一次快照覆盖写入完整快照
+    def _load(self, now: float):
+        snapshot = load_snapshot(self.path(self.day))
+        if not snapshot: return
+        try:
+            self.other = [int(snapshot["other"][0]), float(snapshot["other"][1])]
+            for exe, title, count, seconds, last in snapshot["windows"][:self.max_keys]:
+                self.stats[(self._intern(exe), self._intern(title))] = [count, seconds, min(last, now)]
+        except (KeyError, TypeError, ValueError):  # 快照格式错误，重新统计
+            self.stats.clear()
+            self.other = [0, 0.0]
+
+    def _intern(self, text: str) -> str:
+        return self.strings.setdefault(text, text)
+
+    # 结束当前前台窗口，累计其时长
+    def _close(self, now: float):
+        if self.current is None: return
+        entry = self.stats.get(self.current)
+        if entry is not None:
+            entry[1] += max(now - self.since, 0)
+            entry[2] = now
+            self.changed.add(self.current)
+
+    # 合并总时长最短的窗口，为新窗口腾出空间；一次合并约八分之一，避免每次新增都排序
+    def _evict(self):
+        victims = sorted(self.stats, key=lambda key: self.stats[key][1])[:max(self.max_keys // 8, 1)]
+        for key in victims:
+            if key == self.current: continue
+            count, seconds, _ = self.stats.pop(key)
+            self.other[0] += count
+            self.other[1] += seconds
+            self.evicted += 1
+            self.changed.discard(key)
+            index = self.ids.pop(key, None)
+            if index is not None: self.dropped.append(index)
+        self.strings = {text: text for key in self.stats for text in key}  # 丢弃不再使用的字符串
+
+    # 跨天时在0点切分当前前台窗口，保存前一天的快照后重新统计
+    def _rollover(self, now: float):
+        midnight = time.mktime(time.strptime(self._day(now), "%Y%m%d"))
+        self._close(midnight)
+        self.since = midnight
+        self._submit(midnight, block=True)  # 前一天的最终结果，不能跳过
+        self.stats = {self.current: [1, 0.0, midnight]} if self.current is not None else {}
+        self.other = [0, 0.0]
+        self.strings = {text: text for key in self.stats for text in key}
+        self.changed = set(self.stats)
+        self.full_next = True
+        self.day = self._day(now)
+
+    def focus(self, exe: str, title: str, now: float | None = None):
+        """
+        前台窗口变化，由检测线程调用
+        :param exe:   窗口所属进程名称，未知时为空字符串
+        :param title: 窗口标题，为空字符串时表示没有有效的前台窗口，不计入任何窗口
+        :param now:   当前时间(Unix时间)，默认为调用时刻
+        """
+        now = time.time() if now is None else now
+        if self._day(now) != self.day: self._rollover(now)
+        key = (exe.casefold(), normalize_title(title)) if title else None
+        if key == self.current: return  # 同一窗口仅标题中的数字变化
+        self._close(now)
+        self.current, self.since = None, now
+        if key is None: return
+        entry = self.stats.get(key)
+        if entry is None:
+            if len(self.stats) >= self.max_keys: self._evict()
+            key = (self._intern(key[0]), self._intern(key[1]))
+            entry = self.stats[key] = [0, 0.0, now]
+        entry[0] += 1
+        entry[2] = now
+        self.current = key
+        self.changed.add(key)
+
+    def snapshot(self, now: float | None = None) -> dict:
+        """
+        :param now: 当前时间(Unix时间)，默认为调用时刻，当前前台窗口的时长计算到该时刻
+        :return:    完整统计，格式见load_snapshot
+        """
+        now = time.time() if now is None else now
+        windows = [[*key, *self._row(key, now)] for key in self.stats]
+        windows.sort(key=lambda row: row[3], reverse=True)
+        return {"day": self.day, "updated": round(now, 3), "other": [self.other[0], round(self.other[1], 3)],
+                "windows": windows}
+
+    # 窗口的 [次数, 总时长, 最后出现时间]，当前前台窗口的时长计算到now
+    def _row(self, key: tuple[str, str], now: float) -> list:
+        count, seconds, last = self.stats[key]
+        if key == self.current: seconds, last = seconds + max(now - self.since, 0), now
+        return [count, round(seconds, 3), round(last, 3)]
+
+    # 生成一行快照交给写入线程，不等待时队列已满则跳过本次快照（变化保留到下一次）
+    def _submit(self, now: float, block: bool = False):
+        full = self.full_next or self.file_bytes > max(self.full_bytes * 4, 65536)
+        ids, next_id = ({}, 0) if full else (self.ids, self.next_id)
+        changed = self.stats if full else self.changed | ({self.current} if self.current else set())
+        assigned = {}  # 本次新分配编号的窗口，写入成功后才加入ids
+        new, rows = [], []
+        for key in changed:
+            if key not in self.stats: continue
+            index = ids.get(key)
+            if index is None:
+                index = assigned[key] = next_id
+                next_id += 1
+                new.append(list(key))
+            rows.append([index, *self._row(key, now)])
+        record = {"t": round(now, 3), "day": self.day, "other": [self.other[0], round(self.other[1], 3)],
+                  "new": new, "rows": rows}
+        if self.dropped and not full: record["drop"] = self.dropped
+        if full: record["full"] = True
+        data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        try: self.queue.put((self.path(self.day), data, full), block=block)
+        except queue.Full: return
+        ids.update(assigned)
+        self.ids, self.next_id = ids, next_id
+        self.changed, self.dropped, self.full_next = set(), [], False
+        if full: self.full_bytes = self.file_bytes = len(data)
+        else: self.file_bytes += len(data)
+
+    def tick(self, now: float | None = None):
+        """
+        距上次快照超过interval秒时保存快照，由检测线程每次循环调用
+        """
+        if time.monotonic() - self.last_snapshot < self.interval: return
+        self.last_snapshot = time.monotonic()
+        now = time.time() if now is None else now
+        if self._day(now) != self.day: self._rollover(now)
+        if not self.changed and self.current is None and not self.full_next: return  # 统计未变化
+        self._submit(now)
+
+    def close(self):
+        """
+        保存最后一次快照并结束写入线程
+        """
+        self._submit(time.time(), block=True)
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None: break
+            path, data, full = item
+            try:
+                if full:  # 先写入临时文件再替换，避免读取到写了一半的快照
+                    temp = f"{path}.{os.getpid()}.tmp"
+                    with open(temp, "wb") as f:
+                        f.write(data)
+                    os.replace(temp, path)
+                else:
+                    with open(path, "ab") as f:
+                        f.write(data)
+                self.written += len(data)
+            except OSError: pass
+
+
+if __name__ == '__main__':
+    # 用法: python usage.py 快照文件 [标题或进程名称包含的内容] [显示数量]
+    # 例:   python usage.py usage-20261018.jsonl 微信
+    if len(sys.argv) < 2:
+        print("用法: python usage.py 快照文件 [标题或进程名称包含的内容] [显示数量]")
+        sys.exit(1)
+    _snapshot = load_snapshot(sys.argv[1])
+    if _snapshot is None:
+        print(f"无法读取快照[{sys.argv[1]}]")
+        sys.exit(1)
+    _keyword = sys.argv[2].casefold() if len(sys.argv) > 2 else ""
+    _limit = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    _rows = [row for row in _snapshot["windows"] if _keyword in row[0] or _keyword in row[1].casefold()]
+    _total = sum(row[3] for row in _rows)
+    print(f"{_snapshot['day']}，更新于{time.strftime('%H:%M:%S', time.localtime(_snapshot['updated']))}，"
+          f"共{len(_rows)}项，合计{_total / 3600:.2f}小时")
+    for _exe, _title, _count, _seconds, _last in _rows[:_limit]:
+        print(f"{_seconds / 60:8.1f}分钟\t{_count}次\t{_exe or '-'}\t{_title}")
+    if not _keyword and _snapshot["other"][1]:
+        print(f"{_snapshot['other'][1] / 60:8.1f}分钟\t{_snapshot['other'][0]}次\t(其他)")